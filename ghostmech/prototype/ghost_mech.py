@@ -1,126 +1,709 @@
-import socket
+import asyncio
+import math
+import random
 import threading
 import time
-import json
 import os
 import sys
-from cryptography.fernet import Fernet
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from mech_wire import ConnectionPool, FrameError, read_frame, encode_frame
+from mech_peers import PeerTable
+from mech_beacon import BeaconSchedule, encode_beacon, decode_beacon, open_discovery_socket
+from mech_session import Handshaker, HandshakeError, IDENTITY_ENTRY, load_identity, is_node_id, verify_origin
+from mech_outbox import (Outbox, Receipts, MSG_BATCH, MSG_ACK, RECEIPTS_INTERVAL, encode_batch, decode_batch,
+                         encode_ack, decode_ack)
+from mech_gossip import (RouteTable, DedupCache, MSG_GOSSIP, MSG_RELAY, GOSSIP_INTERVAL, GOSSIP_FANOUT,
+                         MAX_HOPS, RELAY_FANOUT, encode_gossip, decode_gossip, encode_relay, decode_relay,
+                         relay_signed_data, new_message_id)
+from mech_transfer import (OutgoingFile, IncomingFiles, MSG_FILE_OFFER, MSG_FILE_CHUNK, MSG_FILE_ACK,
+                           decode_offer, decode_chunk, encode_file_ack, decode_file_ack)
 
-# Add SpectreID to path
+# Add SpectreID and VaultZero to path
 sys.path.append(os.path.join(os.getcwd(), 'spectre', 'prototype'))
+sys.path.append(os.path.join(os.getcwd(), 'vaultzero', 'prototype'))
 try:
     from spectre_id import SpectreID
 except ImportError:
     # Minimal fallback for self-containment
     class SpectreID:
-        def generate_ghost_key(self):
-            return "GHOST_PROTOTYPE_KEY_001"
+        def generate_ghost_key(self, scan=False):
+            return "GHOST_PROTOTYPE_KEY_001"  # A constant: outbox and receipts get no real protection
+try:
+    from secure_vault import SecureVault
+except ImportError:
+    SecureVault = None  # Identity then lasts one run only
+
+EXPIRY_INTERVAL = 5.0  # Seconds between stale-peer sweeps
+ACK_TIMEOUT = 10.0  # Seconds to wait for a batch acknowledgement
+RETRY_MIN = 0.5  # First retry delay for an undeliverable batch
+RETRY_MAX = 60.0  # Exponential backoff ceiling
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Receives UDP discovery beacons and hands them to the node."""
+
+    def __init__(self, node):
+        self.node = node
+
+    def datagram_received(self, data, addr):
+        beacon = decode_beacon(data)
+        if beacon is not None:
+            self.node.on_beacon(*beacon, addr[0])
 
 class GhostMech:
-    def __init__(self, port=50505):
+    def __init__(self, port=50505, host='0.0.0.0', discovery="broadcast", group=None,
+                 msg_port=None, identity=IDENTITY_ENTRY, outbox_dir="ghostmech_outbox", seeds=None, incoming_dir="ghostmech_incoming"):
         self.port = port
+        self.msg_port = msg_port or port + 1
+        # IPv6 multicast peers dial us over IPv6, so listen on every family
+        self.host = None if group and ':' in group and host == '0.0.0.0' else host
+        self.discovery_mode = discovery  # 'broadcast', 'multicast' or None (seeds only)
+        self.group = group
+        self.schedule = BeaconSchedule()
         self.spectre = SpectreID()
-        self.my_id = self.spectre.generate_ghost_key()[:12] # Short ID for UI
-        self.peers = {} # {id: ip}
+        # Hardware-bound key for everything sealed at rest; the legacy key hashes no hardware
+        # and is only kept to read outbox and receipt files written before the switch
+        ghost_key = self.spectre.generate_ghost_key(scan=True)
+        legacy_key = SpectreID().generate_ghost_key()
+        self.peers = PeerTable()
         self.running = True
         
-        # Identity encryption (for this prototype, we use a fixed 'mesh' key for the group)
-        # In V2, this would be a per-peer Diffie-Hellman exchange
-        self.mesh_key = Fernet.generate_key() 
-        self.cipher = Fernet(self.mesh_key)
-
-    def discovery_listener(self):
-        """Listens for UDP broadcasts from other Ghost Mech nodes."""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        sock.bind(('', self.port))
-        sock.settimeout(1.0)
-        
-        while self.running:
+        # Identity encryption: a random static X25519 key kept in the hardware-bound vault (its
+        # hash is our id), plus a fresh per-connection exchange that yields ChaCha20-Poly1305 session keys
+        self.handshaker = Handshaker(*self.load_identity(identity))
+        self.my_id = self.handshaker.node_id
+
+        # Store-and-forward: sends return at once, per-peer tasks deliver in batches
+        self.outbox = Outbox(ghost_key + self.my_id, outbox_dir, legacy_key=legacy_key + self.my_id)
+        self.delivery = {}  # {peer_id: asyncio.Task}
+        self.wakeups = {}  # {peer_id: asyncio.Event} set when a peer is (re)discovered
+        self.ack_waiters = {}  # {peer_id: (last message id, asyncio.Future)}
+        self.receipts = Receipts(ghost_key + self.my_id, outbox_dir, legacy_key=legacy_key + self.my_id)  # Drops retransmits, across restarts
+
+        # Gossip relay: neighbours swap reachability tables so messages can cross subnets
+        self.seeds = [self.parse_seed(seed) for seed in seeds or []]
+        self.routes = RouteTable(self.my_id)
+        self.relayed = DedupCache()
+        self.gossiped = {}  # {peer_id: monotonic time of our last gossip to it}
+        self.gossip_wakeup = None
+
+        # File transfer: windowed, hash-checked chunks that resume from the last acked offset
+        self.incoming = IncomingFiles(incoming_dir)
+        self.disk = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ghostmech-disk")  # Blocking writes and fsyncs, in order
+        self.transfers = {}  # {transfer_id: OutgoingFile}
+        self.file_tasks = set()
+
+        # Event loop core: runs in its own thread, the CLI stays on the main thread
+        self.loop = None
+        self.loop_thread = None
+        self.ready = threading.Event()
+        self.pool = None
+        self.server = None
+        self.discovery = None
+        self.beacon_dest = None
+        self.beacon_wakeup = None
+        self.tasks = []
+        self.connections = set()  # Handler tasks of inbound peer connections
+
+    @staticmethod
+    def load_identity(entry):
+        """
+        Identity keys from the hardware-bound VaultZero store, whose key comes
+        from a SpectreID hardware scan; separate entries give separate nodes on
+        one machine. An identity left in the legacy store, whose key hashes no
+        hardware and so protects nothing, is moved over once and wiped there.
+        """
+        if SecureVault is None:
+            print("[!] VaultZero not found; this node's identity will not survive a restart.")
+            return load_identity()
+        vault, legacy = SecureVault(hardware_bound=True), SecureVault()
+        try:
+            store = vault.open_store()
+            if store.get(entry) is None and os.path.isdir(legacy.store_dir):
+                old = legacy.open_store().get(entry)
+                if old is not None:
+                    store.put(entry, old)
+                    legacy.open_store().delete(entry)
+                    legacy.open_store().gc()
+                    print("[+] GhostMech identity moved into the hardware-bound vault.")
+            return load_identity(store, entry)
+        finally:
+            vault.zeroize()
+            legacy.zeroize()
+
+    @staticmethod
+    def parse_seed(seed):
+        """Accepts (host, port) or 'host:port' ('[v6addr]:port' for IPv6)."""
+        if isinstance(seed, str):
+            host, _, port = seed.rpartition(':')
+            return host.strip('[]'), int(port)
+        return seed[0], int(seed[1])
+
+    def on_beacon(self, peer_id, port, interval, leaving, ip):
+        if not is_node_id(peer_id) or peer_id == self.my_id:
+            return
+        # Keep each peer until it has missed ~3 of its own announced beacons
+        previous = self.peers.get(peer_id)
+        change = self.peers.seen(peer_id, ip, port, "leaving" if leaving else "active",
+                                 ttl=max(self.peers.ttl, 3 * interval))
+        if change in ("new", "moved"):
+            self.wake_delivery(peer_id)
+        if change == "new":
+            print(f"\n[+] GHOST DETECTED: {peer_id} at {ip}")
+        elif change == "moved":
+            self.forget_peer(previous)
+            print(f"\n[~] GHOST MOVED: {peer_id} now at {ip}")
+        elif change == "left":
+            self.forget_peer(previous)
+            print(f"\n[-] GHOST DEPARTED: {peer_id}")
+        if change:
+            self.peer_set_changed()
+
+    def on_neighbor(self, peer_id, ip, port):
+        """A peer reached over TCP (a seed, or gossip from another subnet) rather than by beacon."""
+        if not peer_id or peer_id == self.my_id:
+            return
+        previous = self.peers.get(peer_id)
+        if previous is not None and previous.port == port:
+            ip = previous.ip  # Keep the known address; connections may arrive via another interface
+        change = self.peers.seen(peer_id, ip, port)
+        if change in ("new", "moved"):
+            self.wake_delivery(peer_id)
+        if change == "new":
+            print(f"\n[+] GHOST LINKED: {peer_id} at {ip}:{port}")
+        elif change == "moved":
+            self.forget_peer(previous)
+            print(f"\n[~] GHOST MOVED: {peer_id} now at {ip}:{port}")
+        if change:
+            self.peer_set_changed()
+
+    def peer_set_changed(self):
+        self.schedule.changed()
+        if self.beacon_wakeup is not None:
+            self.beacon_wakeup.set()
+        if self.gossip_wakeup is not None:
+            self.gossip_wakeup.set()
+
+    def forget_peer(self, peer):
+        if peer is not None:
+            self.routes.drop_via(peer.peer_id)
+            if self.pool is not None:
+                self.pool.drop((peer.ip, peer.port))
+
+    async def peer_expiry(self):
+        """Evicts peers whose beacons stopped arriving."""
+        while True:
+            await asyncio.sleep(EXPIRY_INTERVAL)
+            expired = self.peers.expire()
+            for peer_id, ttl in expired:
+                self.routes.drop_via(peer_id)
+                print(f"\n[-] GHOST LOST: {peer_id} (no beacon for {ttl:.0f}s)")
+            if expired:
+                self.peer_set_changed()
+
+    def send_beacon(self, leaving=False):
+        beacon = encode_beacon(self.my_id, self.msg_port, self.schedule.ceiling(), leaving)
+        self.discovery.sendto(beacon, self.beacon_dest)
+
+    async def discovery_broadcaster(self):
+        """Sends adaptive, jittered beacons: fast while the peer set changes, backing off when stable."""
+        self.beacon_wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    self.send_beacon()
+                except OSError as e:
+                    print(f"\n[!] Discovery beacon failed: {e}")
+                delay = self.schedule.next_delay(len(self.peers))
+                try:
+                    await asyncio.wait_for(self.beacon_wakeup.wait(), delay)
+                    # A change was seen: answer soon, but spread replies across the segment
+                    self.beacon_wakeup.clear()
+                    await asyncio.sleep(random.uniform(0, self.schedule.min_interval))
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Tell peers to drop us now rather than after their TTL
             try:
-                data, addr = sock.recvfrom(1024)
-                message = json.loads(data.decode())
-                
-                peer_id = message.get('id')
-                if peer_id and peer_id != self.my_id:
-                    if peer_id not in self.peers:
-                        print(f"\n[+] GHOST DETECTED: {peer_id} at {addr[0]}")
-                        self.peers[peer_id] = addr[0]
-            except (socket.timeout, json.JSONDecodeError):
-                continue
-        sock.close()
-
-    def discovery_broadcaster(self):
-        """Broadcasts our SpectreID to the local network every few seconds."""
-        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
-        
-        message = json.dumps({"id": self.my_id, "status": "active"}).encode()
-        
-        while self.running:
+                self.send_beacon(leaving=True)
+            except OSError:
+                pass
+
+    async def handle_connection(self, reader, writer):
+        """Handshakes, then acknowledges sealed batches and file chunks and handles gossip and relay frames."""
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            session = await self.handshaker.respond(reader, writer)
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                plaintext = session.open(frame)
+                if not plaintext:
+                    continue
+                reply = None
+                if plaintext[0] == MSG_BATCH:
+                    reply = encode_ack(await self.on_batch(session.peer_id, plaintext))
+                elif plaintext[0] == MSG_GOSSIP:
+                    self.on_gossip(session.peer_id, writer.get_extra_info('peername')[0], plaintext)
+                elif plaintext[0] == MSG_RELAY:
+                    await self.on_relay(session.peer_id, plaintext)
+                elif plaintext[0] == MSG_FILE_OFFER:
+                    reply = await self.on_file_offer(session.peer_id, plaintext)
+                elif plaintext[0] == MSG_FILE_CHUNK:
+                    reply = await self.on_file_chunk(session.peer_id, plaintext)
+                if reply is not None:
+                    writer.write(encode_frame(session.seal(reply)))
+                    await writer.drain()
+        except HandshakeError as e:
+            print(f"\n[!] Rejected connection: {e}")
+        except (OSError, FrameError, asyncio.TimeoutError):
+            pass
+        except (struct.error, ValueError, IndexError) as e:
+            print(f"\n[!] Dropped connection after a malformed frame: {e}")
+        except asyncio.CancelledError:
+            # Leaf task: finish quietly so start_server's done-callback sees no error
+            pass
+        finally:
+            self.connections.discard(task)
+            writer.close()
+
+    async def on_batch(self, sender_id, plaintext):
+        """Delivers each message of a batch once; returns the id to acknowledge."""
+        stream, first_id, bodies = decode_batch(plaintext)
+        for body in bodies[self.receipts.skip(sender_id, stream, first_id):]:
+            self.on_message(sender_id, body)
+        last_id = first_id + len(bodies) - 1
+        if self.receipts.record(sender_id, stream, last_id):
+            await self.save_receipts()
+        return last_id
+
+    async def save_receipts(self):
+        """Snapshots the receipts here, on the loop, and fsyncs them on the disk thread."""
+        sealed = self.receipts.seal()
+        if sealed is not None:
+            await asyncio.get_running_loop().run_in_executor(self.disk, self.receipts.write, sealed)
+
+    async def receipt_saver(self):
+        while True:
+            await asyncio.sleep(RECEIPTS_INTERVAL)
             try:
-                sock.sendto(message, ('<broadcast>', self.port))
-                time.sleep(5)
-            except Exception:
-                break
-        sock.close()
-
-    def message_listener(self):
-        """TCP server to receive direct, encrypted messages."""
-        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        server.bind(('0.0.0.0', self.port + 1))
-        server.listen(5)
-        server.settimeout(1.0)
-        
-        while self.running:
+                await self.save_receipts()
+            except OSError as e:
+                print(f"\n[!] Could not save receipts: {e}")
+
+    def on_message(self, sender_id, payload, via=None):
+        msg_body = payload.decode('utf-8', 'replace')
+        print(f"\n[RECEIVED FROM {sender_id}{f' via {via}' if via else ''}]: {msg_body}")
+        print("ghost_mech > ", end="", flush=True)
+
+    def on_gossip(self, sender_id, ip, plaintext):
+        """A neighbour's reachability table; receiving it also proves the neighbour is alive."""
+        port, entries = decode_gossip(plaintext)
+        self.on_neighbor(sender_id, ip, port)
+        if self.routes.learn(sender_id, entries, direct=self.peers) and self.gossip_wakeup is not None:
+            self.gossip_wakeup.set()  # Triggered update: pass new routes on promptly
+
+    async def on_relay(self, sender_id, plaintext):
+        """
+        Delivers a relayed message addressed to us, or forwards it one hop
+        further. The source signs each message end to end, so neither the
+        neighbour it came from nor any relay before it can forge or alter it.
+        """
+        msg_id, src, dst, hops_left, body, proof = decode_relay(plaintext)
+        if src == self.my_id:
+            return
+        # Verify before recording the id, so a forgery cannot shadow the real message
+        if not verify_origin(src, *proof, relay_signed_data(msg_id, src, dst, body)):
+            print(f"\n[!] Dropped relayed message claiming to be from {src} (via {sender_id}): bad origin signature.")
+            return
+        if self.relayed.seen(msg_id):
+            return
+        if dst == self.my_id:
+            self.on_message(src, body, via=sender_id)
+        elif hops_left > 1:
+            await self.forward(dst, encode_relay(msg_id, src, dst, hops_left - 1, body, proof), exclude=(sender_id, src))
+
+    async def forward(self, dst, frame, exclude=()):
+        """Sends a relay frame towards dst: direct, via the best route, else a bounded flood."""
+        peer = self.peers.get(dst)
+        if peer is None:
+            route = self.routes.next_hop(dst)
+            peer = self.peers.get(route[0]) if route else None
+        if peer is not None:
+            try:
+                await self.send_async(peer, frame)
+                return True
+            except (OSError, asyncio.TimeoutError, HandshakeError):
+                self.routes.drop_via(peer.peer_id)
+        # No usable route: hand it to a few random neighbours; TTL and the dedup cache stop the flood
+        candidates = [p for p in self.peers.snapshot() if p.peer_id not in exclude]
+        sent = False
+        for peer in random.sample(candidates, min(RELAY_FANOUT, len(candidates))):
             try:
-                conn, addr = server.accept()
-                data = conn.recv(4096)
-                if data:
-                    # Decrypt incoming message
-                    decrypted = self.cipher.decrypt(data).decode()
-                    sender_id, msg_body = decrypted.split('|', 1)
-                    print(f"\n[RECEIVED FROM {sender_id}]: {msg_body}")
-                    print("ghost_mech > ", end="", flush=True)
-                conn.close()
-            except socket.timeout:
-                continue
-        server.close()
+                await self.send_async(peer, frame)
+                sent = True
+            except (OSError, asyncio.TimeoutError, HandshakeError):
+                pass
+        return sent
 
-    def send_message(self, target_id, text):
-        """Sends an encrypted TCP message to a peer."""
-        if target_id not in self.peers:
-            print(f"[!] Peer {target_id} not found.")
+    async def relay(self, dst, body):
+        """Loop thread: originates a relayed message to a node that is not a direct peer."""
+        msg_id = new_message_id()
+        self.relayed.seen(msg_id)
+        proof = self.handshaker.sign(relay_signed_data(msg_id, self.my_id, dst, body))
+        if await self.forward(dst, encode_relay(msg_id, self.my_id, dst, MAX_HOPS, body, proof)):
+            route = self.routes.next_hop(dst)
+            via = f"via {route[0]} ({route[1]} hops)" if route else "by flooding"
+            print(f"\n[RELAYED TO {dst}]: {via}")
+        else:
+            print(f"\n[!] No neighbour could relay to {dst}.")
+
+    async def send_gossip(self, peer, direct_ids):
+        self.gossiped[peer.peer_id] = time.monotonic()
+        payload = encode_gossip(self.msg_port, self.routes.advertise(peer.peer_id, direct_ids))
+        await self.send_async(peer, payload)
+
+    async def dial_seed(self, addr, direct_ids):
+        """Gossips to a configured seed address; the handshake tells us who lives there."""
+        try:
+            await self.pool.send(addr, encode_gossip(self.msg_port, self.routes.advertise(None, direct_ids)))
+        except (OSError, asyncio.TimeoutError, HandshakeError):
+            return
+        conn = self.pool.conns.get(addr)
+        if conn is not None and conn.session is not None:
+            self.on_neighbor(conn.session.peer_id, addr[0], addr[1])
+
+    async def gossip_round(self):
+        self.routes.prune()
+        peers = self.peers.snapshot()
+        direct_ids = [p.peer_id for p in peers]
+        # Enough fan-out that every neighbour hears from us ~3 times per peer TTL
+        fanout = max(GOSSIP_FANOUT, math.ceil(3 * len(peers) * GOSSIP_INTERVAL / self.peers.ttl))
+        peers.sort(key=lambda p: self.gossiped.get(p.peer_id, 0.0))
+        sends = [self.send_gossip(p, direct_ids) for p in peers[:fanout]]
+        known = {(p.ip, p.port) for p in peers}
+        sends += [self.dial_seed(addr, direct_ids) for addr in self.seeds if addr not in known]
+        await asyncio.gather(*sends, return_exceptions=True)
+        for peer_id in [pid for pid in self.gossiped if pid not in self.peers]:
+            del self.gossiped[peer_id]
+
+    async def gossiper(self):
+        """Periodic, jittered gossip rounds; route or peer changes trigger an early round."""
+        self.gossip_wakeup = asyncio.Event()
+        while True:
+            await self.gossip_round()
+            try:
+                await asyncio.wait_for(self.gossip_wakeup.wait(), GOSSIP_INTERVAL * random.uniform(0.75, 1.25))
+                self.gossip_wakeup.clear()
+                await asyncio.sleep(random.uniform(0, 0.2))  # Coalesce a burst of changes
+            except asyncio.TimeoutError:
+                pass
+
+    async def on_file_offer(self, sender_id, plaintext):
+        """Registers an incoming file; the reply tells the sender where to (re)start."""
+        transfer_id, size, chunk_size, name = decode_offer(plaintext)
+        try:
+            state, offset = await asyncio.get_running_loop().run_in_executor(
+                self.disk, self.incoming.offer, sender_id, transfer_id, size, chunk_size, name)
+        except ValueError as e:
+            print(f"\n[!] Refused file offer from {sender_id}: {e}")
+            return None
+        if state is None:
+            print(f"\n[!] Ignored file offer from {sender_id}: transfer belongs to another peer.")
+            return None
+        if state['complete'] is not None:
+            print(f"\n[FILE FROM {sender_id}]: {state['name']} already received as {state['complete']}")
+        elif offset:
+            print(f"\n[FILE FROM {sender_id}]: resuming {state['name']} at {offset}/{size} bytes")
+        else:
+            print(f"\n[FILE FROM {sender_id}]: receiving {state['name']} ({size} bytes)")
+        return encode_file_ack(transfer_id, offset)
+
+    async def on_file_chunk(self, sender_id, plaintext):
+        """Writes the chunk on the disk thread, so other peers' frames keep flowing meanwhile."""
+        transfer_id, offset, digest, data = decode_chunk(plaintext)
+        state, next_offset, status = await asyncio.get_running_loop().run_in_executor(
+            self.disk, self.incoming.write, sender_id, transfer_id, offset, digest, data)
+        if status is None:
+            return None
+        if state['complete'] is not None and offset + len(data) == next_offset:
+            print(f"\n[FILE RECEIVED FROM {sender_id}]: {state['complete']}")
+            print("ghost_mech > ", end="", flush=True)
+        return encode_file_ack(transfer_id, next_offset, status)
+
+    def on_reply(self, peer_id, plaintext):
+        """Frames coming back on our outbound connections: batch and file chunk acknowledgements."""
+        if plaintext and plaintext[0] == MSG_ACK:
+            last_id = decode_ack(plaintext)
+            self.outbox.ack(peer_id, last_id)
+            waiter = self.ack_waiters.get(peer_id)
+            if waiter is not None and last_id >= waiter[0] and not waiter[1].done():
+                waiter[1].set_result(last_id)
+        elif plaintext and plaintext[0] == MSG_FILE_ACK:
+            transfer_id, offset, status = decode_file_ack(plaintext)
+            transfer = self.transfers.get(transfer_id)
+            if transfer is not None:
+                transfer.on_ack(offset, status)
+
+    async def serve(self):
+        """Starts discovery, gossip and the message server; every peer connection is its own task."""
+        self.pool = ConnectionPool(handshake=self.handshaker.initiate, on_frame=self.on_reply)
+        self.pool.start()
+        if self.discovery_mode:
+            sock, self.beacon_dest = open_discovery_socket(self.port, self.discovery_mode, self.group)
+            self.discovery, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: DiscoveryProtocol(self), sock=sock)
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.msg_port)
+        if self.discovery is not None:
+            self.tasks.append(asyncio.ensure_future(self.discovery_broadcaster()))
+        self.tasks.append(asyncio.ensure_future(self.peer_expiry()))
+        self.tasks.append(asyncio.ensure_future(self.gossiper()))
+        self.tasks.append(asyncio.ensure_future(self.receipt_saver()))
+        # Backlog restored from disk waits for its peers to be rediscovered
+        for peer_id in list(self.outbox.queues):
+            self.wake_delivery(peer_id)
+
+    async def shutdown(self):
+        if self.server is not None:
+            self.server.close()
+        pending = self.tasks + list(self.connections) + list(self.delivery.values()) + list(self.file_tasks)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        self.tasks = []
+        if self.server is not None:
+            await self.server.wait_closed()
+        if self.discovery is not None:
+            self.discovery.close()
+        if self.pool is not None:
+            self.pool.close()
+        self.disk.shutdown(wait=True)  # Lets a write already handed over finish
+        self.incoming.close()
+        self.receipts.flush()
+
+    def run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_until_complete(self.serve())
+        except OSError as e:
+            print(f"[!] Could not bind GhostMech sockets: {e}")
+            self.running = False
+            self.ready.set()
             return
+        self.ready.set()
+        self.loop.run_forever()
+        self.loop.run_until_complete(self.shutdown())
+        self.loop.close()
+
+    def start_node(self):
+        """Starts the event loop thread and waits until sockets are bound."""
+        self.loop = asyncio.new_event_loop()
+        self.loop_thread = threading.Thread(target=self.run_loop, daemon=True)
+        self.loop_thread.start()
+        self.ready.wait()
+        return self.running
+
+    def stop(self):
+        """Cancels every task and closes all sockets; returns once the loop has exited."""
+        self.running = False
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.loop_thread is not None:
+            self.loop_thread.join()
+
+    async def send_async(self, peer, payload):
+        """Sends over the pooled connection, feeding RTT and failure stats back to the peer table."""
+        addr = (peer.ip, peer.port)
+        dialing = addr not in self.pool.conns
+        started = time.monotonic()
+        try:
+            await self.pool.send(addr, payload, peer.peer_id)
+        except (OSError, asyncio.TimeoutError, HandshakeError):
+            if self.peers.record_failure(peer.peer_id):
+                self.forget_peer(peer)
+                print(f"\n[-] GHOST UNREACHABLE: {peer.peer_id} evicted after {self.peers.max_failures} failures")
+            raise
+        if dialing:
+            # A fresh dial is dominated by the TCP handshake: one round trip
+            self.peers.record_rtt(peer.peer_id, time.monotonic() - started)
+        else:
+            self.peers.record_success(peer.peer_id)
+
+    def resolve_peer(self, prefix):
+        """Finds the single peer whose id starts with prefix."""
+        matches = self.peers.resolve(prefix)
+        if not matches:
+            print(f"[!] Peer {prefix} not found.")
+            return None
+        if len(matches) > 1:
+            print(f"[!] Peer prefix {prefix} is ambiguous ({len(matches)} matches).")
+            return None
+        return matches[0]
+
+    def enqueue(self, peer_id, body):
+        """Loop thread: persists the message and makes sure a delivery task is running."""
+        self.outbox.enqueue(peer_id, body)
+        self.wake_delivery(peer_id)
 
-        target_ip = self.peers[target_id]
+    def wake_delivery(self, peer_id):
+        event = self.wakeups.get(peer_id)
+        if event is not None:
+            event.set()
+        if self.outbox.depth(peer_id) and peer_id not in self.delivery:
+            self.delivery[peer_id] = asyncio.ensure_future(self.deliver(peer_id))
+
+    async def wait_for_peer(self, peer_id, timeout=None):
+        """Sleeps until the peer is rediscovered (or the timeout passes)."""
+        event = self.wakeups.setdefault(peer_id, asyncio.Event())
+        event.clear()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def deliver(self, peer_id):
+        """Drains one peer's queue: coalesced batches, ack per batch, exponential backoff."""
+        backoff = RETRY_MIN
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.connect((target_ip, self.port + 1))
-            
-            # Encrypt: Identity | Message
-            payload = f"{self.my_id}|{text}"
-            encrypted_payload = self.cipher.encrypt(payload.encode())
-            
-            sock.send(encrypted_payload)
-            sock.close()
-            print(f"[SENT TO {target_id}]: {text}")
-        except Exception as e:
-            print(f"[!] Transmission failed: {e}")
+            while self.outbox.depth(peer_id):
+                peer = self.peers.get(peer_id)
+                if peer is None:
+                    await self.wait_for_peer(peer_id)
+                    continue
+                batch = self.outbox.next_batch(peer_id)
+                waiter = asyncio.get_running_loop().create_future()
+                self.ack_waiters[peer_id] = (batch[-1].msg_id, waiter)
+                try:
+                    await self.send_async(peer, encode_batch(self.outbox.stream(peer_id), batch[0].msg_id, [m.body for m in batch]))
+                    await asyncio.wait_for(waiter, ACK_TIMEOUT)
+                    backoff = RETRY_MIN
+                    print(f"\n[SENT TO {peer_id}]: {len(batch)} message(s) delivered")
+                except (OSError, FrameError, HandshakeError, asyncio.TimeoutError):
+                    # Rediscovery cuts the wait short
+                    await self.wait_for_peer(peer_id, backoff * random.uniform(0.5, 1.0))
+                    backoff = min(backoff * 2, RETRY_MAX)
+                finally:
+                    self.ack_waiters.pop(peer_id, None)
+        finally:
+            self.delivery.pop(peer_id, None)
+
+    async def send_file(self, peer_id, transfer):
+        """Streams one file: offer, then a window of chunks against cumulative acks; any failure re-offers and resumes."""
+        backoff = RETRY_MIN
+        try:
+            while not transfer.done:
+                peer = self.peers.get(peer_id)
+                if peer is None:
+                    await self.wait_for_peer(peer_id)
+                    continue
+                try:
+                    transfer.progress.clear()
+                    await self.send_async(peer, transfer.offer())
+                    await asyncio.wait_for(transfer.progress.wait(), ACK_TIMEOUT)
+                    if transfer.resumed_from and not transfer.done:
+                        print(f"\n[FILE TO {peer_id}]: resuming {transfer.name} at {transfer.resumed_from}/{transfer.size} bytes")
+                    while not transfer.done:
+                        transfer.progress.clear()
+                        while transfer.can_send():
+                            await self.send_async(peer, transfer.next_chunk())
+                        if not transfer.done:
+                            await asyncio.wait_for(transfer.progress.wait(), ACK_TIMEOUT)
+                    backoff = RETRY_MIN
+                except (OSError, FrameError, HandshakeError, asyncio.TimeoutError):
+                    await self.wait_for_peer(peer_id, backoff * random.uniform(0.5, 1.0))
+                    backoff = min(backoff * 2, RETRY_MAX)
+            seconds = time.monotonic() - transfer.started
+            sent_mb = (transfer.size - transfer.resumed_from) / (1024 * 1024)
+            print(f"\n[FILE SENT TO {peer_id}]: {transfer.name} ({transfer.size} bytes, {sent_mb / max(seconds, 1e-6):.1f} MB/s)")
+        finally:
+            self.transfers.pop(transfer.transfer_id, None)
+            self.file_tasks.discard(asyncio.current_task())
+            transfer.close()
+
+    def start_file(self, peer_id, path):
+        """Loop thread: opens the file and starts its transfer task."""
+        try:
+            transfer = OutgoingFile(self.my_id, path)
+        except OSError as e:
+            print(f"\n[!] Cannot send {path}: {e}")
+            return
+        if transfer.transfer_id in self.transfers:
+            transfer.close()
+            print(f"\n[!] {path} is already being sent.")
+            return
+        self.transfers[transfer.transfer_id] = transfer
+        self.file_tasks.add(asyncio.ensure_future(self.send_file(peer_id, transfer)))
+
+    def send_path(self, target_id, path):
+        """Starts a resumable file transfer to a direct peer and returns immediately."""
+        peer = self.resolve_peer(target_id)
+        if peer is None:
+            return
+        if not os.path.isfile(path):
+            print(f"[!] No such file: {path}")
+            return
+        self.loop.call_soon_threadsafe(self.start_file, peer.peer_id, path)
+        print(f"[SENDING FILE TO {peer.peer_id}]: {path}")
+
+    def send_message(self, target_id, text):
+        """Queues an encrypted message for a peer (or relays it to a routed node) and returns immediately."""
+        peer = self.peers.resolve(target_id)
+        routed = self.routes.resolve(target_id) if not peer else []
+        if len(peer) == 1:
+            peer_id = peer[0].peer_id
+        elif len(routed) == 1:
+            # Beyond our segment: best-effort hop-by-hop relay, no outbox or acks
+            asyncio.run_coroutine_threadsafe(self.relay(routed[0], text.encode()), self.loop)
+            print(f"[RELAYING TO {routed[0]}]: {text}")
+            return
+        elif is_node_id(target_id) and not peer:
+            # Full id of an offline peer: hold the message until it shows up
+            peer_id = target_id
+        else:
+            self.resolve_peer(target_id)  # Reports not-found / ambiguous
+            return
+
+        self.loop.call_soon_threadsafe(self.enqueue, peer_id, text.encode())
+        print(f"[QUEUED FOR {peer_id}]: {text}")
+
+    async def queue_report(self):
+        return self.outbox.stats(), list(self.transfers.values())
+
+    def print_queue(self):
+        # The queues belong to the loop thread: read them there, not mid-update from here
+        stats, transfers = asyncio.run_coroutine_threadsafe(self.queue_report(), self.loop).result()
+        print(f"OUTBOUND QUEUES ({len(stats)}):")
+        for peer_id, q in stats.items():
+            latency = f"{q['avg_latency'] * 1000:.1f}ms" if q['avg_latency'] is not None else "--"
+            print(f" - {peer_id}: depth {q['depth']} | oldest {q['oldest_age']:.1f}s | delivered {q['delivered']} | avg latency {latency}")
+        if transfers:
+            print(f"FILE TRANSFERS ({len(transfers)}):")
+            for t in transfers:
+                done = (t.acked or 0) / t.size * 100 if t.size else 100.0
+                print(f" - {t.name}: {done:.0f}% of {t.size} bytes")
+
+    def print_routes(self):
+        routes = sorted(self.routes.routes.items())
+        print(f"RELAY ROUTES ({len(routes)}):")
+        for dest, (via, hops, _) in routes:
+            print(f" - {dest} via {via} ({hops} hops)")
 
     def start(self):
         print(f"=== GHOST MECH P2P PROTOCOL V1.0 ===")
         print(f"DEVICE_ID: {self.my_id}")
-        print(f"STATUS: Listening on port {self.port} (UDP) and {self.port+1} (TCP)")
+        discovery = f"UDP {self.discovery_mode}" if self.discovery_mode else "no UDP discovery"
+        print(f"STATUS: Listening on port {self.port} ({discovery}) and {self.msg_port} (TCP)")
+        if self.seeds:
+            print(f"SEEDS: {', '.join(f'{h}:{p}' for h, p in self.seeds)}")
         print(f"------------------------------------")
         
-        # Start Threads
-        threading.Thread(target=self.discovery_listener, daemon=True).start()
-        threading.Thread(target=self.discovery_broadcaster, daemon=True).start()
-        threading.Thread(target=self.message_listener, daemon=True).start()
+        if not self.start_node():
+            return
 
-        print("Commands: 'list' to see peers, 'send <id> <msg>' to talk, 'exit' to quit.\n")
+        print("Commands: 'list' to see peers, 'send <id> <msg>' to talk, 'sendfile <id> <path>' to share a file,")
+        print("          'queue' for the outbox, 'routes' for relay paths, 'exit' to quit.\n")
         
         while self.running:
             try:
@@ -134,15 +717,25 @@ class GhostMech:
                     self.running = False
                 elif action == "list":
                     print(f"ACTIVE PEERS ({len(self.peers)}):")
-                    for pid, pip in self.peers.items():
-                        print(f" - {pid} [{pip}]")
+                    now = time.monotonic()
+                    for peer in self.peers.snapshot():
+                        rtt = f"{peer.rtt * 1000:.1f}ms" if peer.rtt is not None else "--"
+                        print(f" - {peer.peer_id} [{peer.ip}] seen {now - peer.last_seen:.0f}s ago | rtt {rtt} | failures {peer.failures}")
                 elif action == "send" and len(parts) == 3:
                     self.send_message(parts[1], parts[2])
+                elif action == "sendfile" and len(parts) == 3:
+                    self.send_path(parts[1], parts[2])
+                elif action == "queue":
+                    self.print_queue()
+                elif action == "routes":
+                    self.print_routes()
                 else:
-                    print("Unknown command. Try 'list' or 'send <id> <msg>'.")
-            except KeyboardInterrupt:
+                    print("Unknown command. Try 'list', 'send <id> <msg>', 'sendfile <id> <path>', 'queue' or 'routes'.")
+            except (KeyboardInterrupt, EOFError):
                 self.running = False
 
+        self.stop()
+
 if __name__ == "__main__":
     mech = GhostMech()
     mech.start()
@@ -0,0 +1,95 @@
+import math
+import random
+import socket
+import struct
+
+# magic, version, flags, TCP message port, announced interval (deciseconds), node id
+BEACON = struct.Struct(">2sBBHH12s")
+BEACON_MAGIC = b"GM"
+BEACON_VERSION = 1
+FLAG_LEAVING = 0x01
+
+MIN_INTERVAL = 1.0  # Seconds between beacons right after the peer set changes
+MAX_INTERVAL = 15.0  # Stable-state interval for a small segment
+INTERVAL_CAP = 120.0  # Upper bound once the interval is scaled by cluster size
+BACKOFF = 2.0  # Interval growth per beacon while nothing changes
+JITTER = 0.25  # +/- fraction of randomisation applied to every delay
+
+MULTICAST_GROUP_V4 = "239.255.77.77"
+MULTICAST_GROUP_V6 = "ff15::7777"
+MULTICAST_HOPS = 4  # Lets beacons cross a few routed hops in multicast mode
+
+def encode_beacon(node_id, port, interval, leaving=False):
+    return BEACON.pack(BEACON_MAGIC, BEACON_VERSION, FLAG_LEAVING if leaving else 0,
+                       port, min(int(interval * 10), 0xFFFF), node_id.encode()[:12])
+
+def decode_beacon(data):
+    """Returns (node_id, port, interval, leaving), or None for anything that is not a beacon."""
+    if len(data) != BEACON.size or data[:2] != BEACON_MAGIC:
+        return None
+    _, version, flags, port, interval, node_id = BEACON.unpack(data)
+    if version != BEACON_VERSION:
+        return None
+    return node_id.rstrip(b"\0").decode('ascii', 'replace'), port, interval / 10.0, bool(flags & FLAG_LEAVING)
+
+class BeaconSchedule:
+    """
+    Adaptive beacon timing.
+
+    The interval starts at MIN_INTERVAL, doubles on every beacon while the peer
+    set is stable and snaps back when it changes. The stable ceiling grows with
+    sqrt(peer count), so the segment's total beacon rate grows sub-linearly.
+    Every delay is jittered to keep nodes from firing in lockstep.
+    """
+
+    def __init__(self, min_interval=MIN_INTERVAL, max_interval=MAX_INTERVAL, jitter=JITTER):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.jitter = jitter
+        self.interval = min_interval
+        self.peer_count = 0
+
+    def ceiling(self):
+        scale = max(1.0, math.sqrt(self.peer_count) / 4.0)
+        return min(self.max_interval * scale, INTERVAL_CAP)
+
+    def changed(self):
+        """Peer set changed: beacon quickly so newcomers learn about us."""
+        self.interval = self.min_interval
+
+    def next_delay(self, peer_count):
+        self.peer_count = peer_count
+        delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        self.interval = min(self.interval * BACKOFF, self.ceiling())
+        return delay
+
+def open_discovery_socket(port, mode="broadcast", group=None, hops=MULTICAST_HOPS):
+    """
+    Builds the discovery UDP socket. Returns (socket, beacon destination).
+    mode is 'broadcast' (IPv4 segment) or 'multicast' (IPv4 or IPv6 group).
+    """
+    if mode == "broadcast":
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        sock.bind(('', port))
+        return sock, ('<broadcast>', port)
+
+    group = group or MULTICAST_GROUP_V4
+    if ':' in group:
+        sock = socket.socket(socket.AF_INET6, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('', port))
+        membership = socket.inet_pton(socket.AF_INET6, group) + struct.pack('@I', 0)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_JOIN_GROUP, membership)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, hops)
+        sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_LOOP, 1)
+    else:
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('', port))
+        membership = struct.pack('4s4s', socket.inet_aton(group), socket.inet_aton('0.0.0.0'))
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, hops)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    return sock, (group, port)
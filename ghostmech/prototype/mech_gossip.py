@@ -0,0 +1,179 @@
+import os
+import time
+import struct
+from collections import OrderedDict
+
+GOSSIP_INTERVAL = 2.0  # Seconds between gossip rounds
+GOSSIP_FANOUT = 4  # Neighbours gossiped to per round
+ROUTE_TTL = 30.0  # Seconds a learned route survives without being re-advertised
+MAX_HOPS = 8  # Routes and relayed messages never travel further than this
+MAX_ROUTES = 4096
+MAX_ROUTES_PER_NEIGHBOR = 256  # Destinations one neighbour may route for us
+RELAY_FANOUT = 3  # Neighbours a message is flooded to when no route is known
+DEDUP_SIZE = 16384  # Recently seen relay message ids
+
+# Session plaintext types (continuing MSG_BATCH / MSG_ACK from mech_outbox)
+MSG_GOSSIP = 0x03
+MSG_RELAY = 0x04
+GOSSIP_HEADER = struct.Struct(">BHH")  # type, sender's TCP port, entry count
+GOSSIP_ENTRY = struct.Struct(">12sB")  # destination id, hops from sender
+RELAY_HEADER = struct.Struct(">B16s12s12sB")  # type, message id, source, destination, hops left
+RELAY_PROOF = struct.Struct(">32s32s64s")  # source's static pub, signing pub, signature (after the header)
+
+def _id_bytes(node_id):
+    return node_id.encode()[:12].ljust(12, b"\0")
+
+def _id_str(raw):
+    return raw.rstrip(b"\0").decode('ascii', 'replace')
+
+def encode_gossip(port, entries):
+    parts = [GOSSIP_HEADER.pack(MSG_GOSSIP, port, len(entries))]
+    parts.extend(GOSSIP_ENTRY.pack(_id_bytes(dest), hops) for dest, hops in entries)
+    return b"".join(parts)
+
+def decode_gossip(data):
+    """Returns (sender port, [(destination, hops)])."""
+    _, port, count = GOSSIP_HEADER.unpack_from(data)
+    entries = []
+    for i in range(count):
+        dest, hops = GOSSIP_ENTRY.unpack_from(data, GOSSIP_HEADER.size + i * GOSSIP_ENTRY.size)
+        entries.append((_id_str(dest), hops))
+    return port, entries
+
+def relay_signed_data(msg_id, src, dst, body):
+    """What the source signs: everything but the hop count, which relays decrement."""
+    return b"".join((b"ghostmech-relay-v1", msg_id, _id_bytes(src), _id_bytes(dst), body))
+
+def encode_relay(msg_id, src, dst, hops_left, body, proof):
+    """proof is the source's (static pub, signing pub, signature); relays pass it on unchanged."""
+    return (RELAY_HEADER.pack(MSG_RELAY, msg_id, _id_bytes(src), _id_bytes(dst), hops_left) +
+            RELAY_PROOF.pack(*proof) + body)
+
+def decode_relay(data):
+    """Returns (message id, source, destination, hops left, body, proof)."""
+    _, msg_id, src, dst, hops_left = RELAY_HEADER.unpack_from(data)
+    proof = RELAY_PROOF.unpack_from(data, RELAY_HEADER.size)
+    return msg_id, _id_str(src), _id_str(dst), hops_left, data[RELAY_HEADER.size + RELAY_PROOF.size:], proof
+
+def new_message_id():
+    return os.urandom(16)
+
+class DedupCache:
+    """Bounded LRU of relay message ids, so floods and loops deliver each message once."""
+
+    def __init__(self, size=DEDUP_SIZE):
+        self.size = size
+        self._ids = OrderedDict()
+
+    def seen(self, msg_id):
+        """Returns True if msg_id was already seen; records it otherwise."""
+        if msg_id in self._ids:
+            self._ids.move_to_end(msg_id)
+            return True
+        self._ids[msg_id] = None
+        if len(self._ids) > self.size:
+            self._ids.popitem(last=False)
+        return False
+
+class RouteTable:
+    """
+    GHOST MECH - Distance-Vector Routes
+
+    Maps destination -> (next hop, hop count, expiry) for nodes that are not
+    direct peers. Neighbours advertise what they can reach; a route is adopted
+    when it is new, shorter, or comes from the current next hop. Advertisements
+    use split horizon and routes are capped at MAX_HOPS, which bounds
+    count-to-infinity after a node disappears.
+
+    Advertisements are unverified, so a neighbour is only believed within
+    limits: hop 0 is only itself, direct peers are never routed through
+    anyone, and it may claim at most max_per_neighbor destinations. That
+    bounds how much traffic a lying neighbour can draw into a black hole.
+    """
+
+    def __init__(self, my_id, ttl=ROUTE_TTL, max_hops=MAX_HOPS, max_routes=MAX_ROUTES,
+                 max_per_neighbor=MAX_ROUTES_PER_NEIGHBOR):
+        self.my_id = my_id
+        self.ttl = ttl
+        self.max_hops = max_hops
+        self.max_routes = max_routes
+        self.max_per_neighbor = max_per_neighbor
+        self.routes = {}  # {dest: [next_hop, hops, expires_at]}
+        self.claimed = {}  # {neighbor: number of routes through it}
+
+    def _set(self, dest, route):
+        old = self.routes.get(dest)
+        if old is not None:
+            self.claimed[old[0]] -= 1
+            if not self.claimed[old[0]]:
+                del self.claimed[old[0]]
+        self.routes[dest] = route
+        self.claimed[route[0]] = self.claimed.get(route[0], 0) + 1
+
+    def _drop(self, dest):
+        via = self.routes.pop(dest)[0]
+        self.claimed[via] -= 1
+        if not self.claimed[via]:
+            del self.claimed[via]
+
+    def learn(self, neighbor, entries, direct=()):
+        """
+        Merges a neighbour's advertisement; returns the number of routes added
+        or improved. direct holds our own peers, which stay off the table.
+        """
+        now = time.monotonic()
+        changed = 0
+        for dest, hops in entries:
+            if dest in (self.my_id, neighbor) or dest in direct or hops < 1:
+                continue  # Only the neighbour itself is 0 hops from it
+            hops += 1
+            if hops > self.max_hops:
+                continue
+            route = self.routes.get(dest)
+            if route is None or route[0] != neighbor:
+                if self.claimed.get(neighbor, 0) >= self.max_per_neighbor:
+                    continue
+            if route is None:
+                if len(self.routes) >= self.max_routes:
+                    continue
+                self._set(dest, [neighbor, hops, now + self.ttl])
+                changed += 1
+            elif route[0] == neighbor or hops < route[1] or route[2] < now:
+                if hops < route[1] or route[0] != neighbor:
+                    changed += 1
+                self._set(dest, [neighbor, hops, now + self.ttl])
+        return changed
+
+    def next_hop(self, dest):
+        route = self.routes.get(dest)
+        if route is None or route[2] < time.monotonic():
+            return None
+        return route[0], route[1]
+
+    def drop_via(self, neighbor):
+        for dest in [d for d, r in self.routes.items() if r[0] == neighbor]:
+            self._drop(dest)
+
+    def forget(self, dest):
+        """dest became a direct peer: reach it directly, not through a neighbour's word."""
+        if dest in self.routes:
+            self._drop(dest)
+
+    def prune(self):
+        now = time.monotonic()
+        for dest in [d for d, r in self.routes.items() if r[2] < now]:
+            self._drop(dest)
+
+    def advertise(self, to_neighbor, direct_ids):
+        """What we tell to_neighbor: ourselves, our direct peers, and routes not learned from it."""
+        now = time.monotonic()
+        entries = [(self.my_id, 0)]
+        entries.extend((pid, 1) for pid in direct_ids if pid != to_neighbor)
+        direct = set(direct_ids)
+        for dest, (via, hops, expires) in self.routes.items():
+            if via != to_neighbor and expires >= now and dest not in direct and dest != to_neighbor:
+                entries.append((dest, hops))
+        return entries[:self.max_routes]
+
+    def resolve(self, prefix):
+        return [dest for dest in list(self.routes) if dest.startswith(prefix)]
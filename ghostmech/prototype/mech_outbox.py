@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import struct
+from collections import deque
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+
+from mech_session import is_node_id
+
+OUTBOX_DIR = "ghostmech_outbox"
+MAX_BATCH = 64  # Messages coalesced into one frame
+MAX_BATCH_BYTES = 256 * 1024
+RECORD_HEADER = struct.Struct(">I")
+RECEIPTS_FILE = "received.state"
+COMPACT_DEAD_RECORDS = 256  # Acked records a log may carry before it is rewritten around its pending tail
+RECEIPTS_EVERY = 32  # Batches between receipt checkpoints...
+RECEIPTS_INTERVAL = 1.0  # ...or seconds, whichever comes first
+
+# Session plaintext types
+MSG_BATCH = 0x01
+MSG_ACK = 0x02
+BATCH_HEADER = struct.Struct(">B8sQH")  # type, sender's stream id, id of first message, message count
+ACK_FRAME = struct.Struct(">BQ")  # type, id of last delivered message
+ITEM_HEADER = struct.Struct(">I")
+
+def encode_batch(stream, first_id, bodies):
+    parts = [BATCH_HEADER.pack(MSG_BATCH, stream, first_id, len(bodies))]
+    for body in bodies:
+        parts.append(ITEM_HEADER.pack(len(body)))
+        parts.append(body)
+    return b"".join(parts)
+
+def decode_batch(data):
+    """Returns (stream, first_id, [bodies])."""
+    _, stream, first_id, count = BATCH_HEADER.unpack_from(data)
+    offset = BATCH_HEADER.size
+    bodies = []
+    for _ in range(count):
+        (length,) = ITEM_HEADER.unpack_from(data, offset)
+        offset += ITEM_HEADER.size
+        bodies.append(data[offset:offset + length])
+        offset += length
+    return stream, first_id, bodies
+
+def _aead(ghost_key, info):
+    return ChaCha20Poly1305(HKDF(algorithm=hashes.SHA256(), length=32, salt=None, info=info).derive(ghost_key.encode()))
+
+def _open_any(aeads, sealed, aad):
+    """Plaintext under the first key that authenticates it, and that key's position (None, None if none)."""
+    for i, aead in enumerate(aeads):
+        if aead is not None:
+            try:
+                return aead.decrypt(sealed[:12], sealed[12:], aad), i
+            except Exception:
+                pass
+    return None, None
+
+def encode_ack(last_id):
+    return ACK_FRAME.pack(MSG_ACK, last_id)
+
+def decode_ack(data):
+    return ACK_FRAME.unpack(data)[1]
+
+class Outbound:
+    __slots__ = ('msg_id', 'body', 'enqueued_at')
+
+    def __init__(self, msg_id, body, enqueued_at):
+        self.msg_id = msg_id
+        self.body = body
+        self.enqueued_at = enqueued_at
+
+class PeerQueue:
+    def __init__(self):
+        self.pending = deque()
+        self.stream = os.urandom(8)  # Names this run of ids; a fresh queue restarts at 1 under a new one
+        self.next_id = 1
+        self.dead = 0  # Log records no longer needed: acks and acked messages
+        self.delivered = 0
+        self.last_latency = None
+        self.avg_latency = None
+
+class Outbox:
+    """
+    GHOST MECH - Store-and-Forward Outbox
+
+    Per-peer FIFO of messages awaiting acknowledgement. Every enqueue and ack is
+    appended to ghostmech_outbox/<peer>.log as a sealed record (key derived
+    from the hardware-bound ghost key), so undelivered messages survive a
+    restart. Records sealed under legacy_key are still read, and the log is
+    then rewritten under the current key.
+
+    A log is rewritten to its id counter plus the pending messages whenever
+    the queue drains or COMPACT_DEAD_RECORDS acked records pile up, so a peer
+    that always has something pending does not grow it forever.
+
+    The queues belong to the event loop thread; other threads go through it. The log is
+    compacted to a single id-counter record whenever a queue drains.
+
+    Ids are scoped to a random stream id sent with every batch: if the log is
+    lost, the queue restarts at id 1 under a new stream, and receivers reset
+    their duplicate filter instead of discarding everything as retransmits.
+    """
+
+    def __init__(self, ghost_key, directory=OUTBOX_DIR, legacy_key=None):
+        self.directory = directory
+        self.aead = _aead(ghost_key, b"ghostmech-outbox-v1")
+        self.legacy = _aead(legacy_key, b"ghostmech-outbox-v1") if legacy_key else None
+        self.queues = {}  # {peer_id: PeerQueue}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load()
+
+    def _path(self, peer_id):
+        if not is_node_id(peer_id):
+            raise ValueError(f"Not a GhostMech node id: {peer_id!r}")
+        return os.path.join(self.directory, f"{peer_id}.log")
+
+    def _seal(self, peer_id, record):
+        nonce = os.urandom(12)
+        sealed = nonce + self.aead.encrypt(nonce, json.dumps(record).encode(), peer_id.encode())
+        return RECORD_HEADER.pack(len(sealed)) + sealed
+
+    def _append(self, peer_id, record):
+        if not self.directory:
+            return
+        path = self._path(peer_id)
+        fresh = not os.path.exists(path)
+        with open(path, 'ab') as f:
+            if fresh:
+                f.write(self._seal(peer_id, {"stream": self.queue(peer_id).stream.hex()}))
+            f.write(self._seal(peer_id, record))
+
+    def _load(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith(".log"):
+                continue
+            peer_id = name[:-len(".log")]
+            if not is_node_id(peer_id):
+                continue
+            queue = self.queues[peer_id] = PeerQueue()
+            with open(self._path(peer_id), 'rb') as f:
+                data = f.read()
+            offset = 0
+            legacy = False
+            records = 0
+            while offset + RECORD_HEADER.size <= len(data):
+                (length,) = RECORD_HEADER.unpack_from(data, offset)
+                sealed = data[offset + RECORD_HEADER.size:offset + RECORD_HEADER.size + length]
+                offset += RECORD_HEADER.size + length
+                plain, which = _open_any((self.aead, self.legacy), sealed, peer_id.encode())
+                if plain is None:
+                    offset = -1
+                    break  # Torn or foreign tail
+                legacy = legacy or which == 1
+                records += 1
+                record = json.loads(plain)
+                if 'stream' in record:
+                    queue.stream = bytes.fromhex(record['stream'])
+                if 'next_id' in record:
+                    queue.next_id = record['next_id']
+                elif 'ack' in record:
+                    while queue.pending and queue.pending[0].msg_id <= record['ack']:
+                        queue.pending.popleft()
+                elif 'id' in record:
+                    queue.pending.append(Outbound(record['id'], bytes.fromhex(record['body']), record['ts']))
+                    queue.next_id = record['id'] + 1
+            queue.dead = max(0, records - len(queue.pending) - 1)
+            if legacy or offset != len(data) or queue.dead >= COMPACT_DEAD_RECORDS:
+                self._rewrite(peer_id, queue)  # Re-seal under the current key, cut a torn tail, or shrink
+            if queue.pending:
+                print(f"[*] Outbox restored {len(queue.pending)} undelivered messages for {peer_id}.")
+
+    def queue(self, peer_id):
+        queue = self.queues.get(peer_id)
+        if queue is None:
+            queue = self.queues[peer_id] = PeerQueue()
+        return queue
+
+    def enqueue(self, peer_id, body):
+        queue = self.queue(peer_id)
+        msg = Outbound(queue.next_id, body, time.time())
+        queue.next_id += 1
+        self._append(peer_id, {"id": msg.msg_id, "body": body.hex(), "ts": msg.enqueued_at})
+        queue.pending.append(msg)
+        return msg.msg_id
+
+    def next_batch(self, peer_id, max_batch=MAX_BATCH, max_bytes=MAX_BATCH_BYTES):
+        """Returns the oldest pending messages that fit in one frame (always at least one)."""
+        batch = []
+        size = 0
+        for msg in self.queue(peer_id).pending:
+            if batch and (len(batch) >= max_batch or size + len(msg.body) > max_bytes):
+                break
+            batch.append(msg)
+            size += len(msg.body)
+        return batch
+
+    def ack(self, peer_id, last_id):
+        """Drops every message up to last_id and records delivery latency."""
+        queue = self.queue(peer_id)
+        now = time.time()
+        acked = 0
+        while queue.pending and queue.pending[0].msg_id <= last_id:
+            msg = queue.pending.popleft()
+            latency = now - msg.enqueued_at
+            queue.last_latency = latency
+            queue.avg_latency = latency if queue.avg_latency is None else 0.9 * queue.avg_latency + 0.1 * latency
+            acked += 1
+        if acked:
+            queue.delivered += acked
+            queue.dead += acked + 1
+            if queue.pending and queue.dead < COMPACT_DEAD_RECORDS:
+                self._append(peer_id, {"ack": last_id})
+            else:
+                self._compact(peer_id, queue)
+        return acked
+
+    def _compact(self, peer_id, queue):
+        """Keeps the id counter (so receivers never see an id twice) and the pending tail."""
+        self._rewrite(peer_id, queue)
+        queue.dead = 0
+
+    def _rewrite(self, peer_id, queue):
+        """Replaces the log with the id counter plus the messages still pending."""
+        if not self.directory:
+            return
+        tmp = self._path(peer_id) + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(self._seal(peer_id, {"stream": queue.stream.hex(), "next_id": queue.next_id}))
+            for msg in queue.pending:
+                f.write(self._seal(peer_id, {"id": msg.msg_id, "body": msg.body.hex(), "ts": msg.enqueued_at}))
+        os.replace(tmp, self._path(peer_id))
+
+    def stream(self, peer_id):
+        return self.queue(peer_id).stream
+
+    def depth(self, peer_id):
+        queue = self.queues.get(peer_id)
+        return len(queue.pending) if queue else 0
+
+    def stats(self):
+        """Per-peer depth, oldest message age and delivery latency. Loop thread only."""
+        now = time.time()
+        report = {}
+        for peer_id, queue in list(self.queues.items()):
+            report[peer_id] = {
+                "depth": len(queue.pending),
+                "oldest_age": now - queue.pending[0].enqueued_at if queue.pending else 0.0,
+                "delivered": queue.delivered,
+                "last_latency": queue.last_latency,
+                "avg_latency": queue.avg_latency,
+            }
+        return report
+
+class Receipts:
+    """
+    Receiving side: the last delivered id per sender and stream, sealed to
+    disk so a restart does not redeliver retransmitted batches. A batch on a
+    new stream (the sender lost its outbox) starts that sender over. A file
+    sealed under legacy_key is read and re-sealed on the next record.
+
+    record() only updates memory. The node checkpoints every RECEIPTS_EVERY
+    batches or RECEIPTS_INTERVAL seconds: seal() snapshots on the loop thread
+    and write() fsyncs on the disk thread. A crash can lose the last few
+    receipts, and a batch whose ack was also lost may then be shown twice.
+    """
+
+    def __init__(self, ghost_key, directory=OUTBOX_DIR, legacy_key=None):
+        self.aead = _aead(ghost_key, b"ghostmech-receipts-v1")
+        legacy = _aead(legacy_key, b"ghostmech-receipts-v1") if legacy_key else None
+        self.path = os.path.join(directory, RECEIPTS_FILE) if directory else None
+        self.last = {}  # {sender_id: (stream, last delivered id)}
+        self.unsaved = 0  # Batches recorded since the last seal()
+        if self.path and os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                plain, _ = _open_any((self.aead, legacy), f.read(), b"receipts")
+            try:
+                state = json.loads(plain)
+                self.last = {peer: (bytes.fromhex(stream), last) for peer, (stream, last) in state.items()}
+            except (TypeError, ValueError):
+                print(f"[!] Ignoring unreadable {self.path}; retransmits may be shown twice.")
+
+    def skip(self, sender_id, stream, first_id):
+        """How many leading messages of a batch starting at first_id were already delivered."""
+        seen_stream, last = self.last.get(sender_id, (None, 0))
+        return max(0, last - first_id + 1) if seen_stream == stream else 0
+
+    def record(self, sender_id, stream, last_id):
+        """Returns True once enough batches are unsaved that a checkpoint is due."""
+        seen_stream, last = self.last.get(sender_id, (None, 0))
+        if seen_stream == stream and last_id <= last:
+            return False
+        self.last[sender_id] = (stream, last_id)
+        self.unsaved += 1
+        return self.unsaved >= RECEIPTS_EVERY
+
+    def seal(self):
+        """The current state, sealed, or None if nothing changed since the last call."""
+        if not self.unsaved or not self.path:
+            self.unsaved = 0
+            return None
+        self.unsaved = 0
+        nonce = os.urandom(12)
+        state = {peer: (s.hex(), n) for peer, (s, n) in self.last.items()}
+        return nonce + self.aead.encrypt(nonce, json.dumps(state).encode(), b"receipts")
+
+    def write(self, sealed):
+        tmp = self.path + ".tmp"
+        with open(tmp, 'wb') as f:
+            f.write(sealed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def flush(self):
+        sealed = self.seal()
+        if sealed is not None:
+            self.write(sealed)
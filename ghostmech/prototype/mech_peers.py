@@ -0,0 +1,160 @@
+import time
+import heapq
+import bisect
+import threading
+from collections import OrderedDict
+
+PEER_TTL = 30.0  # Seconds without a beacon before a peer is evicted (unless it announces a longer one)
+MAX_PEERS = 4096  # Hard bound on the table; least recently seen peers go first
+MAX_FAILURES = 3  # Consecutive send failures before a peer is evicted
+RTT_ALPHA = 0.2  # Weight of a new sample in the smoothed RTT
+
+class PeerInfo:
+    __slots__ = ('peer_id', 'ip', 'port', 'status', 'first_seen', 'last_seen', 'rtt', 'failures', 'ttl', 'deadline')
+
+    def __init__(self, peer_id, ip, port, now, ttl):
+        self.peer_id = peer_id
+        self.ip = ip
+        self.port = port  # TCP message port announced in the beacon
+        self.status = "active"
+        self.first_seen = now
+        self.last_seen = now
+        self.rtt = None  # Smoothed seconds, None until measured
+        self.failures = 0
+        self.ttl = ttl  # From this peer's own announced beacon interval
+        self.deadline = now + ttl  # Of its live entry in the expiry heap
+
+class PeerTable:
+    """
+    GHOST MECH - Peer Registry
+
+    Peers are kept in an OrderedDict ordered by last-seen time, so the size
+    bound only ever pops from the front (O(1) per eviction). Each peer has its
+    own TTL, so expiry runs off a heap of deadlines instead: a refreshed peer's
+    entry is pushed back when it surfaces, keeping one entry per peer. A
+    sorted id list gives O(log n) prefix lookup. All methods are thread-safe,
+    as the event loop writes while the CLI thread reads.
+    """
+
+    def __init__(self, ttl=PEER_TTL, max_peers=MAX_PEERS, max_failures=MAX_FAILURES):
+        self.ttl = ttl
+        self.max_peers = max_peers
+        self.max_failures = max_failures
+        self._peers = OrderedDict()  # {peer_id: PeerInfo}, oldest last_seen first
+        self._sorted_ids = []
+        self._deadlines = []  # Heap of (deadline, peer_id); stale entries are skipped
+        self._lock = threading.Lock()
+
+    def _insert(self, info):
+        self._peers[info.peer_id] = info
+        bisect.insort(self._sorted_ids, info.peer_id)
+        heapq.heappush(self._deadlines, (info.deadline, info.peer_id))
+
+    def _delete(self, peer_id):
+        info = self._peers.pop(peer_id, None)
+        if info is not None:
+            i = bisect.bisect_left(self._sorted_ids, peer_id)
+            if i < len(self._sorted_ids) and self._sorted_ids[i] == peer_id:
+                del self._sorted_ids[i]
+        return info
+
+    def seen(self, peer_id, ip, port, status="active", ttl=None):
+        """
+        Records a beacon. ttl=None keeps a known peer's TTL (the table default
+        for a new one). Returns 'new', 'moved', 'left' or None (refresh only).
+        """
+        now = time.monotonic()
+        with self._lock:
+            info = self._peers.get(peer_id)
+            if status == "leaving":
+                return "left" if self._delete(peer_id) is not None else None
+            if info is None:
+                while len(self._peers) >= self.max_peers:
+                    self._delete(next(iter(self._peers)))
+                self._insert(PeerInfo(peer_id, ip, port, now, ttl or self.ttl))
+                return "new"
+            info.last_seen = now
+            info.ttl = ttl or info.ttl
+            if now + info.ttl < info.deadline:  # Shorter than its heap entry assumes: re-file it
+                info.deadline = now + info.ttl
+                heapq.heappush(self._deadlines, (info.deadline, peer_id))
+            info.status = status
+            self._peers.move_to_end(peer_id)
+            if (info.ip, info.port) != (ip, port):
+                info.ip = ip
+                info.port = port
+                info.rtt = None
+                return "moved"
+            return None
+
+    def expire(self):
+        """Evicts every peer not seen within its own TTL. Returns [(peer_id, ttl)]."""
+        now = time.monotonic()
+        expired = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, peer_id = heapq.heappop(self._deadlines)
+                info = self._peers.get(peer_id)
+                if info is None or info.deadline != deadline:
+                    continue  # Peer already gone, or this entry was superseded
+                if info.last_seen + info.ttl > now:
+                    info.deadline = info.last_seen + info.ttl  # Refreshed since: file it again
+                    heapq.heappush(self._deadlines, (info.deadline, peer_id))
+                    continue
+                self._delete(peer_id)
+                expired.append((peer_id, info.ttl))
+        return expired
+
+    def get(self, peer_id):
+        with self._lock:
+            return self._peers.get(peer_id)
+
+    def remove(self, peer_id):
+        with self._lock:
+            return self._delete(peer_id)
+
+    def resolve(self, prefix):
+        """Returns every peer whose id starts with prefix (binary search on sorted ids)."""
+        with self._lock:
+            i = bisect.bisect_left(self._sorted_ids, prefix)
+            matches = []
+            while i < len(self._sorted_ids) and self._sorted_ids[i].startswith(prefix):
+                matches.append(self._peers[self._sorted_ids[i]])
+                i += 1
+            return matches
+
+    def record_rtt(self, peer_id, seconds):
+        with self._lock:
+            info = self._peers.get(peer_id)
+            if info is not None:
+                info.rtt = seconds if info.rtt is None else (1 - RTT_ALPHA) * info.rtt + RTT_ALPHA * seconds
+                info.failures = 0
+
+    def record_success(self, peer_id):
+        with self._lock:
+            info = self._peers.get(peer_id)
+            if info is not None:
+                info.failures = 0
+
+    def record_failure(self, peer_id):
+        """Counts a failed send; returns True if the peer was evicted as a result."""
+        with self._lock:
+            info = self._peers.get(peer_id)
+            if info is None:
+                return False
+            info.failures += 1
+            if info.failures >= self.max_failures:
+                self._delete(peer_id)
+                return True
+            return False
+
+    def snapshot(self):
+        """Peers ordered by id, for display."""
+        with self._lock:
+            return [self._peers[pid] for pid in self._sorted_ids]
+
+    def __len__(self):
+        return len(self._peers)
+
+    def __contains__(self, peer_id):
+        return peer_id in self._peers
@@ -0,0 +1,159 @@
+import re
+import base64
+import struct
+import asyncio
+import hashlib
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey, Ed25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.exceptions import InvalidTag, InvalidSignature
+
+from mech_wire import read_frame, write_frame
+
+HELLO = struct.Struct(">4s12s32s32s32s")  # magic, node id, static public key, signing public key, ephemeral public key
+HELLO_MAGIC = b"GMH2"  # v2: ids are hashes of the static key
+HANDSHAKE_TIMEOUT = 5.0
+IDENTITY_ENTRY = "ghostmech.identity"  # VaultZero store entry holding the static and signing private keys
+NODE_ID_CHARS = 12  # Base32 characters of the key hash: 60 bits
+NODE_ID_RE = re.compile(r"[a-z2-7]{%d}" % NODE_ID_CHARS)
+
+class HandshakeError(Exception):
+    """Raised when a peer fails the session handshake."""
+
+def _raw(public_key):
+    return public_key.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+
+def _raw_private(private_key):
+    return private_key.private_bytes(serialization.Encoding.Raw, serialization.PrivateFormat.Raw,
+                                     serialization.NoEncryption())
+
+def node_id_for(static_pub, sign_pub):
+    """Self-certifying node id: a truncated hash of both public keys, base32 (a-z, 2-7)."""
+    digest = hashlib.sha256(b"ghostmech-node-id-v1" + static_pub + sign_pub).digest()
+    return base64.b32encode(digest).decode('ascii')[:NODE_ID_CHARS].lower()
+
+def is_node_id(value):
+    return isinstance(value, str) and NODE_ID_RE.fullmatch(value) is not None
+
+def load_identity(store=None, entry=IDENTITY_ENTRY):
+    """
+    The node's static X25519 key and Ed25519 signing key: random on first
+    run, then kept encrypted in the VaultZero store. Without a store the
+    identity only lasts this run. Returns (static_key, signing_key).
+    """
+    raw = store.get(entry) if store is not None else None
+    if raw is not None and len(raw) == 64:
+        return X25519PrivateKey.from_private_bytes(raw[:32]), Ed25519PrivateKey.from_private_bytes(raw[32:])
+    static_key, signing_key = X25519PrivateKey.generate(), Ed25519PrivateKey.generate()
+    if store is not None:
+        store.put(entry, _raw_private(static_key) + _raw_private(signing_key))
+    return static_key, signing_key
+
+def verify_origin(node_id, static_pub, sign_pub, signature, data):
+    """True if the keys hash to node_id and signature is that node's signature over data."""
+    if node_id != node_id_for(static_pub, sign_pub):
+        return False
+    try:
+        Ed25519PublicKey.from_public_bytes(sign_pub).verify(signature, data)
+    except (InvalidSignature, ValueError):
+        return False
+    return True
+
+class Session:
+    """
+    AEAD channel for one direction pair of a connection.
+
+    ChaCha20-Poly1305 with a 96-bit nonce = 4 zero bytes + 64-bit message
+    counter. TCP keeps frames ordered, so counters never need to be sent; a
+    replayed, dropped or reordered frame fails authentication.
+    """
+
+    def __init__(self, peer_id, send_key, recv_key):
+        self.peer_id = peer_id
+        self._send = ChaCha20Poly1305(send_key)
+        self._recv = ChaCha20Poly1305(recv_key)
+        self._send_counter = 0
+        self._recv_counter = 0
+
+    def seal(self, plaintext):
+        nonce = b"\0\0\0\0" + self._send_counter.to_bytes(8, 'big')
+        self._send_counter += 1
+        return self._send.encrypt(nonce, plaintext, None)
+
+    def open(self, ciphertext):
+        nonce = b"\0\0\0\0" + self._recv_counter.to_bytes(8, 'big')
+        try:
+            plaintext = self._recv.decrypt(nonce, ciphertext, None)
+        except InvalidTag:
+            raise HandshakeError(f"Frame from {self.peer_id} failed authentication.")
+        self._recv_counter += 1
+        return plaintext
+
+class Handshaker:
+    """
+    Per-connection key exchange.
+
+    Both sides send HELLO(id, static pub, ephemeral pub). The session secret is
+    HKDF(DH(eph, eph) || DH(static, static)) salted with both HELLOs: the
+    ephemeral half gives forward secrecy, the static half binds the session to
+    the peer's identity. Ids are hashes of the public keys, so a HELLO whose
+    keys do not hash to its id is refused and no id can be claimed by another
+    key. The signing key is not used here; it lets the node sign frames that
+    travel beyond one session (relayed messages).
+    """
+
+    def __init__(self, static_key, signing_key):
+        self.static_key = static_key
+        self.static_pub = _raw(static_key.public_key())
+        self.signing_key = signing_key
+        self.sign_pub = _raw(signing_key.public_key())
+        self.node_id = node_id_for(self.static_pub, self.sign_pub)
+
+    def sign(self, data):
+        """Our origin proof for data: (static pub, signing pub, Ed25519 signature)."""
+        return self.static_pub, self.sign_pub, self.signing_key.sign(data)
+
+    def _hello(self, ephemeral):
+        return HELLO.pack(HELLO_MAGIC, self.node_id.encode()[:12].ljust(12, b"\0"),
+                          self.static_pub, self.sign_pub, _raw(ephemeral.public_key()))
+
+    def _parse(self, frame):
+        if frame is None or len(frame) != HELLO.size:
+            raise HandshakeError("Malformed or missing HELLO.")
+        magic, peer_id, static_pub, sign_pub, eph_pub = HELLO.unpack(frame)
+        if magic != HELLO_MAGIC:
+            raise HandshakeError("Unknown handshake version.")
+        peer_id = peer_id.rstrip(b"\0").decode('ascii', 'replace')
+        if peer_id != node_id_for(static_pub, sign_pub):
+            raise HandshakeError(f"Key presented for {peer_id} does not match that id; refusing session.")
+        return peer_id, static_pub, eph_pub
+
+    def _derive(self, ephemeral, static_pub, eph_pub, initiator_hello, responder_hello, initiator):
+        ee = ephemeral.exchange(X25519PublicKey.from_public_bytes(eph_pub))
+        ss = self.static_key.exchange(X25519PublicKey.from_public_bytes(static_pub))
+        keys = HKDF(algorithm=hashes.SHA256(), length=64, salt=initiator_hello + responder_hello,
+                    info=b"ghostmech-session-v1").derive(ee + ss)
+        i2r, r2i = keys[:32], keys[32:]
+        return (i2r, r2i) if initiator else (r2i, i2r)
+
+    async def initiate(self, reader, writer, expected_id=None):
+        ephemeral = X25519PrivateKey.generate()
+        hello = self._hello(ephemeral)
+        await write_frame(writer, hello)
+        reply = await asyncio.wait_for(read_frame(reader), HANDSHAKE_TIMEOUT)
+        peer_id, static_pub, eph_pub = self._parse(reply)
+        if expected_id is not None and peer_id != expected_id:
+            raise HandshakeError(f"Expected {expected_id}, reached {peer_id}.")
+        send_key, recv_key = self._derive(ephemeral, static_pub, eph_pub, hello, reply, True)
+        return Session(peer_id, send_key, recv_key)
+
+    async def respond(self, reader, writer):
+        hello = await asyncio.wait_for(read_frame(reader), HANDSHAKE_TIMEOUT)
+        peer_id, static_pub, eph_pub = self._parse(hello)
+        ephemeral = X25519PrivateKey.generate()
+        reply = self._hello(ephemeral)
+        await write_frame(writer, reply)
+        send_key, recv_key = self._derive(ephemeral, static_pub, eph_pub, hello, reply, False)
+        return Session(peer_id, send_key, recv_key)
@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import struct
+import asyncio
+import shutil
+import hashlib
+
+INCOMING_DIR = "ghostmech_incoming"
+FILE_CHUNK = 256 * 1024
+FILE_WINDOW = 8  # Chunks in flight before waiting for an acknowledgement
+STATE_EVERY = 32  # Chunks between offset checkpoints...
+STATE_INTERVAL = 2.0  # ...or seconds, whichever comes first
+MAX_FILE_SIZE = 64 * 1024 ** 3  # Largest offer accepted
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+FREE_SPACE_MARGIN = 64 * 1024 * 1024  # Left free on the disk after an accepted offer
+
+# Session plaintext types (continuing mech_outbox / mech_gossip)
+MSG_FILE_OFFER = 0x05
+MSG_FILE_CHUNK = 0x06
+MSG_FILE_ACK = 0x07
+OFFER_HEADER = struct.Struct(">B16sQI")  # type, transfer id, file size, chunk size (+ utf-8 name)
+CHUNK_HEADER = struct.Struct(">B16sQ32s")  # type, transfer id, offset, sha256 of the data (+ data)
+FILE_ACK = struct.Struct(">B16sQB")  # type, transfer id, next offset wanted, status
+
+ACK_OK = 0
+ACK_REWIND = 1  # Chunk failed its hash: resend from offset
+
+def encode_offer(transfer_id, size, chunk_size, name):
+    return OFFER_HEADER.pack(MSG_FILE_OFFER, transfer_id, size, chunk_size) + name.encode()
+
+def decode_offer(data):
+    _, transfer_id, size, chunk_size = OFFER_HEADER.unpack_from(data)
+    return transfer_id, size, chunk_size, data[OFFER_HEADER.size:].decode('utf-8', 'replace')
+
+def decode_chunk(data):
+    """Returns (transfer id, offset, digest, data view) without copying the chunk."""
+    _, transfer_id, offset, digest = CHUNK_HEADER.unpack_from(data)
+    return transfer_id, offset, digest, memoryview(data)[CHUNK_HEADER.size:]
+
+def encode_file_ack(transfer_id, offset, status=ACK_OK):
+    return FILE_ACK.pack(MSG_FILE_ACK, transfer_id, offset, status)
+
+def decode_file_ack(data):
+    _, transfer_id, offset, status = FILE_ACK.unpack(data)
+    return transfer_id, offset, status
+
+class OutgoingFile:
+    """
+    Sender side of one transfer.
+
+    The transfer id is derived from the sender, path, size and mtime, so
+    re-sending an unchanged file after a disconnect or restart resumes the
+    receiver's partial copy. Chunks are read with readinto into a buffer that
+    is reused for every chunk; acks carry the receiver's next wanted offset.
+    """
+
+    def __init__(self, node_id, path, chunk_size=FILE_CHUNK, window=FILE_WINDOW):
+        stat = os.stat(path)
+        self.path = path
+        self.name = os.path.basename(path)
+        self.size = stat.st_size
+        self.chunk_size = chunk_size
+        self.window = window
+        self.transfer_id = hashlib.sha256(
+            f"{node_id}|{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}".encode()).digest()[:16]
+        self.file = open(path, 'rb')
+        self.buffer = bytearray(CHUNK_HEADER.size + chunk_size)
+        self.view = memoryview(self.buffer)
+        self.next_offset = 0  # Next byte to send
+        self.acked = None  # Receiver's contiguous offset, None until it answers the offer
+        self.progress = asyncio.Event()
+        self.started = time.monotonic()
+        self.resumed_from = 0
+
+    def offer(self):
+        self.acked = None
+        return encode_offer(self.transfer_id, self.size, self.chunk_size, self.name)
+
+    def in_flight(self):
+        return self.next_offset - (self.acked or 0)
+
+    def can_send(self):
+        return self.next_offset < self.size and self.in_flight() < self.window * self.chunk_size
+
+    def next_chunk(self):
+        """Reads the chunk at next_offset into the shared buffer; returns a view of the frame."""
+        self.file.seek(self.next_offset)
+        body = self.view[CHUNK_HEADER.size:]
+        length = self.file.readinto(body)
+        if not length:
+            raise OSError(f"{self.path} shrank during transfer.")
+        digest = hashlib.sha256(body[:length]).digest()
+        CHUNK_HEADER.pack_into(self.buffer, 0, MSG_FILE_CHUNK, self.transfer_id, self.next_offset, digest)
+        self.next_offset += length
+        return self.view[:CHUNK_HEADER.size + length]
+
+    def on_ack(self, offset, status):
+        if self.acked is None:
+            # Answer to an offer: resume from what the receiver already holds
+            self.acked = self.next_offset = self.resumed_from = offset
+        elif status == ACK_REWIND:
+            self.acked = self.next_offset = min(offset, self.next_offset)
+        else:
+            self.acked = max(self.acked, offset)
+        self.progress.set()
+
+    @property
+    def done(self):
+        return self.acked is not None and self.acked >= self.size
+
+    def close(self):
+        self.view.release()
+        self.file.close()
+
+class IncomingFiles:
+    """
+    Receiver side: partial files and their acknowledged offsets.
+
+    Data goes to <dir>/<transfer id>.part and the contiguous verified offset to
+    <transfer id>.json. The offset is checkpointed every STATE_EVERY chunks or
+    STATE_INTERVAL seconds, always after fsyncing the data, so the saved
+    offset never runs ahead of what is on disk; after a crash the sender
+    resends the few chunks past the last checkpoint. A transfer only accepts
+    offers and chunks from the peer that first offered it.
+
+    Every method blocks on the disk: the node calls them from a worker thread,
+    one at a time, never on the event loop.
+    """
+
+    def __init__(self, directory=INCOMING_DIR):
+        self.directory = directory
+        self.open_files = {}  # {transfer_id: file object}
+        self.states = {}  # {transfer_id: state dict}, cached copy of the .json records
+        self.unsaved = {}  # {transfer_id: (chunks since the last checkpoint, monotonic time of it)}
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, transfer_id, suffix):
+        return os.path.join(self.directory, transfer_id.hex() + suffix)
+
+    def _load(self, transfer_id):
+        state = self.states.get(transfer_id)
+        if state is None:
+            try:
+                with open(self._path(transfer_id, ".json"), 'r') as f:
+                    state = self.states[transfer_id] = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                return None
+        return state
+
+    def _save(self, transfer_id, state):
+        tmp = self._path(transfer_id, ".json.tmp")
+        with open(tmp, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self._path(transfer_id, ".json"))
+        self._sync_dir()
+        self.states[transfer_id] = state
+
+    def _sync_dir(self):
+        """Makes renames in the directory durable (POSIX only)."""
+        if hasattr(os, 'O_DIRECTORY'):
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def offer(self, sender_id, transfer_id, size, chunk_size, name):
+        """
+        Registers (or resumes) a transfer; returns (state, offset the sender
+        should start from), or (None, None) if another peer owns the transfer.
+        Raises ValueError for sizes out of bounds or a file the disk cannot hold.
+        """
+        if size > MAX_FILE_SIZE or not 0 < chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"size {size} / chunk size {chunk_size} out of bounds")
+        state = self._load(transfer_id)
+        if state is not None and state['sender'] != sender_id:
+            return None, None
+        if state is None or state['size'] != size:
+            free = shutil.disk_usage(self.directory).free
+            if free < size + FREE_SPACE_MARGIN:
+                raise ValueError(f"{size} bytes offered, only {free} free")
+            state = {"sender": sender_id, "name": os.path.basename(name) or "file", "size": size,
+                     "chunk_size": chunk_size, "offset": 0, "complete": None}
+            open(self._path(transfer_id, ".part"), 'wb').close()
+            self._save(transfer_id, state)
+        if state['complete'] is None and state['offset'] >= size:
+            self._finish(transfer_id, state)
+        return state, state['offset']
+
+    def write(self, sender_id, transfer_id, offset, digest, data):
+        """
+        Appends a verified chunk; returns (state, next offset wanted, status).
+        Status is None when no reply is due: an unknown transfer (the sender's
+        ack timeout makes it re-offer), one offered by another peer, or a chunk
+        past a gap left by a rejected one, which the sender is already resending.
+        """
+        state = self._load(transfer_id)
+        if state is None or state['sender'] != sender_id:
+            return None, 0, None
+        if state['complete'] is not None or offset < state['offset']:
+            return state, state['offset'], ACK_OK  # Duplicate from before a resume
+        if offset > state['offset']:
+            return state, state['offset'], None
+        if len(data) > state['chunk_size']:
+            return state, state['offset'], None  # Not what was offered
+        if hashlib.sha256(data).digest() != digest:
+            return state, state['offset'], ACK_REWIND
+        f = self.open_files.get(transfer_id)
+        if f is None:
+            f = self.open_files[transfer_id] = open(self._path(transfer_id, ".part"), 'r+b')
+        f.seek(offset)
+        f.write(data)
+        state['offset'] = offset + len(data)
+        if state['offset'] >= state['size']:
+            self._finish(transfer_id, state)
+        else:
+            self._checkpoint(transfer_id, state)
+        return state, state['offset'], ACK_OK
+
+    def _checkpoint(self, transfer_id, state, force=False):
+        """Saves the offset once enough chunks or time have passed (or when forced)."""
+        now = time.monotonic()
+        chunks, since = self.unsaved.get(transfer_id, (0, now))
+        if not force:
+            chunks += 1
+            if chunks < STATE_EVERY and now - since < STATE_INTERVAL:
+                self.unsaved[transfer_id] = (chunks, since)
+                return
+        f = self.open_files.get(transfer_id)
+        if f is not None:
+            f.flush()
+            os.fsync(f.fileno())  # Data first: the saved offset must never run ahead of it
+        self._save(transfer_id, state)
+        self.unsaved.pop(transfer_id, None)
+
+    def _finish(self, transfer_id, state):
+        self.unsaved.pop(transfer_id, None)
+        f = self.open_files.pop(transfer_id, None)
+        if f is not None:
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+        base, ext = os.path.splitext(state['name'])
+        target = os.path.join(self.directory, state['name'])
+        n = 1
+        while os.path.exists(target):
+            target = os.path.join(self.directory, f"{base}.{n}{ext}")
+            n += 1
+        os.replace(self._path(transfer_id, ".part"), target)
+        self._sync_dir()
+        # Keep the record so a late re-offer is answered "complete" instead of restarting
+        state['complete'] = target
+        self._save(transfer_id, state)
+
+    def close(self):
+        """Checkpoints every transfer with unsaved progress, then closes the files."""
+        for transfer_id in list(self.unsaved):
+            self._checkpoint(transfer_id, self.states[transfer_id], force=True)
+        for f in self.open_files.values():
+            f.close()
+        self.open_files.clear()
@@ -0,0 +1,157 @@
+import asyncio
+import struct
+import time
+
+FRAME_HEADER = struct.Struct(">I")  # Big-endian payload length
+MAX_FRAME = 16 * 1024 * 1024  # Refuse frames above 16 MB
+IDLE_TIMEOUT = 60.0  # Seconds before an unused pooled connection is closed
+CONNECT_TIMEOUT = 5.0
+
+class FrameError(Exception):
+    """Raised on a malformed or oversized frame."""
+
+def encode_frame(payload):
+    if len(payload) > MAX_FRAME:
+        raise FrameError(f"Frame of {len(payload)} bytes exceeds {MAX_FRAME}.")
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+async def read_frame(reader):
+    """Returns the next frame payload, or None on a clean close."""
+    try:
+        header = await reader.readexactly(FRAME_HEADER.size)
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise FrameError("Connection closed mid-header.")
+        return None
+    (length,) = FRAME_HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise FrameError(f"Peer announced a {length} byte frame.")
+    try:
+        return await reader.readexactly(length)
+    except asyncio.IncompleteReadError:
+        raise FrameError("Connection closed mid-frame.")
+
+async def write_frame(writer, payload):
+    writer.write(encode_frame(payload))
+    await writer.drain()
+
+class PooledConnection:
+    def __init__(self, reader, writer, session=None):
+        self.reader = reader
+        self.writer = writer
+        self.session = session  # Per-connection AEAD session, if the pool has a handshake
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.reader_task = None  # Consumes frames the peer sends back (e.g. acks)
+
+    def close(self):
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        self.writer.close()
+
+class ConnectionPool:
+    """
+    One long-lived TCP connection per peer address (asyncio streams).
+
+    Sends reuse the pooled stream; a broken stream is dropped and the send is
+    retried once on a fresh connection. A reaper task closes connections that
+    stay idle longer than idle_timeout.
+    """
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, connect_timeout=CONNECT_TIMEOUT, handshake=None, on_frame=None):
+        self.idle_timeout = idle_timeout
+        self.connect_timeout = connect_timeout
+        # Optional coroutine (reader, writer, peer_id) -> session, run on every new dial
+        self.handshake = handshake
+        # Optional callback (peer_id, plaintext) for frames arriving on pooled connections
+        self.on_frame = on_frame
+        self.conns = {}  # {addr: PooledConnection}
+        self._connecting = {}  # {addr: asyncio.Lock} serialises dials per peer
+        self._reaper = None
+
+    def start(self):
+        self._reaper = asyncio.ensure_future(self._reap())
+
+    @staticmethod
+    def _usable(conn, peer_id):
+        """Open, and (when peer_id is given) handshaken with that peer, not whoever took over the address."""
+        return (conn is not None and not conn.writer.is_closing() and
+                (peer_id is None or conn.session is None or conn.session.peer_id == peer_id))
+
+    async def connect(self, addr, peer_id=None):
+        """Returns the pooled connection to addr, dialling (and handshaking) if needed."""
+        conn = self.conns.get(addr)
+        if self._usable(conn, peer_id):
+            return conn
+        lock = self._connecting.setdefault(addr, asyncio.Lock())
+        async with lock:
+            conn = self.conns.get(addr)
+            if not self._usable(conn, peer_id):
+                if conn is not None:
+                    self.drop(addr, conn)
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(*addr), self.connect_timeout)
+                session = None
+                if self.handshake is not None:
+                    try:
+                        session = await self.handshake(reader, writer, peer_id)
+                    except BaseException:
+                        writer.close()
+                        raise
+                conn = self.conns[addr] = PooledConnection(reader, writer, session)
+                if self.on_frame is not None:
+                    conn.reader_task = asyncio.ensure_future(self._read_replies(addr, conn, peer_id))
+            return conn
+
+    async def _read_replies(self, addr, conn, peer_id):
+        try:
+            while True:
+                frame = await read_frame(conn.reader)
+                if frame is None:
+                    break
+                if conn.session is not None:
+                    frame = conn.session.open(frame)
+                    peer_id = conn.session.peer_id
+                self.on_frame(peer_id, frame)
+        except asyncio.CancelledError:
+            return
+        except Exception:
+            pass
+        conn.reader_task = None
+        self.drop(addr, conn)
+
+    async def send(self, addr, payload, peer_id=None):
+        """Sends one frame to addr, reconnecting once if the pooled stream is dead."""
+        for attempt in (0, 1):
+            conn = await self.connect(addr, peer_id)
+            try:
+                async with conn.lock:
+                    # Seal under the lock so nonce counters follow write order
+                    data = conn.session.seal(payload) if conn.session is not None else payload
+                    await write_frame(conn.writer, data)
+                conn.last_used = time.monotonic()
+                return
+            except (OSError, ConnectionError):
+                self.drop(addr, conn)
+                if attempt:
+                    raise
+
+    def drop(self, addr, conn=None):
+        current = self.conns.get(addr)
+        if current is not None and (conn is None or current is conn):
+            del self.conns[addr]
+            current.close()
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(min(self.idle_timeout, 5.0))
+            now = time.monotonic()
+            for addr, conn in list(self.conns.items()):
+                if now - conn.last_used > self.idle_timeout and not conn.lock.locked():
+                    self.drop(addr, conn)
+
+    def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        for addr in list(self.conns):
+            self.drop(addr)
@@ -0,0 +1,106 @@
+"""
+GHOST MECH - Relay over a line of nodes on loopback: A - B - C - D - E, each
+node seeded with the next one only, so A reaches E purely through gossip
+routes and hop-by-hop relays.
+"""
+import os
+import sys
+import time
+import asyncio
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ghost_mech import GhostMech
+from mech_gossip import MAX_HOPS, encode_relay, relay_signed_data, new_message_id
+
+NODES = 5
+BASE_PORT = 47300
+CONVERGE_TIMEOUT = 30.0
+
+def wait_for(predicate, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return predicate()
+
+def on_loop(node, coro):
+    return asyncio.run_coroutine_threadsafe(coro, node.loop).result(10)
+
+@pytest.fixture(scope="module")
+def line(tmp_path_factory):
+    cwd = os.getcwd()
+    os.chdir(tmp_path_factory.mktemp("line"))  # Any vault files land here
+    inbox = {i: [] for i in range(NODES)}
+    lock = threading.Lock()
+    nodes = []
+    try:
+        for i in range(NODES):
+            seeds = [f"127.0.0.1:{BASE_PORT + 2 * (i + 1) + 1}"] if i < NODES - 1 else []
+            node = GhostMech(port=BASE_PORT + 2 * i, host='127.0.0.1', discovery=None, identity=f"relay-test-{i}",
+                             outbox_dir=None, seeds=seeds, incoming_dir=f"incoming-{i}")
+
+            def on_message(sender_id, payload, via=None, i=i):
+                with lock:
+                    inbox[i].append((sender_id, bytes(payload), via))
+            node.on_message = on_message
+            assert node.start_node()
+            nodes.append(node)
+        first, last = nodes[0], nodes[-1]
+        assert wait_for(lambda: first.routes.next_hop(last.my_id) and last.routes.next_hop(first.my_id),
+                        CONVERGE_TIMEOUT), "gossip never converged along the line"
+        yield nodes, inbox
+    finally:
+        for node in nodes:
+            node.stop()
+        os.chdir(cwd)
+
+def test_routes_follow_the_line(line):
+    nodes, _ = line
+    for i, node in enumerate(nodes):
+        expected = {n.my_id for j, n in enumerate(nodes) if abs(i - j) == 1}
+        assert {p.peer_id for p in node.peers.snapshot()} == expected
+    # A reaches E through B, four hops out
+    assert nodes[0].routes.next_hop(nodes[-1].my_id) == (nodes[1].my_id, NODES - 1)
+
+def test_end_to_end_delivery(line):
+    nodes, inbox = line
+    first, last = nodes[0], nodes[-1]
+    on_loop(first, first.relay(last.my_id, b"across the line"))
+    assert wait_for(lambda: any(body == b"across the line" for _, body, _ in inbox[NODES - 1]), 10)
+    sender, _, via = next(m for m in inbox[NODES - 1] if m[1] == b"across the line")
+    assert sender == first.my_id  # The origin, proven by its signature...
+    assert via == nodes[-2].my_id  # ...handed over by the last relay
+    for i in range(1, NODES - 1):
+        assert not any(body == b"across the line" for _, body, _ in inbox[i])
+
+def test_duplicate_is_delivered_once(line):
+    nodes, inbox = line
+    first, last = nodes[0], nodes[-1]
+    msg_id = new_message_id()
+    body = b"only once"
+    proof = first.handshaker.sign(relay_signed_data(msg_id, first.my_id, last.my_id, body))
+    frame = encode_relay(msg_id, first.my_id, last.my_id, MAX_HOPS, body, proof)
+    for _ in range(3):
+        assert on_loop(first, first.forward(last.my_id, frame))
+    assert wait_for(lambda: any(b == body for _, b, _ in inbox[NODES - 1]), 10)
+    time.sleep(0.5)
+    assert sum(1 for _, b, _ in inbox[NODES - 1] if b == body) == 1
+
+def test_hop_limit_stops_the_relay(line):
+    nodes, inbox = line
+    first, last = nodes[0], nodes[-1]
+    msg_id = new_message_id()
+    body = b"too far"
+    proof = first.handshaker.sign(relay_signed_data(msg_id, first.my_id, last.my_id, body))
+    # Two hops left: B forwards it to C, where it dies well short of E
+    frame = encode_relay(msg_id, first.my_id, last.my_id, 2, body, proof)
+    assert on_loop(first, first.forward(last.my_id, frame))
+    time.sleep(1.0)
+    assert not any(b == body for i in inbox for _, b, _ in inbox[i])
+    assert nodes[2].relayed.seen(msg_id)  # It did reach C...
+    assert not nodes[3].relayed.seen(msg_id)  # ...and went no further
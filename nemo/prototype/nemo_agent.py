@@ -5,6 +5,7 @@ import time
 import threading
 from pynput import keyboard
 from cryptography.fernet import Fernet
+from cryptography.exceptions import InvalidTag
 
 # Add project root to path
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -18,13 +19,28 @@ except ImportError:
     SpectreID = None
     SecureVault = None
 
+from nemo_infer import InferenceWorker
+from nemo_memory import MemoryIndex
+from nemo_persist import MemoryPersister
+from nemo_cache import ResponseCache
+
+INDEX_SNAPSHOT = "nemo.memory.index"  # Dedup-store entry holding the retrieval index
+CACHE_SNAPSHOT = "nemo.response.cache"
+
 class NemoAgent:
-    def __init__(self):
+    def __init__(self, backend="stub", embedder=None, flush_interval=2.0, cache_similarity=None,
+                 **backend_options):
         self.spectre = SpectreID()
         self.vault = SecureVault()
+        self.inference = InferenceWorker(backend, **backend_options)
+        self.generation = None  # Stream currently being printed, if any
+        self.wake = threading.Event()  # Set by the listener, served on the main thread
         self.active = False
         self.running = True
         self.history = []
+        self.index = MemoryIndex(embedder)
+        self.persister = MemoryPersister(self.vault, flush_interval=flush_interval)
+        self.cache = ResponseCache(similarity=cache_similarity)
         self.hotkeys = {
             'activate': {keyboard.Key.ctrl_l, keyboard.Key.alt_l, keyboard.KeyCode.from_char('n')},
             'kill': {keyboard.Key.ctrl_l, keyboard.Key.alt_l, keyboard.KeyCode.from_char('q')}
@@ -32,41 +48,129 @@ class NemoAgent:
         self.current_keys = set()
 
     def load_memory(self):
-        """Loads encrypted memory from VaultZero."""
+        """Loads encrypted memory from the VaultZero record log."""
         print("[-] Nemo accessing sovereign memory...")
-        data = self.vault.unlock_data()
+        records = self.vault.read_records()
+        if records is None:
+            print("[!] Memory log unreadable; continuing without history (legacy memory left untouched).")
+            return
+        if records:
+            self.history = [json.loads(r) for r in records]
+            print(f"[+] Restored {len(self.history)} historical context nodes.")
+            return
+
+        # One-time migration of the legacy single-blob memory (vault.bin). The blob is
+        # renamed once its entries are in the log, so a rerun can never append them twice.
+        data = self.vault.unlock_data() if os.path.exists(self.vault.vault_file) else None
         if data and data.startswith("NEMO_MEMORY:"):
             self.history = json.loads(data.replace("NEMO_MEMORY:", ""))
-            print(f"[+] Restored {len(self.history)} historical context nodes.")
+            self.vault.append_records([json.dumps(entry) for entry in self.history])
+            os.replace(self.vault.vault_file, self.vault.vault_file + ".migrated")
+            print(f"[+] Restored {len(self.history)} historical context nodes (migrated to record log).")
         else:
             print("[*] Initializing fresh consciousness.")
 
-    def save_memory(self):
-        """Saves encrypted memory to VaultZero."""
-        memory_data = "NEMO_MEMORY:" + json.dumps(self.history)
-        self.vault.lock_data(memory_data)
+    def load_index(self):
+        """Restores the retrieval index snapshot and indexes any entries it predates."""
+        started = time.perf_counter()
+        try:
+            data = self.vault.open_store().get(INDEX_SNAPSHOT)
+            if data is not None:
+                self.index = MemoryIndex.from_bytes(data, self.index.embedder)
+        except (OSError, InvalidTag, ValueError):
+            print("[!] Memory index snapshot unreadable; rebuilding from history.")
+        added = self.index.catch_up(self.history)
+        print(f"[+] Memory index ready: {len(self.index)} entries ({added} newly indexed) "
+              f"in {(time.perf_counter() - started) * 1000:.0f}ms.")
+
+    def save_index(self):
+        """Snapshots the index into the dedup store; unchanged chunks are not rewritten."""
+        if len(self.index):
+            self.vault.open_store().put(INDEX_SNAPSHOT, self.index.to_bytes())
+
+    def load_cache(self):
+        try:
+            data = self.vault.open_store().get(CACHE_SNAPSHOT)
+            if data is not None:
+                print(f"[+] Response cache restored: {self.cache.load(data)} answers.")
+        except (OSError, InvalidTag, ValueError, TypeError):
+            print("[!] Response cache snapshot unreadable; starting cold.")
+
+    def save_cache(self):
+        if len(self.cache):
+            self.vault.open_store().put(CACHE_SNAPSHOT, self.cache.to_bytes())
+        stats = self.cache.stats()
+        if stats["hit_rate"] is not None:
+            print(f"[NEMO] Response cache: {stats['hits']} hits, {stats['near_hits']} near hits, "
+                  f"{stats['misses']} misses ({stats['hit_rate'] * 100:.0f}%), {stats['entries']} answers kept.")
+
+    def save_memory(self, entry):
+        """Queues one memory entry; the persister encrypts and appends it in the background."""
+        self.persister.submit(entry)
 
     def process_query(self, query):
-        """Simulates local AI processing."""
-        # In production, this would call a local Llama/Mistral model via llama-cpp-python or similar.
+        """
+        Answers from the response cache, else streams from the local inference
+        worker. Only generated answers become memories: a cache hit repeats one
+        that is already there.
+        """
         print(f"\n[NEMO REASONING]: Processing '{query}' locally...")
-        time.sleep(1) # Simulate thought
-        
-        response = f"As your sovereign agent, I've analyzed '{query}'. No data has left this machine. My recommendation: Continue building the Ghost Tech line."
-        
-        self.history.append({"q": query, "a": response, "ts": time.time()})
-        self.save_memory()
+        started = time.perf_counter()
+        context = self.index.context(query, self.history, exclude=self.cache.repeats(query))
+        print(f"[NEMO] Recalled {len(context)} relevant memories in {(time.perf_counter() - started) * 1000:.1f}ms.")
+        started = time.perf_counter()
+        response = self.cache.get(query, context)
+        if response is not None:
+            print(f"\nNEMO: {response}")
+            print(f"[NEMO] Served from response cache in {(time.perf_counter() - started) * 1e6:.0f}us.")
+            return response
+
+        response = self.generate_response(query, context)
+        entry = {"q": query, "a": response, "ts": time.time()}
+        self.history.append(entry)
+        self.index.add(entry)
+        self.save_memory(entry)
+        return response
+
+    def generate_response(self, query, context):
+        """Streams the answer as it is generated; Ctrl+C or Ctrl+Alt+N cuts it short."""
+        self.generation = self.inference.generate(query, context)
+        print("\nNEMO: ", end="", flush=True)
+        try:
+            for token in self.generation:
+                print(token, end="", flush=True)
+        except KeyboardInterrupt:
+            self.generation.cancel()
+            self.generation.wait()
+        print()
+        generation, self.generation = self.generation, None
+        response = generation.text
+        stats = generation.stats()
+        if stats["error"]:
+            print(f"[!] Inference failed: {stats['error']}")
+        if stats["ttft_ms"] is not None:
+            rate = f"{stats['tokens_per_s']:.1f} tok/s" if stats["tokens_per_s"] else "n/a"
+            print(f"[NEMO] {stats['tokens']} tokens | TTFT {stats['ttft_ms']:.0f}ms | {rate}"
+                  f"{' | CANCELLED' if stats['cancelled'] else ''}")
+        if response and not stats["cancelled"] and not stats["error"]:
+            self.cache.put(query, context, response)
         return response
 
     def on_press(self, key):
+        """Listener thread: only flips flags; the agent itself runs on the main thread."""
         if any([key in combo for combo in self.hotkeys.values()]):
             self.current_keys.add(key)
             
             if all(k in self.current_keys for k in self.hotkeys['activate']):
-                self.trigger_agent()
+                generation = self.generation
+                if generation is not None:
+                    generation.cancel()  # Pressed again mid-answer: stop generating
+                else:
+                    self.wake.set()
             elif all(k in self.current_keys for k in self.hotkeys['kill']):
                 print("\n[!] Nemo Disconnecting...")
                 self.running = False
+                self.wake.set()
                 return False
 
     def on_release(self, key):
@@ -83,8 +187,7 @@ class NemoAgent:
         print("="*40)
         query = input("nemo > ")
         if query.strip():
-            response = self.process_query(query)
-            print(f"\nNEMO: {response}")
+            self.process_query(query)
         print("\n[-] Nemo returning to background. (Ctrl+Alt+N to wake)")
         self.active = False
 
@@ -97,18 +200,47 @@ class NemoAgent:
             ghost_key = self.spectre.generate_ghost_key()
             print(f"[+] Device Authenticated: {ghost_key[:16]}...")
         
-        # 2. Memory Access
-        if self.vault:
-            self.load_memory()
-        
-        print("\n[STATUS]: Nemo is now a 'Ghost in the Machine'.")
-        print("[HOTKEY]: Ctrl + Alt + N to activate.")
-        print("[HOTKEY]: Ctrl + Alt + Q to terminate.")
-        print("-" * 40)
+        # 2. Load the model once, in its own process. Nothing is unlocked yet, so a
+        # failed start leaves nothing to clean up.
+        self.inference.start()
+
+        listener = None
+        try:
+            # 3. Memory Access (derive the vault key once for the whole session)
+            if self.vault:
+                self.vault.preload_key()
+                self.load_memory()
+                self.load_index()
+                self.load_cache()
+                self.vault.open_log().start_compactor()
+                self.persister.start()
+                self.persister.install_signal_handlers()
+
+            print("\n[STATUS]: Nemo is now a 'Ghost in the Machine'.")
+            print("[HOTKEY]: Ctrl + Alt + N to activate (again to interrupt an answer).")
+            print("[HOTKEY]: Ctrl + Alt + Q to terminate.")
+            print("-" * 40)
 
-        with keyboard.Listener(on_press=self.on_press, on_release=self.on_release) as listener:
-            listener.join()
+            listener = keyboard.Listener(on_press=self.on_press, on_release=self.on_release)
+            listener.start()
+            while self.running and listener.is_alive():
+                if self.wake.wait(0.5) and self.running:
+                    self.wake.clear()
+                    self.trigger_agent()
+                    self.wake.clear()  # Drop activations typed into the prompt
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if listener is not None:
+                listener.stop()
+            self.inference.shutdown()
+            if self.vault:
+                self.persister.close()
+                self.save_index()
+                self.save_cache()
+                self.vault.open_log().close()
+                self.vault.zeroize()
 
 if __name__ == "__main__":
-    nemo = NemoAgent()
+    nemo = NemoAgent(backend=os.environ.get("NEMO_BACKEND", "stub"))
     nemo.start()
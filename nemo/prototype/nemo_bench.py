@@ -0,0 +1,144 @@
+"""
+NEMO CODE - Replay Benchmark
+
+Pushes synthetic keystrokes through track, fork and seek against the
+in-memory PieceTableBackend, then checks that rewinding and replaying land on
+exactly the text the document had at each playhead position. Exits 1 if
+any check lands on the wrong text.
+"""
+import io
+import sys
+import time
+import random
+import argparse
+import contextlib
+from nemo_code import NemoCodeSimulation
+from nemo_replay import PieceTableBackend, INSTANT
+
+LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+MIXES = {
+    # Plain typing: characters, spaces, new lines and cursor movement
+    'typing': [(LETTERS, 80), (' ', 12), ('enter', 2), ('left', 2), ('right', 2), ('up', 1), ('down', 1)],
+    # Typing with corrections: adds backspace and delete, which rewinds refuse to cross
+    'editing': [(LETTERS, 72), (' ', 11), ('enter', 2), ('left', 3), ('right', 3), ('up', 1), ('down', 1),
+                ('backspace', 6), ('delete', 1)],
+}
+STEPWISE_SPEED = 1e9  # Finite speed: per-action inverses, every gap merged away
+
+def keystrokes(mix, count, rng):
+    """Yields count synthetic keys drawn from a weighted mix."""
+    choices = [key for key, _ in MIXES[mix]]
+    weights = [weight for _, weight in MIXES[mix]]
+    for key in rng.choices(choices, weights, k=count):
+        yield rng.choice(key) if key is LETTERS else key
+
+def press(doc, key):
+    """
+    Applies the user's keystroke to the document. Returns False for a key
+    that changed nothing (left at the start, delete at the end, ...): a real
+    user doesn't lean on dead keys, and the hook can't tell them apart.
+    """
+    before = (doc.length, doc.cursor)
+    if len(key) == 1:
+        doc.write(key)
+        return True
+    doc.key(key)
+    if (doc.length, doc.cursor) == before:
+        return False
+    return True
+
+def bench_throughput(keys, fork_every, seed):
+    """Raw track / fork / seek speed over a long stream (the ring keeps the last MAX_HISTORY)."""
+    rng = random.Random(seed)
+    engine = NemoCodeSimulation(backend=PieceTableBackend(), speed=INSTANT)
+    t0 = time.time()
+    track_time = seek_time = 0.0
+    seeks = forks = 0
+    stream = list(keystrokes('editing', keys, rng))
+    for i, key in enumerate(stream):
+        if fork_every and i and i % fork_every == 0:
+            # Rewind a little, then keep typing: the next track forks time
+            target = engine.playhead - rng.randrange(1, 200)
+            started = time.perf_counter()
+            engine.seek_index(target)
+            seek_time += time.perf_counter() - started
+            seeks += 1
+            forks += 1
+        started = time.perf_counter()
+        engine.track(key, ts=t0 + i * 0.01)
+        track_time += time.perf_counter() - started
+    return {
+        "keys": keys,
+        "track_per_s": keys / track_time,
+        "seeks": seeks,
+        "seek_ms": seek_time / max(seeks, 1) * 1000,
+        "forks": forks,
+        "history": len(engine.stack),
+    }
+
+def bench_correctness(mix, speed, keys, checks, seed):
+    """
+    Types keys live into a document while tracking them, seeking to random
+    points along the way. Every seek is compared with the document's text at
+    that playhead; typing after a rewind forks history like a user would.
+    A rewind that stops short at an action it cannot undo is counted as
+    refused, and still has to match the text where it stopped.
+    Returns (passed, refused, failed).
+    """
+    rng = random.Random(seed)
+    doc = PieceTableBackend()
+    engine = NemoCodeSimulation(backend=doc, speed=speed)
+    t0 = time.time() - 1
+    snapshots = [""]  # snapshots[p + 1] = text with the playhead at p
+    passed = refused = failed = 0
+    check_every = max(1, keys // max(checks, 1))
+    for i, key in enumerate(keystrokes(mix, keys, rng)):
+        if not press(doc, key):
+            continue
+        if engine.playhead < len(engine.stack) - 1:
+            del snapshots[engine.playhead + 2:]  # This keystroke forks time
+        engine.track(key, ts=t0 + i * 0.001)
+        snapshots.append(doc.text)
+        if i % check_every == check_every - 1:
+            target = rng.randrange(-1, len(engine.stack))
+            reached = engine.replay(target, speed)
+            ok = doc.text == snapshots[engine.playhead + 1]
+            stopped = not reached and target < engine.playhead
+            passed += ok and reached
+            refused += ok and stopped
+            failed += not ok or not (reached or stopped)
+            if not ok:
+                # Resynchronise so one miss doesn't poison every later check
+                doc = PieceTableBackend(snapshots[engine.playhead + 1])
+                engine.backend = doc
+    return passed, refused, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Nemo Code replay benchmark")
+    parser.add_argument("--keys", type=int, default=2_000_000, help="keystrokes for the throughput run")
+    parser.add_argument("--fork-every", type=int, default=1000, help="rewind and fork every N keystrokes")
+    parser.add_argument("--check-keys", type=int, default=4000, help="keystrokes per correctness run")
+    parser.add_argument("--checks", type=int, default=400, help="seeks verified per correctness run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print("=== NEMO CODE REPLAY BENCHMARK ===")
+    with contextlib.redirect_stdout(io.StringIO()):  # Silence the per-fork notices
+        stats = bench_throughput(args.keys, args.fork_every, args.seed)
+    print(f"track: {stats['keys']:,} keys at {stats['track_per_s']:,.0f} keys/s "
+          f"(history {stats['history']:,} actions)")
+    print(f"fork+seek: {stats['forks']:,} forks, {stats['seek_ms']:.3f} ms per instant seek")
+
+    print("correctness (seek lands on the exact text at the playhead):")
+    failures = 0
+    for mix in MIXES:
+        for label, speed in (("instant", INSTANT), ("stepwise", STEPWISE_SPEED)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                passed, refused, failed = bench_correctness(mix, speed, args.check_keys, args.checks, args.seed)
+            total = passed + refused + failed
+            print(f" - {mix:8s} {label:8s}: {passed + refused}/{total} "
+                  f"({(passed + refused) / max(total, 1) * 100:.1f}%, {refused} rewinds refused)")
+            failures += failed
+    if failures:
+        print(f"[!] {failures} seeks landed on the wrong text.")
+        sys.exit(1)
@@ -0,0 +1,163 @@
+"""
+NEMO - Response Cache
+
+Answers keyed on the normalised question plus a hash of the memories that
+were retrieved as its context, so a new relevant memory changes the key.
+Memories that are themselves earlier askings of the same question are left
+out - otherwise every answer would invalidate its own entry. repeats() gives
+the retrieval the same test, so such askings never take a context slot.
+LRU order with a TTL, an entry count and a byte budget; an optional token
+similarity threshold lets near-identical wordings share an answer.
+"""
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+from nemo_memory import tokenize
+
+CACHE_TTL = 24 * 3600  # Seconds an answer stays valid
+CACHE_ENTRIES = 2048
+CACHE_BYTES = 4 * 1024 * 1024  # Approximate budget (question + answer text)
+
+class CacheEntry:
+    __slots__ = ("query", "terms", "context", "response", "created", "size")
+
+    def __init__(self, query, context, response, created):
+        self.query = query  # Normalised
+        self.terms = frozenset(query.split())
+        self.context = context
+        self.response = response
+        self.created = created
+        self.size = len(query) + len(response)
+
+class ResponseCache:
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_ENTRIES, max_bytes=CACHE_BYTES,
+                 similarity: Optional[float] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.similarity = similarity  # Minimum Jaccard overlap of question terms; None = exact only
+        self.entries = OrderedDict()  # {(query, context hash): CacheEntry}, least recently used first
+        self.by_context = {}  # {context hash: set of normalised queries}, candidates for near hits
+        self.bytes = 0
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return ' '.join(tokenize(query))
+
+    def _similar(self, a: frozenset, b: frozenset) -> bool:
+        return bool(a or b) and len(a & b) / len(a | b) >= self.similarity
+
+    def repeats(self, query: str) -> Callable[[dict], bool]:
+        """Predicate: is a memory an earlier asking of query (or, with similarity, a near wording)?"""
+        query = self.normalize(query)
+        terms = frozenset(query.split())
+
+        def repeat(entry: dict) -> bool:
+            asked = self.normalize(entry['q'])
+            return asked == query or (self.similarity is not None and self._similar(terms, frozenset(asked.split())))
+        return repeat
+
+    def context_hash(self, query: str, context: List[dict]) -> str:
+        """Hash of the context memories, minus earlier askings of this same question."""
+        repeat = self.repeats(query)
+        h = hashlib.sha256()
+        for entry in context:
+            if repeat(entry):
+                continue
+            h.update(repr(entry.get('ts')).encode())
+            h.update(b'\0')
+        return h.hexdigest()[:32]
+
+    def get(self, query: str, context: List[dict], now: Optional[float] = None) -> Optional[str]:
+        """The cached answer, or None (counted as a miss)."""
+        now = time.time() if now is None else now
+        query = self.normalize(query)
+        ctx = self.context_hash(query, context)
+        key = (query, ctx)
+        entry = self.entries.get(key)
+        if entry is None and self.similarity is not None:
+            terms = frozenset(query.split())
+            for other in self.by_context.get(ctx, ()):
+                if self._similar(terms, self.entries[(other, ctx)].terms):
+                    key = (other, ctx)
+                    entry = self.entries[key]
+                    break
+        if entry is not None and now - entry.created > self.ttl:
+            self._remove(key)
+            self.expired += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        if key[0] == query:
+            self.hits += 1
+        else:
+            self.near_hits += 1
+        return entry.response
+
+    def put(self, query: str, context: List[dict], response: str, now: Optional[float] = None):
+        query = self.normalize(query)
+        ctx = self.context_hash(query, context)
+        self._insert(CacheEntry(query, ctx, response, time.time() if now is None else now))
+
+    def _insert(self, entry: CacheEntry):
+        key = (entry.query, entry.context)
+        if key in self.entries:
+            self._remove(key)
+        if entry.size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.by_context.setdefault(entry.context, set()).add(entry.query)
+        self.bytes += entry.size
+        while len(self.entries) > self.max_entries or self.bytes > self.max_bytes:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        self.bytes -= entry.size
+        queries = self.by_context[entry.context]
+        queries.discard(entry.query)
+        if not queries:
+            del self.by_context[entry.context]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else None,
+            "evictions": self.evictions,
+            "expired": self.expired,
+        }
+
+    # --- Snapshot ---
+
+    def to_bytes(self) -> bytes:
+        """Live entries in LRU order, as JSON."""
+        return json.dumps([[e.query, e.context, e.response, e.created]
+                           for e in self.entries.values()]).encode()
+
+    def load(self, data: bytes, now: Optional[float] = None) -> int:
+        """Restores a snapshot, skipping expired entries. Returns entries loaded."""
+        now = time.time() if now is None else now
+        rows = json.loads(data)
+        for query, ctx, response, created in rows:
+            if now - created <= self.ttl:
+                self._insert(CacheEntry(query, ctx, response, created))
+        return len(self.entries)
@@ -1,6 +1,73 @@
 import time
+import queue
+import threading
+from array import array
 from typing import Tuple, Optional, List, Dict
-import keyboard
+from nemo_replay import (ReplayBackend, KeyboardBackend, TextBufferBackend, ReplayPlan, STEP_WRITE, STEP_KEY,
+                         INSTANT, MAX_STEP_DELAY, MERGE_GAP)
+
+class ActionRing:
+    """
+    Fixed-capacity circular buffer of (timestamp, opcode) pairs.
+
+    Two parallel arrays ('d' timestamps, 'B' opcodes) replace a list of dicts:
+    9 bytes per action, no per-keystroke allocation. Appending to a full ring
+    overwrites the oldest action and truncation only moves the length, so
+    append, eviction and truncation are all O(1).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = array('d', bytes(8 * capacity))
+        self.ops = array('B', bytes(capacity))
+        self.head = 0  # Slot of the oldest action
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def slot(self, index: int) -> int:
+        return (self.head + index) % self.capacity
+
+    def append(self, ts: float, op: int) -> bool:
+        """Adds an action; returns True if the oldest one was evicted to make room."""
+        evicted = self.count == self.capacity
+        if evicted:
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+        i = (self.head + self.count) % self.capacity
+        self.ts[i] = ts
+        self.ops[i] = op
+        self.count += 1
+        return evicted
+
+    def evict_before(self, cutoff: float) -> int:
+        """Drops the oldest actions stamped before cutoff; returns how many went."""
+        evicted = 0
+        while self.count and self.ts[self.head] < cutoff:
+            self.head = (self.head + 1) % self.capacity
+            self.count -= 1
+            evicted += 1
+        return evicted
+
+    def index_at(self, ts: float) -> int:
+        """Index of the last action stamped at or before ts (-1 if none); binary search."""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.ts[(self.head + mid) % self.capacity] <= ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def truncate(self, length: int):
+        """Drops every action from index length onwards."""
+        self.count = max(0, min(length, self.count))
+
+    def get(self, index: int) -> Tuple[float, int]:
+        i = (self.head + index) % self.capacity
+        return self.ts[i], self.ops[i]
 
 class NemoCodeSimulation:
     """
@@ -11,7 +78,8 @@ class NemoCodeSimulation:
     with zero data persistence beyond the 5-minute window.
     """
 
-    # Instruction Map: Key -> (Inverse, Forward)
+    # Instruction Map: Key -> (Inverse, Forward). None: no exact inverse - backspace and
+    # delete lose the character, up/down lose the column when a line is shorter.
     INSTRUCTION_SET = {
         'a': ('backspace', 'a'), 'b': ('backspace', 'b'), 'c': ('backspace', 'c'),
         'd': ('backspace', 'd'), 'e': ('backspace', 'e'), 'f': ('backspace', 'f'),
@@ -22,107 +90,343 @@ class NemoCodeSimulation:
         's': ('backspace', 's'), 't': ('backspace', 't'), 'u': ('backspace', 'u'),
         'v': ('backspace', 'v'), 'w': ('backspace', 'w'), 'x': ('backspace', 'x'),
         'y': ('backspace', 'y'), 'z': ('backspace', 'z'),
-        ' ': ('backspace', ' '), 'enter': ('ctrl+z', 'enter'),
-        'backspace': ('ctrl+z', 'backspace'), 'delete': ('ctrl+z', 'delete'),
+        ' ': ('backspace', ' '), 'enter': ('backspace', 'enter'),
+        'backspace': (None, 'backspace'), 'delete': (None, 'delete'),
         'left': ('right', 'left'), 'right': ('left', 'right'),
-        'up': ('down', 'up'), 'down': ('up', 'down'),
+        'up': (None, 'up'), 'down': (None, 'down'),
     }
 
-    MAX_HISTORY = 5000 
+    # Opcode n is the n-th key of INSTRUCTION_SET
+    OPCODES = {key: op for op, key in enumerate(INSTRUCTION_SET)}
+    KEYS = list(INSTRUCTION_SET)
+    OPPOSITE = {'left': 'right', 'right': 'left'}  # Pairs that cancel exactly (up/down clamp the column)
+    BACKSPACE = OPCODES['backspace']
+    # Dispatch tables: opcode -> replay step, per direction (None: cannot be rewound)
+    FORWARD_STEP = [(STEP_WRITE, fwd) if len(fwd) == 1 else (STEP_KEY, fwd) for inv, fwd in INSTRUCTION_SET.values()]
+    INVERSE_STEP = [(STEP_KEY, inv) if inv else None for inv, fwd in INSTRUCTION_SET.values()]
+    TYPED = [len(fwd) == 1 or fwd == 'enter' for inv, fwd in INSTRUCTION_SET.values()]
+
+    WINDOW_SECONDS = 300  # The 5-minute window
+    MAX_HISTORY = 16384  # Hard memory cap (~150 KB) should typing outrun the window
 
-    def __init__(self):
-        self.stack = []  # List of dicts: {'ts': float, 'forward': str, 'inverse': str}
+    def __init__(self, backend: Optional[ReplayBackend] = None, speed: float = 1.0):
+        self.stack = ActionRing(self.MAX_HISTORY)
         self.playhead = -1  # Index of the last action executed in 'real time'
         self.locked = True
+        self.backend = backend or KeyboardBackend()
+        self.speed = speed  # Replay cadence multiplier; INSTANT skips straight to the net edit
+        # Guards stack and playhead: the key consumer tracks while the replay worker scrubs
+        self.lock = threading.RLock()
+
+    def expire(self, now: Optional[float] = None):
+        """Forgets actions older than the window."""
+        evicted = self.stack.evict_before((now or time.time()) - self.WINDOW_SECONDS)
+        self.playhead = max(-1, self.playhead - evicted)
 
-    def track(self, key: str):
+    def track(self, key: str, ts: Optional[float] = None):
         """Captures an action and its inverse into the simulation stack."""
         if key in ('right shift', 'right alt'):
             return
+        ts = ts or time.time()
+        with self.lock:
+            self.expire(ts)
+
+            # If user types while playhead is rewound, we 'fork' time (truncate future)
+            if self.playhead < len(self.stack) - 1:
+                print(f"[NEMO] Temporal Fork: Overwriting {len(self.stack) - 1 - self.playhead} future actions.")
+                self.stack.truncate(self.playhead + 1)
+
+            op = self.OPCODES.get(key.lower())
+            if op is not None:
+                self.playhead += 1
+                # Rolling 5-minute window: a full ring overwrites its oldest action
+                if self.stack.append(ts, op):
+                    self.playhead -= 1
 
-        # If user types while playhead is rewound, we 'fork' time (truncate future)
-        if self.playhead < len(self.stack) - 1:
-            print(f"[NEMO] Temporal Fork: Overwriting {len(self.stack) - 1 - self.playhead} future actions.")
-            self.stack = self.stack[:self.playhead + 1]
-
-        instructions = self.INSTRUCTION_SET.get(key.lower())
-        if instructions:
-            self.stack.append({
-                'ts': time.time(),
-                'forward': instructions[1],
-                'inverse': instructions[0]
-            })
-            self.playhead += 1
-
-            # Rolling 5-minute window
-            if len(self.stack) > self.MAX_HISTORY:
-                self.stack.pop(0)
-                self.playhead -= 1
-
-    def step_backward(self) -> bool:
+    def step_backward(self, cancel: Optional[threading.Event] = None) -> bool:
         """Simulates one step back in time."""
-        if self.playhead < 0:
-            return False
-        
-        action = self.stack[self.playhead]
-        # Calculate speed based on original typing cadence
-        if self.playhead > 0:
-            delta = abs(action['ts'] - self.stack[self.playhead-1]['ts'])
-            time.sleep(min(delta, 0.3)) # Replay at typed speed, max 300ms delay
-        
-        success = self.execute_instruction(action['inverse'])
-        if success:
-            self.playhead -= 1
-        return success
-
-    def step_forward(self) -> bool:
+        with self.lock:
+            if self.playhead < 0:
+                return False
+            return self.replay(self.playhead - 1, cancel=cancel)
+
+    def step_forward(self, cancel: Optional[threading.Event] = None) -> bool:
         """Simulates one step forward in time."""
-        if self.playhead >= len(self.stack) - 1:
-            return False
-        
-        self.playhead += 1
-        action = self.stack[self.playhead]
-        
-        # Timing simulation
-        if self.playhead > 0:
-            delta = abs(action['ts'] - self.stack[self.playhead-1]['ts'])
-            time.sleep(min(delta, 0.3))
+        with self.lock:
+            if self.playhead >= len(self.stack) - 1:
+                return False
+            return self.replay(self.playhead + 1, cancel=cancel)
+
+    def net_edit(self, start: int, end: int) -> List[list]:
+        """
+        Collapses actions start..end-1 into their net effect: ['write', [chars]]
+        runs and ['key', name, count] runs. A backspace straight after typed text
+        cancels the last character and opposite arrows cancel each other, so
+        only what survives the span is replayed.
+        """
+        edits = []
+        for i in range(start, end):
+            key = self.KEYS[self.stack.get(i)[1]]
+            last = edits[-1] if edits else None
+            if key == 'backspace' and last and last[0] == 'write':
+                last[1].pop()
+                if not last[1]:
+                    edits.pop()
+                continue
+            char = '\n' if key == 'enter' else key if len(key) == 1 else None
+            if char is not None:
+                if last and last[0] == 'write':
+                    last[1].append(char)
+                else:
+                    edits.append(['write', [char]])
+            elif last and last[0] == 'key' and last[1] == key:
+                last[2] += 1
+            elif last and last[0] == 'key' and last[1] == self.OPPOSITE.get(key):
+                last[2] -= 1
+                if not last[2]:
+                    edits.pop()
+            else:
+                edits.append(['key', key, 1])
+        return edits
+
+    def plan(self, start: int, end: int, reverse: bool) -> List[tuple]:
+        """
+        Smallest instruction sequence that replays (or, reversed, undoes) actions
+        start..end-1: ('write', text), ('erase', n) and ('key', name, n) steps.
+        """
+        edits = self.net_edit(start, end)
+        if not reverse:
+            return [('write', ''.join(e[1])) if e[0] == 'write' else ('key', e[1], e[2]) for e in edits]
+        steps = []
+        for e in reversed(edits):
+            if e[0] == 'write':
+                steps.append(('erase', len(e[1])))
+            else:
+                steps.append(('key', self.INSTRUCTION_SET[e[1]][0], e[2]))
+        return steps
 
-        return self.execute_instruction(action['forward'])
+    def rewind_limit(self, target: int) -> Tuple[int, Optional[int]]:
+        """
+        Lowest playhead at or above target that a rewind reaches exactly, and
+        the action that blocks going further (None if target is reachable).
+        Walking back, a backspace is only undone together with the character
+        it erased, so it must meet that character before any other key; delete,
+        up, down and unmatched backspaces cannot be undone at all.
+        """
+        limit, owed = self.playhead, 0
+        for i in range(self.playhead, target, -1):
+            op = self.stack.get(i)[1]
+            if op == self.BACKSPACE:
+                owed += 1
+            elif self.TYPED[op] and owed:
+                owed -= 1
+            elif owed or self.INVERSE_STEP[op] is None:
+                return limit, i
+            if not owed:
+                limit = i - 1
+        return (limit, None) if not owed else (limit, target + 1)
+
+    def compile(self, start: int, end: int, reverse: bool, speed: Optional[float] = None) -> ReplayPlan:
+        """
+        Turns actions start..end-1 into a batched plan. Each action waits its
+        original gap (capped at MAX_STEP_DELAY) divided by speed; actions closer
+        than MERGE_GAP after scaling merge into one step, so character runs
+        become one write and repeated keys one counted step. INSTANT compiles
+        the collapsed net edit instead.
+
+        A reverse span must pass rewind_limit: a backspace and the character it
+        erased then undo to nothing, so they ride along with the next step.
+        """
+        speed = speed or self.speed
+        if speed == INSTANT:
+            return ReplayPlan.from_edits(self.plan(start, end, reverse), end - start)
+        table = self.INVERSE_STEP if reverse else self.FORWARD_STEP
+        ring = self.stack
+        steps = []
+        owed = carried = 0  # Reverse only: backspaces awaiting their character, actions riding along
+        for i in (range(end - 1, start - 1, -1) if reverse else range(start, end)):
+            ts, op = ring.get(i)
+            delay = min(abs(ts - ring.get(i - 1)[0]), MAX_STEP_DELAY) / speed if i > 0 else 0.0
+            if reverse and (op == self.BACKSPACE or (owed and self.TYPED[op])):
+                owed += 1 if op == self.BACKSPACE else -1
+                carried += 1
+                continue
+            kind, arg = table[op]
+            last = steps[-1] if steps else None
+            if last and delay < MERGE_GAP and last[0] == kind and (kind == STEP_WRITE or last[1] == arg):
+                if kind == STEP_WRITE:
+                    last[1].append(arg)
+                else:
+                    last[2] += 1
+                last[4] += 1 + carried
+            else:
+                steps.append([kind, [arg] if kind == STEP_WRITE else arg, 1, delay, 1 + carried])
+            carried = 0
+        if carried:
+            steps.append([STEP_WRITE, [], 1, 0.0, carried])  # Nothing to type; just moves the playhead
+        return ReplayPlan([(kind, (''.join(arg),) if kind == STEP_WRITE else (arg, count), delay, actions)
+                           for kind, arg, count, delay, actions in steps], end - start)
+
+    def replay(self, target: int, speed: Optional[float] = None, cancel: Optional[threading.Event] = None) -> bool:
+        """
+        Moves the playhead to target through a compiled plan. If cancel is set
+        mid-replay the playhead stops at the last action actually replayed.
+        A rewind stops short of any action it cannot undo exactly (see
+        rewind_limit) and says so. Returns True once target is reached.
+        """
+        with self.lock:
+            target = max(-1, min(target, len(self.stack) - 1))
+            if target == self.playhead:
+                return True
+            reverse = target < self.playhead
+            blocker = None
+            if reverse:
+                limit, blocker = self.rewind_limit(target)
+                if blocker is not None:
+                    print(f"[NEMO] Rewind stops at action {limit}: "
+                          f"'{self.KEYS[self.stack.get(blocker)[1]]}' cannot be undone exactly.")
+                    target = limit
+                    if target == self.playhead:
+                        return False
+                plan = self.compile(target + 1, self.playhead + 1, True, speed)
+            else:
+                plan = self.compile(self.playhead + 1, target + 1, False, speed)
+            done = plan.run(self.backend, cancel)
+            self.playhead += -done if reverse else done
+            return done == plan.total and blocker is None
+
+    def seek_index(self, target: int) -> bool:
+        """Moves the playhead to target by replaying only the net edit in between."""
+        return self.replay(target, INSTANT)
+
+    def seek(self, timestamp: Optional[float] = None, offset: Optional[float] = None) -> bool:
+        """
+        Jumps to the last action at or before timestamp, or offset seconds from
+        the playhead (seek(offset=-30) rewinds 30 seconds), in one replay.
+        """
+        if (timestamp is None) == (offset is None):
+            raise ValueError("seek() takes exactly one of timestamp or offset.")
+        with self.lock:
+            self.expire()
+            if timestamp is None:
+                if not len(self.stack):
+                    return True
+                timestamp = self.stack.get(max(self.playhead, 0))[0] + offset
+            return self.seek_index(self.stack.index_at(timestamp))
 
     def execute_instruction(self, instr: str) -> bool:
         """Translates Nemo Code into physical hardware interaction."""
+        handlers = self.backend.dispatch()
         try:
-            if instr == 'backspace':
-                keyboard.press_and_release('backspace')
-            elif instr == 'ctrl+z':
-                keyboard.hotkey('ctrl', 'z')
-            elif instr == 'left':
-                keyboard.press_and_release('left')
-            elif instr == 'right':
-                keyboard.press_and_release('right')
-            elif instr == 'up':
-                keyboard.press_and_release('up')
-            elif instr == 'down':
-                keyboard.press_and_release('down')
-            elif len(instr) == 1: # Literal character replay
-                keyboard.write(instr)
+            if len(instr) == 1: # Literal character replay
+                handlers[STEP_WRITE](instr)
+            else:
+                handlers[STEP_KEY](instr, 1)
             return True
         except Exception:
             return False
 
     def get_status(self) -> dict:
-        return {
-            'stack_size': len(self.stack),
-            'playhead_pos': self.playhead,
-            'percent_life': (self.playhead + 1) / (len(self.stack) or 1) * 100
-        }
+        with self.lock:
+            return {
+                'stack_size': len(self.stack),
+                'playhead_pos': self.playhead,
+                'percent_life': (self.playhead + 1) / (len(self.stack) or 1) * 100
+            }
+
+class ReplayWorker:
+    """
+    The single long-lived replay thread.
+
+    Callers never touch the playhead directly: they post start / stop / seek /
+    speed commands. Every command also sets the cancel event, which interrupts
+    the step in progress (plans wait on it instead of sleeping), so a stop
+    takes effect within one step and rapid start/stop toggling queues cheap
+    commands instead of spawning threads.
+    """
+
+    def __init__(self, engine: NemoCodeSimulation):
+        self.engine = engine
+        self.commands = queue.Queue()
+        self.cancel = threading.Event()
+        self.direction = None  # 'backward' / 'forward' while scrubbing; touched only by the worker
+        self.thread = None
+
+    @property
+    def active(self) -> bool:
+        return self.direction is not None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="nemo-replay", daemon=True)
+        self.thread.start()
+
+    def send(self, command: str, arg=None):
+        self.cancel.set()  # Pre-empt the current step
+        self.commands.put((command, arg))
+
+    def play(self, direction: str):
+        self.send('start', direction)
+
+    def stop(self):
+        self.send('stop')
+
+    def seek(self, **kwargs):
+        self.send('seek', kwargs)
+
+    def set_speed(self, speed: float):
+        self.send('speed', speed)
+
+    def shutdown(self):
+        self.send('shutdown')
+        if self.thread is not None:
+            self.thread.join()
+
+    def run(self):
+        while True:
+            try:
+                # Block while idle; while scrubbing, only peek between steps
+                command, arg = self.commands.get(block=self.direction is None)
+            except queue.Empty:
+                command = None
+            if command is not None:
+                self.cancel.clear()
+                if command == 'shutdown':
+                    break
+                self.handle(command, arg)
+                continue
+            if self.direction == 'backward':
+                moved = self.engine.step_backward(self.cancel)
+            else:
+                moved = self.engine.step_forward(self.cancel)
+            if not moved and not self.cancel.is_set():
+                self.pause()  # Ran off either end of the history
+
+    def handle(self, command: str, arg):
+        if command == 'start':
+            if self.direction != arg:
+                self.direction = arg
+                print(f"\n[NEMO] {arg.upper()} SIMULATION ENGAGED...")
+        elif command == 'stop':
+            self.pause()
+        elif command == 'speed':
+            with self.engine.lock:
+                self.engine.speed = arg
+        elif command == 'seek':
+            self.pause()
+            self.engine.seek(**arg)
+
+    def pause(self):
+        if self.direction is not None:
+            print(f"[NEMO] {self.direction.upper()} SIMULATION PAUSED.")
+            self.direction = None
 
 if __name__ == "__main__":
     # Internal Test
-    engine = NemoCodeSimulation()
+    engine = NemoCodeSimulation(backend=TextBufferBackend("hel"), speed=INSTANT)
     print("Testing Engine Track...")
     engine.track('h')
     engine.track('e')
     engine.track('l')
     print(f"Status: {engine.get_status()}")
+    engine.seek_index(-1)
+    print(f"Rewound buffer: {engine.backend.text!r}")
@@ -0,0 +1,114 @@
+import time
+import threading
+from array import array
+from typing import Iterator, Optional, Tuple
+
+HOOK_QUEUE_SIZE = 4096  # Keystrokes buffered between the hook and the consumer
+HISTOGRAM_BUCKETS = 256
+
+class KeyEventRing:
+    """
+    Bounded single-producer / single-consumer queue of key events.
+
+    The listener thread is the only writer of tail and the consumer the only
+    writer of head, so no lock is taken on either side; slots are
+    preallocated parallel arrays. A full ring drops the event rather than
+    ever blocking the keyboard hook.
+    """
+
+    def __init__(self, capacity: int = HOOK_QUEUE_SIZE):
+        self.capacity = capacity
+        self.keys = [None] * capacity
+        self.pressed = bytearray(capacity)
+        self.ts = array('d', bytes(8 * capacity))
+        self.head = 0  # Next slot to read (consumer)
+        self.tail = 0  # Next slot to write (producer)
+        self.dropped = 0
+        self._wakeup = threading.Event()
+        self._waiting = False
+
+    def __len__(self) -> int:
+        return self.tail - self.head
+
+    def push(self, key, pressed: bool, ts: float) -> bool:
+        """Producer side. Returns False (and counts a drop) when the ring is full."""
+        tail = self.tail
+        if tail - self.head >= self.capacity:
+            self.dropped += 1
+            return False
+        i = tail % self.capacity
+        self.keys[i] = key
+        self.pressed[i] = pressed
+        self.ts[i] = ts
+        self.tail = tail + 1  # Publish only after the slot is written
+        if self._waiting:
+            self._wakeup.set()
+        return True
+
+    def drain(self, timeout: float = 0.1) -> Iterator[Tuple[object, bool, float]]:
+        """Consumer side: yields every queued event, first waiting up to timeout for one."""
+        if self.head == self.tail:
+            self._wakeup.clear()
+            self._waiting = True
+            if self.head == self.tail:
+                self._wakeup.wait(timeout)
+            self._waiting = False
+        while self.head != self.tail:
+            i = self.head % self.capacity
+            event = (self.keys[i], bool(self.pressed[i]), self.ts[i])
+            self.keys[i] = None
+            self.head += 1
+            yield event
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of nanosecond durations: four sub-buckets per power
+    of two (about 12% resolution), fixed memory, O(1) record. Written by one
+    thread; readers get a close-enough snapshot without locking.
+    """
+
+    def __init__(self):
+        self.counts = array('Q', bytes(8 * HISTOGRAM_BUCKETS))
+        self.total = 0
+        self.max_ns = 0
+
+    @staticmethod
+    def bucket(ns: int) -> int:
+        bits = ns.bit_length()
+        if bits < 3:
+            return ns
+        return min((bits - 2) * 4 + ((ns >> (bits - 3)) & 3), HISTOGRAM_BUCKETS - 1)
+
+    @staticmethod
+    def bucket_floor(index: int) -> int:
+        if index < 4:
+            return index
+        return (4 + index % 4) << (index // 4 - 1)
+
+    def record(self, ns: int):
+        self.counts[self.bucket(ns)] += 1
+        self.total += 1
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def percentile(self, p: float) -> Optional[int]:
+        """Upper bound (ns) of the bucket holding the p-th percentile, None if empty."""
+        total = self.total
+        if not total:
+            return None
+        rank = max(1, int(total * p / 100.0 + 0.5))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(self.bucket_floor(index + 1), self.max_ns)
+        return self.max_ns
+
+    def summary(self) -> dict:
+        p50, p99 = self.percentile(50), self.percentile(99)
+        return {
+            "count": self.total,
+            "p50_us": p50 / 1000.0 if p50 is not None else None,
+            "p99_us": p99 / 1000.0 if p99 is not None else None,
+            "max_us": self.max_ns / 1000.0 if self.total else None,
+        }
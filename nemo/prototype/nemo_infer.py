@@ -0,0 +1,339 @@
+"""
+NEMO - Local Inference Worker
+
+The model lives in a child process that loads it once and serves requests
+over a pipe, so generation never runs on (or stalls) the keyboard listener.
+Tokens stream back one message at a time; a request can be cancelled
+between tokens.
+"""
+import os
+import time
+import queue
+import signal
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from typing import Iterator, List, Optional
+
+try:
+    from llama_cpp import Llama
+except ImportError:
+    Llama = None  # Only LlamaCppBackend needs it; the stub backend runs anywhere
+
+MAX_TOKENS = 256
+READY_TIMEOUT = 120  # Seconds allowed for the worker to load its model
+
+# Parent -> worker
+REQ_GENERATE = 0  # (REQ_GENERATE, request id, query, context, max tokens)
+REQ_CANCEL = 1  # (REQ_CANCEL, request id)
+REQ_STOP = 2  # (REQ_STOP,)
+
+# Worker -> parent
+MSG_READY = 0  # (MSG_READY, None, backend name)
+MSG_TOKEN = 1  # (MSG_TOKEN, request id, text)
+MSG_DONE = 2  # (MSG_DONE, request id, cancelled)
+MSG_ERROR = 3  # (MSG_ERROR, request id or None, message)
+
+class InferenceBackend:
+    """A model the worker can stream tokens from. Subclasses implement generate."""
+
+    name = "base"
+
+    def generate(self, query: str, context: List[dict], max_tokens: int) -> Iterator[str]:
+        raise NotImplementedError
+
+class StubBackend(InferenceBackend):
+    """Deterministic canned answer, streamed word by word at a fixed pace."""
+
+    name = "stub"
+
+    def __init__(self, token_delay: float = 0.02, load_delay: float = 0.0):
+        self.token_delay = token_delay
+        if load_delay:
+            time.sleep(load_delay)  # Stands in for loading model weights
+
+    def generate(self, query, context, max_tokens):
+        response = (f"As your sovereign agent, I've analyzed '{query}'. No data has left this machine. "
+                    f"My recommendation: Continue building the Ghost Tech line.")
+        words = response.split(' ')
+        for i, word in enumerate(words[:max_tokens]):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield word if i == 0 else ' ' + word
+
+class LlamaCppBackend(InferenceBackend):
+    """A local GGUF model through llama-cpp-python (model path from NEMO_MODEL)."""
+
+    name = "llama"
+
+    def __init__(self, model_path: Optional[str] = None, n_ctx: int = 4096, n_threads: Optional[int] = None):
+        if Llama is None:
+            raise RuntimeError("llama-cpp-python is required for the llama backend.")
+        model_path = model_path or os.environ.get("NEMO_MODEL")
+        if not model_path:
+            raise RuntimeError("Set NEMO_MODEL to a GGUF model path.")
+        self.llm = Llama(model_path=model_path, n_ctx=n_ctx, n_threads=n_threads, verbose=False)
+
+    @staticmethod
+    def format(query, context):
+        lines = ["You are Nemo, a private assistant running entirely on this machine."]
+        for entry in context:
+            lines.append(f"User: {entry['q']}\nNemo: {entry['a']}")
+        lines.append(f"User: {query}\nNemo:")
+        return "\n".join(lines)
+
+    def generate(self, query, context, max_tokens):
+        for chunk in self.llm(self.format(query, context), max_tokens=max_tokens,
+                              stop=["\nUser:"], stream=True):
+            text = chunk["choices"][0]["text"]
+            if text:
+                yield text
+
+BACKENDS = {
+    "stub": StubBackend,
+    "llama": LlamaCppBackend,
+}
+
+def serve(conn, backend_name, options):
+    """Worker process: loads the backend once, then answers requests until told to stop."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl+C belongs to the parent, which cancels
+    try:
+        backend = BACKENDS[backend_name](**options)
+    except Exception as e:
+        conn.send((MSG_ERROR, None, f"{type(e).__name__}: {e}"))
+        return
+    conn.send((MSG_READY, None, backend.name))
+
+    pending = deque()  # Requests that arrived while another was streaming
+    cancelled = set()
+    req_id = None
+
+    def cancel(target):
+        # The pipe is ordered, so a request always arrives before its cancel: one
+        # that is neither streaming nor pending has already finished (or never was)
+        if target == req_id or any(p[0] == REQ_GENERATE and p[1] == target for p in pending):
+            cancelled.add(target)
+
+    while True:
+        req_id = None
+        try:
+            request = pending.popleft() if pending else conn.recv()
+        except EOFError:
+            return  # Parent is gone
+        if request[0] == REQ_STOP:
+            return
+        if request[0] == REQ_CANCEL:
+            cancel(request[1])
+            continue
+        _, req_id, query, context, max_tokens = request
+        stop = False
+        try:
+            tokens = backend.generate(query, context, max_tokens) if req_id not in cancelled else ()
+            for token in tokens:
+                if req_id in cancelled:
+                    break
+                conn.send((MSG_TOKEN, req_id, token))
+                # Check the pipe between tokens so a cancel lands mid-stream
+                while conn.poll():
+                    message = conn.recv()
+                    if message[0] == REQ_CANCEL:
+                        cancel(message[1])
+                    elif message[0] == REQ_STOP:
+                        cancelled.add(req_id)
+                        stop = True
+                    else:
+                        pending.append(message)
+        except EOFError:
+            return
+        except Exception as e:
+            conn.send((MSG_ERROR, req_id, f"{type(e).__name__}: {e}"))
+        conn.send((MSG_DONE, req_id, req_id in cancelled))
+        cancelled.discard(req_id)
+        if stop:
+            return
+
+class Generation:
+    """
+    One streaming request. Iterating yields tokens as they arrive; the
+    timings are taken on the parent side, so time-to-first-token includes the
+    pipe hop and any wait behind an earlier request.
+    """
+
+    def __init__(self, worker: 'InferenceWorker', req_id: int):
+        self.worker = worker
+        self.req_id = req_id
+        self.queue = queue.Queue()
+        self.parts = []
+        self.submitted = time.perf_counter()
+        self.first_token_at = None
+        self.finished_at = None
+        self.cancelled = False
+        self.error = None
+
+    def __iter__(self) -> Iterator[str]:
+        while True:
+            token = self.queue.get()
+            if token is None:
+                return
+            yield token
+
+    def cancel(self):
+        if self.finished_at is None:
+            self.worker.cancel(self.req_id)
+
+    def wait(self) -> str:
+        """Consumes the rest of the stream and returns the full text."""
+        for _ in self:
+            pass
+        return self.text
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.parts)
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    @property
+    def ttft(self) -> Optional[float]:
+        """Seconds from submission to the first token."""
+        return self.first_token_at - self.submitted if self.first_token_at is not None else None
+
+    @property
+    def tokens_per_s(self) -> Optional[float]:
+        """Decode rate after the first token."""
+        if self.first_token_at is None or len(self.parts) < 2:
+            return None
+        end = self.finished_at or time.perf_counter()
+        return (len(self.parts) - 1) / max(end - self.first_token_at, 1e-9)
+
+    def stats(self) -> dict:
+        return {
+            "tokens": len(self.parts),
+            "ttft_ms": self.ttft * 1000 if self.ttft is not None else None,
+            "tokens_per_s": self.tokens_per_s,
+            "cancelled": self.cancelled,
+            "error": self.error,
+        }
+
+    # --- Reader thread ---
+
+    def _token(self, text):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.parts.append(text)
+        self.queue.put(text)
+
+    def _finish(self, cancelled=False, error=None):
+        self.cancelled = cancelled
+        self.error = self.error or error
+        self.finished_at = time.perf_counter()
+        self.queue.put(None)
+
+class InferenceWorker:
+    """
+    Parent-side handle on the worker process. A reader thread routes
+    streamed tokens to their Generation; sends share a lock, so any thread
+    may submit or cancel.
+    """
+
+    def __init__(self, backend: str = "stub", **options):
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend '{backend}'.")
+        self.backend = backend
+        self.options = options
+        self.process = None
+        self.conn = None
+        self.reader = None
+        self.send_lock = threading.Lock()
+        self.requests = {}  # {request id: Generation}
+        self.ids = itertools.count(1)
+        self.ready = threading.Event()
+        self.error = None
+
+    def start(self, timeout: float = READY_TIMEOUT):
+        """Spawns the worker and blocks until its model is loaded."""
+        # Spawn rather than fork: the parent already runs listener threads
+        ctx = multiprocessing.get_context("spawn")
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=serve, args=(child, self.backend, self.options),
+                                   name="nemo-inference", daemon=True)
+        started = time.perf_counter()
+        self.process.start()
+        child.close()
+        self.reader = threading.Thread(target=self.read, name="nemo-inference-reader", daemon=True)
+        self.reader.start()
+        if not self.ready.wait(timeout) or self.error:
+            self.shutdown()
+            raise RuntimeError(f"Inference worker failed to start: {self.error or 'timed out'}")
+        print(f"[+] Inference worker online ({self.backend}, loaded in {time.perf_counter() - started:.2f}s).")
+        return self
+
+    def send(self, message):
+        with self.send_lock:
+            self.conn.send(message)
+
+    def generate(self, query: str, context: Optional[List[dict]] = None, max_tokens: int = MAX_TOKENS) -> Generation:
+        """Submits a request and returns its stream immediately."""
+        generation = Generation(self, next(self.ids))
+        self.requests[generation.req_id] = generation
+        try:
+            self.send((REQ_GENERATE, generation.req_id, query, list(context or ()), max_tokens))
+        except (OSError, AttributeError):
+            self.requests.pop(generation.req_id, None)
+            generation._finish(error="inference worker is not running")
+        return generation
+
+    def cancel(self, req_id: int):
+        try:
+            self.send((REQ_CANCEL, req_id))
+        except (OSError, AttributeError):
+            pass
+
+    def read(self):
+        """Reader thread: demultiplexes worker messages by request id."""
+        try:
+            while True:
+                kind, req_id, payload = self.conn.recv()
+                if kind == MSG_READY:
+                    self.ready.set()
+                    continue
+                if req_id is None:
+                    self.error = payload
+                    self.ready.set()
+                    continue
+                generation = self.requests.get(req_id)
+                if generation is None:
+                    continue
+                if kind == MSG_TOKEN:
+                    generation._token(payload)
+                elif kind == MSG_ERROR:
+                    generation.error = payload
+                elif kind == MSG_DONE:
+                    del self.requests[req_id]
+                    generation._finish(cancelled=payload)
+        except (EOFError, OSError):
+            pass
+        # Worker exited: release everyone still waiting on a stream
+        self.ready.set()
+        for generation in list(self.requests.values()):
+            generation._finish(error="inference worker exited")
+        self.requests.clear()
+
+    def shutdown(self, timeout: float = 5.0):
+        if self.process is None:
+            return
+        try:
+            self.send((REQ_STOP,))
+        except (OSError, AttributeError):
+            pass
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.conn.close()
+        if self.reader is not None:
+            self.reader.join(timeout)
+        self.process = None
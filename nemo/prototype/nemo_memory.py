@@ -0,0 +1,299 @@
+"""
+NEMO - Memory Retrieval Index
+
+BM25 over the agent's history, kept as an inverted index that grows by one
+entry per answered query. Postings are append-only arrays of entry numbers,
+so they stay sorted and a snapshot loads with a handful of frombytes calls.
+With NumPy present scoring is vectorised, and an optional embedder adds a
+cosine-similarity term on top of BM25.
+"""
+import re
+import sys
+import math
+import heapq
+import struct
+import zlib
+from array import array
+from bisect import bisect_left
+from typing import Callable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None  # Pure-Python scoring; embeddings need NumPy
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+COMMON_FRACTION = 0.05  # Pure Python: terms in more entries than this only rescore existing candidates
+COMMON_SCAN = 5000  # ...or scan the most recent entries when there are none; smaller postings score exactly
+EMBED_WEIGHT = 0.5  # Cosine weight against max-normalised BM25
+CONTEXT_ENTRIES = 4
+CONTEXT_CHARS = 2000
+
+SNAPSHOT_HEADER = struct.Struct("<4sBIIQd")  # magic, version, entries, terms, postings, ts of last entry
+SNAPSHOT_MAGIC = b"NMIX"
+SNAPSHOT_VERSION = 1
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def _le(values: array) -> bytes:
+    """Array bytes in little-endian order, the snapshot's on-disk layout."""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def _from_le(typecode: str, data) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+class HashingEmbedder:
+    """
+    Model-free embedding: character trigrams hashed into dim signed buckets,
+    L2-normalised. Catches spelling variants and word fragments BM25 misses;
+    swap in a real sentence encoder through MemoryIndex(embedder=...).
+    """
+
+    def __init__(self, dim: int = 256):
+        if np is None:
+            raise RuntimeError("NumPy is required for embeddings.")
+        self.dim = dim
+
+    def __call__(self, text: str):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in tokenize(text):
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                h = zlib.crc32(padded[i:i + 3].encode())
+                vector[h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return vector / norm if norm else vector
+
+class MemoryIndex:
+    """
+    Inverted index over {"q", "a", "ts"} history entries; entry numbers are
+    positions in the agent's history list. Only BM25 postings are
+    snapshotted - embeddings are recomputed from history on load.
+    """
+
+    def __init__(self, embedder: Optional[Callable] = None):
+        if embedder is not None and np is None:
+            raise RuntimeError("NumPy is required for embedding similarity.")
+        self.vocab = {}  # {term: term id}
+        self.terms = []
+        self.postings = []  # Per term id: array('I') of entry numbers, ascending
+        self.frequencies = []  # Per term id: array('H') of term counts, parallel to postings
+        self.lengths = array('I')  # Tokens per entry
+        self.total_length = 0
+        self.last_ts = 0.0
+        self.embedder = embedder
+        self.vectors = None  # float32 matrix, rows grow by doubling
+        self.embedded = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    @staticmethod
+    def entry_text(entry: dict) -> str:
+        return f"{entry['q']}\n{entry['a']}"
+
+    def add(self, entry: dict) -> int:
+        """Indexes one history entry; returns its entry number."""
+        doc = len(self.lengths)
+        tokens = tokenize(self.entry_text(entry))
+        counts = {}
+        for token in tokens:
+            counts[token] = counts.get(token, 0) + 1
+        for token, count in counts.items():
+            term = self.vocab.get(token)
+            if term is None:
+                term = self.vocab[token] = len(self.terms)
+                self.terms.append(token)
+                self.postings.append(array('I'))
+                self.frequencies.append(array('H'))
+            self.postings[term].append(doc)
+            self.frequencies[term].append(min(count, 0xFFFF))
+        self.lengths.append(len(tokens))
+        self.total_length += len(tokens)
+        self.last_ts = entry.get('ts', 0.0)
+        if self.embedder is not None:
+            self._embed(entry)
+        return doc
+
+    def _embed(self, entry: dict):
+        vector = self.embedder(self.entry_text(entry))
+        if self.vectors is None:
+            self.vectors = np.zeros((1024, len(vector)), dtype=np.float32)
+        elif self.embedded == len(self.vectors):
+            grown = np.zeros((len(self.vectors) * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:self.embedded] = self.vectors
+            self.vectors = grown
+        self.vectors[self.embedded] = vector
+        self.embedded += 1
+
+    def catch_up(self, history: List[dict]) -> int:
+        """
+        Brings the index level with history (after loading a snapshot that
+        predates the newest entries). Rebuilds from scratch if the snapshot
+        doesn't match the history it claims to cover. Returns entries indexed.
+        """
+        count = len(self.lengths)
+        if count > len(history) or (count and history[count - 1].get('ts', 0.0) != self.last_ts):
+            self.__init__(self.embedder)
+            count = 0
+        if self.embedder is not None:
+            for entry in history[self.embedded:count]:
+                self._embed(entry)  # Snapshots carry no vectors
+        for entry in history[count:]:
+            self.add(entry)
+        return len(history) - count
+
+    # --- Scoring ---
+
+    def _idf(self, df: int) -> float:
+        n = len(self.lengths)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def _bm25_numpy(self, terms: List[int]):
+        scores = np.zeros(len(self.lengths), dtype=np.float32)
+        lengths = np.array(self.lengths, dtype=np.float32)
+        norm = BM25_K1 * (1.0 - BM25_B + BM25_B * lengths / (self.total_length / len(self.lengths)))
+        for term in terms:
+            # Copies, not views: a live buffer export would stop the arrays growing
+            docs = np.array(self.postings[term], dtype=np.int64)
+            tf = np.array(self.frequencies[term], dtype=np.float32)
+            scores[docs] += self._idf(len(docs)) * tf * (BM25_K1 + 1.0) / (tf + norm[docs])
+        return scores
+
+    def _bm25_python(self, terms: List[int]) -> dict:
+        n = len(self.lengths)
+        avg = self.total_length / n
+        lengths = self.lengths
+        scores = {}
+        # Rarest first: common terms then only rescore entries already in play
+        for term in sorted(terms, key=lambda t: len(self.postings[t])):
+            docs, freqs = self.postings[term], self.frequencies[term]
+            idf = self._idf(len(docs))
+            common = len(docs) > max(COMMON_SCAN, n * COMMON_FRACTION)
+            if common and not scores:
+                first = bisect_left(docs, n - COMMON_SCAN)
+                docs, freqs = docs[first:], freqs[first:]
+            elif common:
+                for doc in scores:
+                    i = bisect_left(docs, doc)
+                    if i < len(docs) and docs[i] == doc:
+                        tf = freqs[i]
+                        scores[doc] += idf * tf * (BM25_K1 + 1.0) / (
+                            tf + BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[doc] / avg))
+                continue
+            for doc, tf in zip(docs, freqs):
+                s = idf * tf * (BM25_K1 + 1.0) / (tf + BM25_K1 * (1.0 - BM25_B + BM25_B * lengths[doc] / avg))
+                scores[doc] = scores.get(doc, 0.0) + s
+        return scores
+
+    def search(self, query: str, k: int = CONTEXT_ENTRIES,
+               exclude: Optional[Callable[[int], bool]] = None) -> List[Tuple[int, float]]:
+        """Top-k (entry number, score), best first, skipping entries exclude() rejects."""
+        if not self.lengths:
+            return []
+        terms = list({self.vocab[t] for t in tokenize(query) if t in self.vocab})
+        if np is None:
+            scores = self._bm25_python(terms)
+            positive = [(doc, score) for doc, score in scores.items() if score > 0]
+
+            def top(n):
+                return heapq.nlargest(n, positive, key=lambda item: item[1])
+        else:
+            scores = self._bm25_numpy(terms)
+            if self.embedder is not None and self.embedded:
+                best = float(scores.max())
+                if best > 0:
+                    scores /= best
+                scores[:self.embedded] += EMBED_WEIGHT * (self.vectors[:self.embedded] @ self.embedder(query))
+
+            def top(n):
+                n = min(n, len(scores))
+                best = np.argpartition(-scores, n - 1)[:n]
+                best = best[np.argsort(-scores[best])]
+                return [(int(doc), float(scores[doc])) for doc in best if scores[doc] > 0]
+
+        # Excluded entries must not take top-k slots: widen the cut until k survive
+        n = k
+        while True:
+            ranked = top(n)
+            kept = [item for item in ranked if exclude is None or not exclude(item[0])]
+            if len(kept) >= k or len(ranked) < n:
+                return kept[:k]
+            n *= 2
+
+    def context(self, query: str, history: List[dict], k: int = CONTEXT_ENTRIES,
+                max_chars: int = CONTEXT_CHARS, exclude: Optional[Callable[[dict], bool]] = None) -> List[dict]:
+        """The most relevant memories that fit in max_chars, oldest first; exclude filters entries out."""
+        picked, used = [], 0
+        skip = (lambda doc: exclude(history[doc])) if exclude is not None else None
+        for doc, _ in self.search(query, k, skip):
+            size = len(history[doc]['q']) + len(history[doc]['a'])
+            if used + size > max_chars:
+                continue
+            picked.append(doc)
+            used += size
+        return [history[doc] for doc in sorted(picked)]
+
+    # --- Snapshot ---
+
+    def to_bytes(self) -> bytes:
+        """
+        Header, vocabulary, entry lengths, then every term's postings laid out
+        back to back (lengths, entry numbers, counts).
+        """
+        sizes = array('I', (len(p) for p in self.postings))
+        docs, freqs = array('I'), array('H')
+        for term_docs, term_freqs in zip(self.postings, self.frequencies):
+            docs.extend(term_docs)
+            freqs.extend(term_freqs)
+        vocab = '\n'.join(self.terms).encode()
+        return b''.join([
+            SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, len(self.lengths), len(self.terms),
+                                 len(docs), self.last_ts),
+            struct.pack("<I", len(vocab)), vocab,
+            _le(self.lengths), _le(sizes), _le(docs), _le(freqs),
+        ])
+
+    @classmethod
+    def from_bytes(cls, data: bytes, embedder: Optional[Callable] = None) -> 'MemoryIndex':
+        try:
+            magic, version, entries, terms, total, last_ts = SNAPSHOT_HEADER.unpack_from(data)
+            (vocab_size,) = struct.unpack_from("<I", data, SNAPSHOT_HEADER.size)
+        except struct.error:
+            raise ValueError("Truncated Nemo memory index snapshot.")
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+            raise ValueError("Not a Nemo memory index snapshot.")
+        view = memoryview(data)
+        pos = SNAPSHOT_HEADER.size + 4
+        index = cls(embedder)
+        index.terms = bytes(view[pos:pos + vocab_size]).decode().split('\n') if terms else []
+        pos += vocab_size
+        index.lengths = _from_le('I', view[pos:pos + 4 * entries])
+        pos += 4 * entries
+        sizes = _from_le('I', view[pos:pos + 4 * terms])
+        pos += 4 * terms
+        docs = _from_le('I', view[pos:pos + 4 * total])
+        pos += 4 * total
+        freqs = _from_le('H', view[pos:pos + 2 * total])
+        if len(index.terms) != terms or len(freqs) != total or sum(sizes) != total:
+            raise ValueError("Truncated Nemo memory index snapshot.")
+        start = 0
+        for size in sizes:
+            index.postings.append(docs[start:start + size])
+            index.frequencies.append(freqs[start:start + size])
+            start += size
+        index.vocab = {term: i for i, term in enumerate(index.terms)}
+        index.total_length = sum(index.lengths)
+        index.last_ts = last_ts
+        return index
@@ -0,0 +1,123 @@
+"""
+NEMO - Write-Behind Memory Persister
+
+The response path only queues the new memory entry. A background thread
+collects entries for up to flush_interval seconds (or until max_batch are
+waiting), then encrypts and appends the batch to the VaultZero record log in
+one append_records call. Exit (normal, atexit or SIGTERM/SIGHUP) flushes
+whatever is left, so a crash loses at most the batch still being collected.
+"""
+import json
+import time
+import atexit
+import signal
+import threading
+
+FLUSH_INTERVAL = 2.0  # Seconds an entry may wait before it is written; None = only on batch/shutdown
+MAX_BATCH = 64  # Entries that trigger an early flush
+
+class MemoryPersister:
+    def __init__(self, vault, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.vault = vault
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.pending = []
+        self.lock = threading.Lock()  # Guards pending
+        self.flush_lock = threading.Lock()  # One batch in flight, so records keep their order
+        self.wakeup = threading.Event()
+        self.thread = None
+        self.closed = False
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.last_flush = None
+        self._previous = {}  # Signal handlers we replaced
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name="nemo-persister", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+        return self
+
+    def install_signal_handlers(self):
+        """
+        Turns SIGTERM/SIGHUP into SystemExit so finally blocks and atexit get
+        to flush. The handler itself takes no locks: it runs on the main
+        thread, possibly inside submit(). Main thread only.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for name in ("SIGTERM", "SIGHUP"):
+            signum = getattr(signal, name, None)
+            if signum is not None:
+                self._previous[signum] = signal.signal(signum, self._on_signal)
+
+    def _on_signal(self, signum, frame):
+        previous = self._previous.get(signum)
+        if callable(previous):
+            previous(signum, frame)
+        elif previous != signal.SIG_IGN:
+            raise SystemExit(128 + signum)  # Unwinds the main thread through its finally blocks
+
+    def submit(self, entry):
+        """Queues one memory entry; never touches the disk or the cipher."""
+        if self.closed:
+            self.vault.append_record(json.dumps(entry))  # Late straggler after shutdown
+            return
+        with self.lock:
+            self.pending.append(entry)
+            full = len(self.pending) >= self.max_batch
+        if full:
+            self.wakeup.set()
+
+    def run(self):
+        while not self.closed:
+            # Debounce: an entry waits out the interval so bursts land in one batch
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            if not self.closed:
+                self.flush()
+
+    def flush(self):
+        """Writes everything queued so far. Returns the number of entries written."""
+        with self.flush_lock:
+            with self.lock:
+                batch, self.pending = self.pending, []
+            if not batch:
+                return 0
+            try:
+                self.vault.append_records([json.dumps(entry) for entry in batch])
+            except BaseException as e:
+                with self.lock:
+                    self.pending[:0] = batch  # Keep them, in order, for the next attempt
+                if not isinstance(e, Exception):
+                    raise
+                self.failures += 1
+                print(f"\n[!] Memory flush failed ({len(batch)} entries kept): {e}")
+                return 0
+            self.flushed += len(batch)
+            self.batches += 1
+            self.last_flush = time.time()
+            return len(batch)
+
+    def close(self):
+        """Stops the thread and flushes the remainder. Safe to call more than once."""
+        if self.closed:
+            return
+        self.closed = True
+        self.wakeup.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join()
+        self.flush()
+        atexit.unregister(self.close)
+
+    def stats(self):
+        with self.lock:
+            pending = len(self.pending)
+        return {
+            "pending": pending,
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "last_flush": self.last_flush,
+        }
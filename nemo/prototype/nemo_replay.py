@@ -0,0 +1,344 @@
+import time
+import threading
+from typing import List, Optional, Tuple
+
+try:
+    import keyboard
+except ImportError:
+    keyboard = None  # Only KeyboardBackend needs it; buffer backends replay headless
+
+# Step opcodes: index into a backend's dispatch table
+STEP_WRITE = 0  # (text,)
+STEP_KEY = 1  # (key name, repeat count)
+STEP_ERASE = 2  # (character count,) - select backwards and delete once
+
+INSTANT = float('inf')  # Speed multiplier: no delays, net edit only
+MAX_STEP_DELAY = 0.3  # Longest pause replayed between two actions (before scaling)
+MERGE_GAP = 0.005  # Scaled pauses shorter than this are merged into one step
+
+class ReplayBackend:
+    """Where replayed instructions land. Subclasses implement the three step kinds."""
+
+    def write(self, text: str):
+        raise NotImplementedError
+
+    def key(self, name: str, count: int = 1):
+        raise NotImplementedError
+
+    def erase(self, count: int):
+        raise NotImplementedError
+
+    def dispatch(self) -> tuple:
+        """Handlers indexed by step opcode."""
+        return (self.write, self.key, self.erase)
+
+class KeyboardBackend(ReplayBackend):
+    """Physical replay through the keyboard module."""
+
+    def __init__(self):
+        if keyboard is None:
+            raise RuntimeError("The keyboard module is required for live replay.")
+
+    def write(self, text: str):
+        keyboard.write(text)
+
+    def key(self, name: str, count: int = 1):
+        for _ in range(count):
+            keyboard.press_and_release(name)
+
+    def erase(self, count: int):
+        if count:
+            for _ in range(count):
+                keyboard.press_and_release('shift+left')
+            keyboard.press_and_release('backspace')
+
+class TextBufferBackend(ReplayBackend):
+    """In-memory text with a cursor, so replays can be checked without a desktop session."""
+
+    def __init__(self, text: str = ""):
+        self.chars = list(text)
+        self.cursor = len(self.chars)
+        self.keys = {
+            'left': self._left, 'right': self._right, 'up': self._up, 'down': self._down,
+            'backspace': self._backspace, 'delete': self._delete, 'enter': self._enter,
+        }
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.chars)
+
+    def write(self, text: str):
+        self.chars[self.cursor:self.cursor] = text
+        self.cursor += len(text)
+
+    def key(self, name: str, count: int = 1):
+        handler = self.keys.get(name)
+        if handler is None:
+            raise NotImplementedError(f"{type(self).__name__} cannot replay '{name}'.")
+        for _ in range(count):
+            handler()
+
+    def erase(self, count: int):
+        count = min(count, self.cursor)
+        del self.chars[self.cursor - count:self.cursor]
+        self.cursor -= count
+
+    def _left(self):
+        self.cursor = max(0, self.cursor - 1)
+
+    def _right(self):
+        self.cursor = min(len(self.chars), self.cursor + 1)
+
+    def _line_start(self, pos: int) -> int:
+        while pos > 0 and self.chars[pos - 1] != '\n':
+            pos -= 1
+        return pos
+
+    def _line_end(self, pos: int) -> int:
+        while pos < len(self.chars) and self.chars[pos] != '\n':
+            pos += 1
+        return pos
+
+    def _up(self):
+        start = self._line_start(self.cursor)
+        if start:
+            prev = self._line_start(start - 1)
+            self.cursor = min(prev + self.cursor - start, start - 1)
+
+    def _down(self):
+        start = self._line_start(self.cursor)
+        end = self._line_end(self.cursor)
+        if end < len(self.chars):
+            self.cursor = min(end + 1 + self.cursor - start, self._line_end(end + 1))
+
+    def _backspace(self):
+        self.erase(1)
+
+    def _delete(self):
+        if self.cursor < len(self.chars):
+            del self.chars[self.cursor]
+
+    def _enter(self):
+        self.write('\n')
+
+class PieceTableBackend(ReplayBackend):
+    """
+    Virtual editor document: a piece table with a cursor and an undo stack.
+
+    Text lives in the immutable original buffer plus an append-only add
+    buffer; the document is a list of [buffer, start, length] pieces, so an
+    edit never copies text. Lookups start from the last piece touched, which
+    keeps sequential typing O(1). Every edit - typed or replayed - pushes an
+    undo record and ctrl+z pops one, as in a real editor, so replays can be
+    checked for whether inverse instructions really restore the text.
+    """
+
+    ORIGINAL = 0
+    ADD = 1
+
+    def __init__(self, text: str = ""):
+        self.buffers = (text, [])  # Original text, add buffer (list of chars)
+        self.pieces = [[self.ORIGINAL, 0, len(text)]] if text else []
+        self.length = len(text)
+        self.cursor = self.length
+        self.undo_stack = []  # (inserted?, position, text)
+        self.keys = {
+            'left': self._left, 'right': self._right, 'up': self._up, 'down': self._down,
+            'backspace': self._backspace, 'delete': self._delete, 'enter': self._enter,
+            'ctrl+z': self.undo,
+        }
+        self._hint = (0, 0)  # (piece index, document offset where it starts)
+
+    # --- Piece table ---
+
+    def _find(self, pos: int) -> Tuple[int, int]:
+        """Returns (piece index, piece start) of the piece containing pos (len(pieces) at the end)."""
+        i, start = self._hint
+        if i > len(self.pieces):
+            i, start = 0, 0
+        while i > 0 and start > pos:
+            i -= 1
+            start -= self.pieces[i][2]
+        while i < len(self.pieces) and start + self.pieces[i][2] <= pos:
+            start += self.pieces[i][2]
+            i += 1
+        self._hint = (i, start)
+        return i, start
+
+    def _insert(self, pos: int, text: str):
+        if not text:
+            return
+        add = self.buffers[self.ADD]
+        add_start = len(add)
+        add.extend(text)
+        i, start = self._find(pos)
+        if i and pos == start and self.pieces[i - 1][0] == self.ADD and \
+                self.pieces[i - 1][1] + self.pieces[i - 1][2] == add_start:
+            self.pieces[i - 1][2] += len(text)  # Typing straight on: grow the previous piece
+            self._hint = (i - 1, start - self.pieces[i - 1][2] + len(text))
+        elif i < len(self.pieces) and pos > start:
+            buf, b_start, b_len = self.pieces[i]
+            cut = pos - start
+            self.pieces[i:i + 1] = [[buf, b_start, cut], [self.ADD, add_start, len(text)],
+                                    [buf, b_start + cut, b_len - cut]]
+            self._hint = (i, start)
+        else:
+            self.pieces.insert(i, [self.ADD, add_start, len(text)])
+            self._hint = (i, start)
+        self.length += len(text)
+
+    def _remove(self, pos: int, count: int) -> str:
+        """Deletes count characters at pos and returns them."""
+        count = max(0, min(count, self.length - pos))
+        if not count:
+            return ""
+        i, start = self._find(pos)
+        removed = []
+        remaining = count
+        while remaining:
+            buf, b_start, b_len = self.pieces[i]
+            lo = pos - start  # Non-zero only inside the first piece
+            hi = min(b_len, lo + remaining)
+            removed.append(self._slice(buf, b_start + lo, b_start + hi))
+            kept = []
+            if lo:
+                kept.append([buf, b_start, lo])
+            if hi < b_len:
+                kept.append([buf, b_start + hi, b_len - hi])
+            self.pieces[i:i + 1] = kept
+            remaining -= hi - lo
+            if lo:
+                i += 1
+                start = pos
+        self._hint = (i, start)
+        self.length -= count
+        return ''.join(removed)
+
+    def _slice(self, buf: int, lo: int, hi: int) -> str:
+        data = self.buffers[buf]
+        return data[lo:hi] if buf == self.ORIGINAL else ''.join(data[lo:hi])
+
+    def _char_at(self, pos: int) -> str:
+        i, start = self._find(pos)
+        buf, b_start, _ = self.pieces[i]
+        return self.buffers[buf][b_start + pos - start]
+
+    @property
+    def text(self) -> str:
+        return ''.join(self._slice(buf, lo, lo + n) for buf, lo, n in self.pieces)
+
+    # --- Editing ---
+
+    def write(self, text: str):
+        for ch in text:
+            # One undo record per keystroke, matching the engine's one-action-one-undo model
+            self._insert(self.cursor, ch)
+            self.undo_stack.append((True, self.cursor, ch))
+            self.cursor += 1
+
+    def key(self, name: str, count: int = 1):
+        handler = self.keys.get(name)
+        if handler is None:
+            raise NotImplementedError(f"{type(self).__name__} cannot replay '{name}'.")
+        for _ in range(count):
+            handler()
+
+    def erase(self, count: int):
+        count = min(count, self.cursor)
+        if count:
+            self.cursor -= count
+            self.undo_stack.append((False, self.cursor, self._remove(self.cursor, count)))
+
+    def undo(self):
+        if not self.undo_stack:
+            return
+        inserted, pos, text = self.undo_stack.pop()
+        if inserted:
+            self._remove(pos, len(text))
+            self.cursor = pos
+        else:
+            self._insert(pos, text)
+            self.cursor = pos + len(text)
+
+    def _left(self):
+        self.cursor = max(0, self.cursor - 1)
+
+    def _right(self):
+        self.cursor = min(self.length, self.cursor + 1)
+
+    def _line_start(self, pos: int) -> int:
+        while pos > 0 and self._char_at(pos - 1) != '\n':
+            pos -= 1
+        return pos
+
+    def _line_end(self, pos: int) -> int:
+        while pos < self.length and self._char_at(pos) != '\n':
+            pos += 1
+        return pos
+
+    def _up(self):
+        start = self._line_start(self.cursor)
+        if start:
+            prev = self._line_start(start - 1)
+            self.cursor = min(prev + self.cursor - start, start - 1)
+
+    def _down(self):
+        start = self._line_start(self.cursor)
+        end = self._line_end(self.cursor)
+        if end < self.length:
+            self.cursor = min(end + 1 + self.cursor - start, self._line_end(end + 1))
+
+    def _backspace(self):
+        self.erase(1)
+
+    def _delete(self):
+        if self.cursor < self.length:
+            self.undo_stack.append((False, self.cursor, self._remove(self.cursor, 1)))
+
+    def _enter(self):
+        self.write('\n')
+
+class ReplayPlan:
+    """
+    A compiled replay: (opcode, args, delay, actions) steps run through a
+    backend's dispatch table. Atomic plans (instant net edits) don't map
+    step-by-step onto the history, so they ignore cancellation.
+    """
+
+    def __init__(self, steps: List[Tuple[int, tuple, float, int]], total: int, atomic: bool = False):
+        self.steps = steps
+        self.total = total  # History actions the plan covers
+        self.atomic = atomic
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    @classmethod
+    def from_edits(cls, edits: List[tuple], total: int) -> 'ReplayPlan':
+        """Wraps a net-edit plan of ('write', text) / ('erase', n) / ('key', name, n) steps."""
+        steps = []
+        for edit in edits:
+            if edit[0] == 'write':
+                steps.append((STEP_WRITE, (edit[1],), 0.0, 0))
+            elif edit[0] == 'erase':
+                steps.append((STEP_ERASE, (edit[1],), 0.0, 0))
+            else:
+                steps.append((STEP_KEY, (edit[1], edit[2]), 0.0, 0))
+        return cls(steps, total, atomic=True)
+
+    def run(self, backend: ReplayBackend, cancel: Optional[threading.Event] = None) -> int:
+        """Executes the plan; returns how many history actions were applied."""
+        handlers = backend.dispatch()
+        done = 0
+        try:
+            for kind, args, delay, actions in self.steps:
+                if cancel is not None and not self.atomic:
+                    if cancel.wait(delay) if delay > 0 else cancel.is_set():
+                        break
+                elif delay > 0:
+                    time.sleep(delay)
+                handlers[kind](*args)
+                done += actions
+        except Exception:
+            return 0 if self.atomic else done
+        return self.total if self.atomic else done
@@ -0,0 +1,366 @@
+"""
+NEMO - Screen Capture Pipeline
+
+A background thread grabs the screen into a ring of preallocated BGRA
+frames, crops and downscales the region of interest straight into PNG
+scanlines with strided slices (only the kept pixels are copied, never the
+whole frame), and hashes the result in tiles. Only a frame whose tiles
+changed is compressed and base64-encoded, so the hotkey just picks up the
+latest prepared payload.
+"""
+import math
+import time
+import zlib
+import base64
+import struct
+import hashlib
+import threading
+from typing import List, Optional, Tuple
+
+try:
+    import mss
+except ImportError:
+    mss = None  # Only MssFrameSource needs it; the synthetic source runs headless
+
+CAPTURE_INTERVAL = 0.5  # Seconds between background grabs
+FIRST_FRAME_TIMEOUT = 5.0  # How long latest() waits for the background thread's first payload
+RING_FRAMES = 4
+MAX_WIDTH = 1280  # Payload width cap when no explicit downscale factor is given
+TILE = 32  # Change-detection tile edge, in output pixels
+MIN_CHANGED_TILES = 1  # Fewer changed tiles than this (a blinking caret...) keeps the old payload
+PNG_LEVEL = 6
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def png_chunk(tag: bytes, data) -> bytes:
+    crc = zlib.crc32(data, zlib.crc32(tag)) & 0xFFFFFFFF
+    return b''.join((struct.pack(">I", len(data)), tag, data, struct.pack(">I", crc)))
+
+def encode_png(width: int, height: int, scanlines, level: int = PNG_LEVEL) -> bytes:
+    """RGB PNG from rows that already carry their filter byte (0 = none)."""
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b''.join((PNG_SIGNATURE, png_chunk(b"IHDR", header),
+                     png_chunk(b"IDAT", zlib.compress(scanlines, level)), png_chunk(b"IEND", b"")))
+
+class FrameSizeChanged(Exception):
+    """The source's frames no longer match its width x height; it has updated both."""
+
+class FrameSource:
+    """Fills a preallocated width x height BGRA buffer with the current screen."""
+
+    width = 0
+    height = 0
+
+    def grab_into(self, buffer: memoryview):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class SyntheticFrameSource(FrameSource):
+    """Gradient desktop with a block that moves every change_every grabs."""
+
+    def __init__(self, width: int = 1920, height: int = 1080, change_every: int = 1, block: Tuple[int, int] = (160, 90)):
+        self.width = width
+        self.height = height
+        self.change_every = change_every
+        self.block = block
+        self.grabs = 0
+        row = bytearray(width * 4)
+        row[0::4] = bytes(x * 255 // width for x in range(width))
+        row[3::4] = b"\xff" * width
+        self.background = bytearray(width * height * 4)
+        for y in range(height):
+            row[1::4] = bytes((y * 255 // height,)) * width
+            self.background[y * width * 4:(y + 1) * width * 4] = row
+        self.block_row = b"\x20\x40\xe0\xff" * block[0]
+
+    def grab_into(self, buffer):
+        buffer[:] = self.background
+        step = self.grabs // self.change_every
+        bw, bh = self.block
+        x = step * 37 % (self.width - bw)
+        y = step * 23 % (self.height - bh)
+        for r in range(bh):
+            offset = ((y + r) * self.width + x) * 4
+            buffer[offset:offset + bw * 4] = self.block_row
+        self.grabs += 1
+
+class MssFrameSource(FrameSource):
+    """
+    A real monitor through mss (BGRA natively). mss handles are per thread, so
+    it opens lazily. The size comes from a probe grab, not the monitor's
+    logical geometry: on HiDPI displays the grab is in physical pixels.
+    """
+
+    def __init__(self, monitor: int = 1):
+        if mss is None:
+            raise RuntimeError("The mss module is required for live screen capture.")
+        with mss.mss() as sct:
+            self.monitor = dict(sct.monitors[monitor])
+            self.width, self.height = sct.grab(self.monitor).size
+        self.sct = None
+
+    def grab_into(self, buffer):
+        if self.sct is None:
+            self.sct = mss.mss()
+        shot = self.sct.grab(self.monitor)
+        if shot.size != (self.width, self.height):
+            # Scaling or resolution changed under us
+            old = (self.width, self.height)
+            self.width, self.height = shot.size
+            raise FrameSizeChanged(f"Screen went from {old[0]}x{old[1]} to {self.width}x{self.height}.")
+        buffer[:] = shot.raw
+
+    def close(self):
+        if self.sct is not None:
+            self.sct.close()
+            self.sct = None
+
+class ScreenPayload:
+    """A prepared capture: base64 PNG plus where and when it came from."""
+
+    __slots__ = ("data", "width", "height", "captured", "checked", "seq", "changed_tiles", "encode_ms")
+
+    def __init__(self, data, width, height, captured, seq, changed_tiles, encode_ms):
+        self.data = data
+        self.width = width
+        self.height = height
+        self.captured = captured  # When this content was grabbed
+        self.checked = captured  # Last grab that found it unchanged
+        self.seq = seq
+        self.changed_tiles = changed_tiles
+        self.encode_ms = encode_ms
+
+class ScreenPipeline:
+    """
+    roi is (x, y, width, height) in source pixels. Downscaling is integer
+    decimation (every n-th pixel of every n-th row); without an explicit
+    factor it is the smallest one that fits max_width. If the source changes
+    size, the buffers are rebuilt and the roi is clipped to the new frame.
+    """
+
+    def __init__(self, source: FrameSource, roi: Optional[Tuple[int, int, int, int]] = None,
+                 downscale: Optional[int] = None, max_width: int = MAX_WIDTH, interval: float = CAPTURE_INTERVAL,
+                 frames: int = RING_FRAMES, tile: int = TILE, min_changed_tiles: int = MIN_CHANGED_TILES,
+                 level: int = PNG_LEVEL):
+        self.source = source
+        self.requested = (roi, downscale, max_width, frames)
+        self.interval = interval
+        self.tile = tile
+        self.min_changed_tiles = min_changed_tiles
+        self.level = level
+        self.seq = 0  # Frames grabbed so far; slot seq % frames is written next
+        self._layout()
+
+        self.payload = None
+        self.first_frame = threading.Event()  # Set once a payload exists
+        self.lock = threading.Lock()  # One frame through the pipeline at a time
+        self.stopped = threading.Event()
+        self.thread = None
+        self.captured = 0
+        self.encoded = 0
+        self.skipped = 0
+        self.last_capture_ms = None
+
+    def _layout(self):
+        """Sizes the roi, ring and scanline buffers for the source's current frame size."""
+        roi, downscale, max_width, frames = self.requested
+        width, height = self.source.width, self.source.height
+        x, y, w, h = roi or (0, 0, width, height)
+        x, y = max(0, min(x, width - 1)), max(0, min(y, height - 1))
+        self.roi = (x, y, min(w, width - x), min(h, height - y))
+        self.factor = downscale or max(1, math.ceil(self.roi[2] / max_width))
+        self.out_width = math.ceil(self.roi[2] / self.factor)
+        self.out_height = math.ceil(self.roi[3] / self.factor)
+
+        self.ring = [bytearray(width * height * 4) for _ in range(frames)]
+        self.ring_ts = [0.0] * frames
+        self.row_bytes = 1 + self.out_width * 3  # Filter byte + RGB
+        self.scaled = bytearray(self.out_height * self.row_bytes)
+        self.band_hashes = []  # Per band of tile rows, as of the last encoded frame
+        self.tile_hashes = []  # Per band: per-tile digests, as of the last encoded frame
+
+    # --- Stages ---
+
+    def _scale(self, frame: bytearray):
+        """
+        Crop + decimate + BGRA->RGB into PNG scanlines. Strided bytearray
+        slices copy just the kept bytes of each row; a strided memoryview
+        would avoid that tiny copy but takes a per-item path about 4x slower.
+        """
+        x, y, w, _ = self.roi
+        stride = self.source.width * 4
+        step = 4 * self.factor
+        out, row_bytes, rgb = self.scaled, self.row_bytes, 3 * self.out_width
+        for i in range(self.out_height):
+            start = (y + i * self.factor) * stride + x * 4
+            end = start + w * 4
+            o = i * row_bytes + 1
+            out[o:o + rgb:3] = frame[start + 2:end:step]  # R
+            out[o + 1:o + rgb:3] = frame[start + 1:end:step]  # G
+            out[o + 2:o + rgb:3] = frame[start:end:step]  # B
+
+    def _diff(self) -> Tuple[int, List[bytes], dict]:
+        """
+        Counts tiles that differ from the last encoded frame. Each band of
+        tile rows is contiguous, so it is hashed in one call; only changed
+        bands are hashed tile by tile.
+        """
+        view = memoryview(self.scaled)
+        row_bytes, tile = self.row_bytes, self.tile
+        tile_bytes = tile * 3
+        columns = math.ceil(self.out_width / tile)
+        bands, band_tiles, changed = [], {}, 0
+        for b, top in enumerate(range(0, self.out_height, tile)):
+            bottom = min(top + tile, self.out_height)
+            digest = hashlib.blake2b(view[top * row_bytes:bottom * row_bytes], digest_size=16).digest()
+            bands.append(digest)
+            if b < len(self.band_hashes) and self.band_hashes[b] == digest:
+                continue
+            hashers = [hashlib.blake2b(digest_size=16) for _ in range(columns)]
+            for row in range(top, bottom):
+                base = row * row_bytes + 1
+                for c, hasher in enumerate(hashers):
+                    hasher.update(view[base + c * tile_bytes:min(base + (c + 1) * tile_bytes, (row + 1) * row_bytes)])
+            tiles = [hasher.digest() for hasher in hashers]
+            old = self.tile_hashes[b] if b < len(self.tile_hashes) else ()
+            changed += sum(1 for c, t in enumerate(tiles) if c >= len(old) or old[c] != t)
+            band_tiles[b] = tiles
+        return changed, bands, band_tiles
+
+    def process(self) -> Optional[ScreenPayload]:
+        """Grabs one frame; re-encodes the payload only if enough tiles changed."""
+        with self.lock:
+            slot = self.seq % len(self.ring)
+            started = time.perf_counter()
+            frame = self.ring[slot]
+            try:
+                self.source.grab_into(memoryview(frame))
+            except FrameSizeChanged as e:
+                print(f"\n[NEMO] {e} Resizing the capture buffers.")
+                self._layout()  # Fresh tile hashes: the next frame is always re-encoded
+                frame = self.ring[slot]
+                self.source.grab_into(memoryview(frame))
+            now = time.time()
+            self.ring_ts[slot] = now
+            self.seq += 1
+            self.captured += 1
+            self.last_capture_ms = (time.perf_counter() - started) * 1000
+
+            self._scale(frame)
+            changed, bands, band_tiles = self._diff()
+            if self.payload is not None and changed < self.min_changed_tiles:
+                self.payload.checked = now
+                self.skipped += 1
+                return self.payload
+
+            started = time.perf_counter()
+            data = base64.b64encode(encode_png(self.out_width, self.out_height, self.scaled, self.level)).decode('ascii')
+            self.band_hashes = bands
+            for b, tiles in band_tiles.items():
+                if b < len(self.tile_hashes):
+                    self.tile_hashes[b] = tiles
+                else:
+                    self.tile_hashes.append(tiles)
+            self.encoded += 1
+            self.payload = ScreenPayload(data, self.out_width, self.out_height, now, self.seq, changed,
+                                         (time.perf_counter() - started) * 1000)
+            self.first_frame.set()
+            return self.payload
+
+    # --- Consumers ---
+
+    def latest(self, timeout: float = FIRST_FRAME_TIMEOUT) -> Optional[ScreenPayload]:
+        """
+        The prepared payload. While the background thread runs, the source
+        belongs to it, so an early call waits for its first frame (None on
+        timeout) instead of grabbing here; without the thread it grabs inline.
+        """
+        if self.thread is None:
+            payload = self.payload
+            return payload if payload is not None else self.process()
+        self.first_frame.wait(timeout)
+        return self.payload
+
+    def recent(self, n: int = RING_FRAMES) -> List[Tuple[float, bytes]]:
+        """Copies of the newest n raw BGRA frames, oldest first."""
+        with self.lock:
+            n = min(n, self.seq, len(self.ring))
+            slots = [(self.seq - n + i) % len(self.ring) for i in range(n)]
+            return [(self.ring_ts[s], bytes(self.ring[s])) for s in slots]
+
+    def stats(self) -> dict:
+        payload = self.payload
+        return {
+            "captured": self.captured,
+            "encoded": self.encoded,
+            "skipped": self.skipped,
+            "capture_ms": self.last_capture_ms,
+            "encode_ms": payload.encode_ms if payload else None,
+            "payload_bytes": len(payload.data) if payload else 0,
+            "size": (self.out_width, self.out_height),
+        }
+
+    # --- Background thread ---
+
+    def start(self):
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="nemo-screen", daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            while not self.stopped.is_set():
+                try:
+                    self.process()
+                except Exception as e:
+                    print(f"\n[NEMO] Screen capture error: {e}")
+                self.stopped.wait(self.interval)
+        finally:
+            self.source.close()  # Same thread that opened it
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+class ToolScreen:
+    """
+    Fallback with the ScreenPipeline consumer interface around a capture tool
+    exposing capture_base64() (nemo/tools ScreenCapture). There is no raw
+    frame to crop or diff, so every latest() is a fresh grab on the caller's thread.
+    """
+
+    def __init__(self, tool):
+        self.tool = tool
+        self.payload = None
+        self.captured = 0
+
+    def start(self):
+        return self
+
+    def stop(self):
+        pass
+
+    def latest(self, timeout: float = FIRST_FRAME_TIMEOUT) -> Optional[ScreenPayload]:
+        started = time.perf_counter()
+        data = self.tool.capture_base64()
+        self.captured += 1
+        self.payload = ScreenPayload(data, None, None, time.time(), self.captured, None,
+                                     (time.perf_counter() - started) * 1000)
+        return self.payload
+
+    def stats(self) -> dict:
+        payload = self.payload
+        return {
+            "captured": self.captured,
+            "encoded": self.captured,
+            "skipped": 0,
+            "capture_ms": payload.encode_ms if payload else None,
+            "encode_ms": None,
+            "payload_bytes": len(payload.data) if payload else 0,
+            "size": None,
+        }
@@ -6,17 +6,20 @@ from pynput import keyboard
 import keyboard as direct_kb 
 
 # Import Simulation Engine
-from nemo_code import NemoCodeSimulation
+from nemo_code import NemoCodeSimulation, ReplayWorker
+from nemo_hook import KeyEventRing, LatencyHistogram
+from nemo_screen import ScreenPipeline, MssFrameSource, ToolScreen, mss
 
 # Import Tools from parent (simulated paths for prototype)
 sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'nemo', 'nemo', 'tools'))
 try:
     from screen_capture.capture import ScreenCapture
+except ImportError:
+    ScreenCapture = None  # No placeholder: a fake screen is worse than none
+try:
     from audio_capture.capture import AudioCapture
 except ImportError:
-    # Fallback placeholders for standalone prototype
-    class ScreenCapture: 
-        def capture_base64(self): return "MOCK_BASE64_SCREEN"
+    # Fallback placeholder for standalone prototype
     class AudioCapture:
         def start_recording(self): pass
         def stop_recording(self): return "MOCK_TRANSCRIPT"
@@ -24,7 +27,15 @@ except ImportError:
 class NemoVanguard:
     def __init__(self):
         self.engine = NemoCodeSimulation()
-        self.screen = ScreenCapture()
+        # Screen frames are captured and encoded in the background; the hotkey only reads the result.
+        # Without mss the nemo tools' ScreenCapture grabs on demand; without either there is no
+        # screen at all, never a synthetic stand-in.
+        if mss is not None:
+            self.screen = ScreenPipeline(MssFrameSource())
+        elif ScreenCapture is not None:
+            self.screen = ToolScreen(ScreenCapture())
+        else:
+            self.screen = None
         self.audio = AudioCapture()
         
         # Hotkeys
@@ -36,12 +47,41 @@ class NemoVanguard:
         }
         
         self.current_keys = set()
-        self.simulation_active = False
+        self.simulation_active = False  # A rewind/progress combo is held; consumer thread only
+        self.replayer = ReplayWorker(self.engine)
         self.backspace_held_since = None
         self.last_key_time = 0
 
+        # The OS hook only enqueues; tracking and combos run on the consumer thread
+        self.events = KeyEventRing()
+        self.hook_latency = LatencyHistogram()
+        self.running = False
+        self.consumer = None
+
     def on_press(self, key):
-        now = time.time()
+        """Listener thread: must return at once, so it only timestamps and enqueues the key."""
+        started = time.perf_counter_ns()
+        self.events.push(key, True, time.time())
+        self.hook_latency.record(time.perf_counter_ns() - started)
+
+    def on_release(self, key):
+        started = time.perf_counter_ns()
+        self.events.push(key, False, time.time())
+        self.hook_latency.record(time.perf_counter_ns() - started)
+
+    def consume(self):
+        """Consumer thread: replays queued key events into tracking and combo detection."""
+        while self.running:
+            for key, pressed, ts in self.events.drain():
+                try:
+                    if pressed:
+                        self.handle_press(key, ts)
+                    else:
+                        self.handle_release(key)
+                except Exception as e:
+                    print(f"\n[NEMO] Key handler error: {e}")
+
+    def handle_press(self, key, now):
         self.current_keys.add(key)
         
         # --- 1. MAGIC BACKSPACE OVERLOAD ---
@@ -56,9 +96,9 @@ class NemoVanguard:
         if not self.simulation_active:
             try:
                 char = getattr(key, 'char', None)
-                if char: self.engine.track(char)
-                elif key == keyboard.Key.space: self.engine.track(' ')
-                elif key == keyboard.Key.enter: self.engine.track('enter')
+                if char: self.engine.track(char, now)
+                elif key == keyboard.Key.space: self.engine.track(' ', now)
+                elif key == keyboard.Key.enter: self.engine.track('enter', now)
             except Exception: pass
 
         # --- 3. SOVEREIGN COMBO DETECTION ---
@@ -67,20 +107,20 @@ class NemoVanguard:
         elif all(k in self.current_keys for k in self.hotkeys['progress']):
             self.trigger_simulation('forward')
 
-    def on_release(self, key):
+    def handle_release(self, key):
         if key in self.current_keys:
             self.current_keys.remove(key)
         
         # Handle Backspace Release
         if key == keyboard.Key.backspace:
             self.backspace_held_since = None
-            self.simulation_active = False
+            self.stop_simulation()
 
         # Handle Gemini Release (Right Alt)
         if key == keyboard.Key.alt_r:
             if not self.simulation_active:
                 self.trigger_gemini_intel()
-            self.simulation_active = False
+            self.stop_simulation()
 
         # Handle STT Release (Right Shift)
         if key == keyboard.Key.shift_r:
@@ -88,46 +128,79 @@ class NemoVanguard:
 
         # Kill Simulation on release of navigation
         if key == keyboard.Key.left or key == keyboard.Key.right:
-            self.simulation_active = False
+            self.stop_simulation()
 
     def trigger_simulation(self, direction):
         if self.simulation_active: return
         self.simulation_active = True
-        
-        def run():
-            print(f"\n[NEMO] {direction.upper()} SIMULATION ENGAGED...")
-            while self.simulation_active:
-                if direction == 'backward':
-                    success = self.engine.step_backward()
-                else:
-                    success = self.engine.step_forward()
-                
-                if not success: break
-            print(f"[NEMO] {direction.upper()} SIMULATION PAUSED.")
-
-        threading.Thread(target=run, daemon=True).start()
+        self.replayer.play(direction)
+
+    def stop_simulation(self):
+        if self.simulation_active:
+            self.simulation_active = False
+            self.replayer.stop()
 
     def trigger_gemini_intel(self):
+        """The screen payload sent along, or None when there is no screen capture."""
         print("\n[NEMO] CAPTURING VISUAL INTEL...")
-        b64_screen = self.screen.capture_base64()
-        print(f"[NEMO] Screen Context Secured ({len(b64_screen)} bytes). Sending to Gemini...")
+        if self.screen is None:
+            print("[!] Screen capture unavailable (mss not installed); sending to Gemini WITHOUT visual context.")
+            # API call logic goes here
+            return None
+        payload = self.screen.latest()
+        if payload is None:
+            print("[!] No screen frame captured yet; sending to Gemini WITHOUT visual context.")
+            return None
+        size = f"{payload.width}x{payload.height}, " if payload.width else ""
+        print(f"[NEMO] Screen Context Secured ({len(payload.data)} bytes, {size}"
+              f"verified {time.time() - payload.checked:.1f}s ago). Sending to Gemini...")
         # API call logic goes here
+        return payload
 
     def trigger_stt(self):
         print("\n[NEMO] TRANSCRIBING SOVEREIGN VOICE...")
         transcript = self.audio.stop_recording()
         print(f"[NEMO] Transcript: {transcript}")
 
+    def hook_stats(self) -> dict:
+        """Keyboard hook latency (p50/p99/max in microseconds) plus queue health."""
+        stats = self.hook_latency.summary()
+        stats["queued"] = len(self.events)
+        stats["dropped"] = self.events.dropped
+        return stats
+
+    def print_hook_stats(self):
+        stats = self.hook_stats()
+        if not stats["count"]:
+            return
+        print(f"[NEMO] Hook latency over {stats['count']} events: p50 {stats['p50_us']:.1f}us | "
+              f"p99 {stats['p99_us']:.1f}us | max {stats['max_us']:.1f}us | dropped {stats['dropped']}")
+
     def start(self):
         print("=== NEMO VANGUARD: THE SOVEREIGN AGENT ===")
         print("[INTEL] Data Invisibility: GUARANTEED")
         print("[INTEL] Magic Backspace: ACTIVE (>0.8s)")
-        print("[INTEL] Right Alt: GEMINI VISUAL")
+        print("[INTEL] Right Alt: GEMINI VISUAL" if self.screen is not None else
+              "[INTEL] Right Alt: GEMINI (screen capture OFFLINE - install mss)")
         print("[INTEL] Right Shift: STT")
         print("-" * 45)
 
-        with keyboard.Listener(on_press=self.on_press, on_release=self.on_release) as listener:
-            listener.join()
+        self.running = True
+        self.replayer.start()
+        if self.screen is not None:
+            self.screen.start()
+        self.consumer = threading.Thread(target=self.consume, daemon=True)
+        self.consumer.start()
+        try:
+            with keyboard.Listener(on_press=self.on_press, on_release=self.on_release) as listener:
+                listener.join()
+        finally:
+            self.running = False
+            self.consumer.join()
+            self.replayer.shutdown()
+            if self.screen is not None:
+                self.screen.stop()
+            self.print_hook_stats()
 
 if __name__ == "__main__":
     nemo = NemoVanguard()
@@ -0,0 +1,69 @@
+"""
+NEMO - Response cache tests: a repeated question is served from the cache,
+and earlier askings never crowd the real memories out of its context.
+"""
+import os
+import sys
+import types
+import importlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from nemo_cache import ResponseCache
+from nemo_memory import MemoryIndex, CONTEXT_ENTRIES
+
+QUESTION = "How large is the vault key?"
+
+def memories():
+    """Older askings of QUESTION outnumber the context slots; one real fact is also relevant."""
+    history = [{"q": QUESTION, "a": f"It is 256 bits ({i}).", "ts": float(i)} for i in range(3 * CONTEXT_ENTRIES)]
+    history.append({"q": "Rotate the vault key", "a": "The vault key rotates weekly.", "ts": 100.0})
+    return history
+
+def test_repeats_do_not_take_context_slots():
+    history = memories()
+    index = MemoryIndex()
+    index.catch_up(history)
+    cache = ResponseCache()
+    repeat = cache.repeats(QUESTION)
+
+    context = index.context(QUESTION, history, exclude=repeat)
+    assert history[-1] in context
+    assert not any(repeat(entry) for entry in context)
+
+def import_agent(monkeypatch):
+    """nemo_agent, with a bare pynput stand-in when it is missing: process_query never touches the listener."""
+    try:
+        import pynput  # noqa: F401
+    except ImportError:
+        pynput = types.ModuleType("pynput")
+        pynput.keyboard = types.SimpleNamespace(Key=None, KeyCode=None, Listener=None)
+        monkeypatch.setitem(sys.modules, "pynput", pynput)
+        monkeypatch.delitem(sys.modules, "nemo_agent", raising=False)
+    return importlib.import_module("nemo_agent")
+
+def test_same_question_n_times_gives_n_minus_one_hits(monkeypatch):
+    nemo_agent = import_agent(monkeypatch)
+    agent = nemo_agent.NemoAgent.__new__(nemo_agent.NemoAgent)
+    agent.history = memories()
+    agent.index = MemoryIndex()
+    agent.index.catch_up(agent.history)
+    agent.cache = ResponseCache()
+    saved, generated = [], []
+    agent.save_memory = saved.append
+
+    def generate_response(query, context):
+        generated.append(query)
+        response = f"answer {len(generated)}"
+        agent.cache.put(query, context, response)
+        return response
+    agent.generate_response = generate_response
+
+    n = 5
+    answers = [agent.process_query(QUESTION) for _ in range(n)]
+    stats = agent.cache.stats()
+    assert stats["hits"] == n - 1
+    assert stats["misses"] == 1
+    assert answers == ["answer 1"] * n
+    assert len(saved) == 1  # Hits are not persisted as new memories
+    assert len(agent.history) == len(memories()) + 1
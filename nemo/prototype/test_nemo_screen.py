@@ -0,0 +1,87 @@
+"""
+NEMO - Screen pipeline tests on the synthetic desktop: output geometry,
+skipping unchanged frames, counting changed tiles, and who touches the source.
+"""
+import os
+import sys
+import base64
+import struct
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from nemo_screen import ScreenPipeline, SyntheticFrameSource, FrameSizeChanged
+
+def png_size(payload):
+    png = base64.b64decode(payload.data)
+    return struct.unpack(">II", png[16:24])  # IHDR width, height
+
+def test_roi_and_downscale_set_the_output_size():
+    source = SyntheticFrameSource(320, 180)
+    payload = ScreenPipeline(source, roi=(10, 20, 101, 50), downscale=2).process()
+    assert (payload.width, payload.height) == (51, 25)
+    assert png_size(payload) == (51, 25)
+
+    # An roi running off the frame is clipped to it
+    payload = ScreenPipeline(SyntheticFrameSource(320, 180), roi=(300, 170, 100, 100), downscale=1).process()
+    assert (payload.width, payload.height) == (20, 10)
+
+    # Without a factor, the smallest one that fits max_width
+    pipeline = ScreenPipeline(SyntheticFrameSource(320, 180), max_width=100)
+    assert pipeline.factor == 4
+    assert png_size(pipeline.process()) == (80, 45)
+
+def test_unchanged_frame_reuses_the_payload():
+    pipeline = ScreenPipeline(SyntheticFrameSource(320, 180, change_every=1000))
+    first = pipeline.process()
+    second = pipeline.process()
+    assert second is first
+    assert pipeline.skipped == 1
+    assert pipeline.encoded == 1
+    assert pipeline.captured == 2
+
+def test_changed_tiles_cover_old_and_new_block():
+    source = SyntheticFrameSource(320, 180, change_every=1, block=(32, 32))
+    pipeline = ScreenPipeline(source, downscale=1, tile=32)
+    pipeline.process()
+    # The block leaves tile (0, 0) and lands on (37, 23): columns 1-2 of tile rows 0-1
+    payload = pipeline.process()
+    assert payload.changed_tiles == 5
+    assert pipeline.encoded == 2 and pipeline.skipped == 0
+
+class ResizingSource(SyntheticFrameSource):
+    """Switches to a doubled (HiDPI) frame on its second grab."""
+
+    def grab_into(self, buffer):
+        if self.grabs == 1 and self.width == 160:
+            self.__init__(320, 180, block=(32, 32))
+            self.grabs = 1
+            raise FrameSizeChanged("160x90 -> 320x180")
+        super().grab_into(buffer)
+
+def test_resized_source_rebuilds_the_buffers():
+    pipeline = ScreenPipeline(ResizingSource(160, 90, block=(32, 32)), downscale=1)
+    first = pipeline.process()
+    assert (first.width, first.height) == (160, 90)
+    payload = pipeline.process()
+    assert (payload.width, payload.height) == (320, 180)
+    assert png_size(payload) == (320, 180)
+    assert len(pipeline.ring[0]) == 320 * 180 * 4
+
+def test_latest_waits_for_the_capture_thread():
+    source = SyntheticFrameSource(320, 180)
+    grabbed_on = []
+    grab = source.grab_into
+
+    def grab_into(buffer):
+        grabbed_on.append(threading.current_thread().name)
+        grab(buffer)
+    source.grab_into = grab_into
+
+    pipeline = ScreenPipeline(source, interval=0.05).start()
+    try:
+        payload = pipeline.latest()
+    finally:
+        pipeline.stop()
+    assert payload is not None
+    assert set(grabbed_on) == {"nemo-screen"}
@@ -2,69 +2,302 @@ import subprocess
 import hashlib
 import json
 import os
+import sys
 import uuid
 import datetime
+import threading
+import stat
+from concurrent.futures import ThreadPoolExecutor, wait
+
+PROBE_TIMEOUT = 2.0  # Seconds allowed per entropy source
+PROBE_ATTEMPTS = 3  # Rounds a timed-out or failed probe gets before the scan fails
+PROBE_KILL_MARGIN = 0.5  # Probe subprocesses are killed this long before the scan stops waiting
+GHOST_KEY_V2 = "spectre-ghost-key-v2|"  # Domain prefix of the hardware-bound key
+
+# Process-lifetime manifest cache, keyed by backend name
+_MANIFEST_CACHE = {}
+_MANIFEST_LOCK = threading.Lock()
+
+class ProbeBackend:
+    """
+    Base probe backend. Each probe is a zero-argument callable returning a
+    string; a probe that cannot answer raises, and the scan retries it.
+    """
+    name = "generic"
+
+    def cancel(self):
+        """Stops probes still running after the scan gave up waiting for them."""
+
+    def probes(self):
+        return {
+            # Unique identifier of the network interface (portable)
+            'MAC_NODE': lambda: hex(uuid.getnode()),
+        }
+
+class LinuxProbeBackend(ProbeBackend):
+    """Reads DMI data from sysfs and the systemd machine-id. No subprocesses."""
+    name = "linux"
+    DMI_ROOT = "/sys/class/dmi/id"
+
+    def read_file(self, path):
+        try:
+            with open(path, 'r') as f:
+                value = f.read().strip()
+            return value or "UNKNOWN"
+        except OSError:
+            return "UNKNOWN"
+
+    def read_public_file(self, path):
+        """
+        DMI serials are usually root-only. Reading them only when they are
+        world-readable keeps the manifest (and key) the same for root and
+        for a normal user.
+        """
+        try:
+            if not os.stat(path).st_mode & stat.S_IROTH:
+                return "RESTRICTED"
+        except OSError:
+            return "UNKNOWN"
+        return self.read_file(path)
+
+    def cpu_id(self):
+        # x86 exposes no CPU serial; fall back to the model signature
+        fields = {}
+        try:
+            with open("/proc/cpuinfo", 'r') as f:
+                for line in f:
+                    if ':' in line:
+                        k, v = line.split(':', 1)
+                        fields.setdefault(k.strip(), v.strip())
+        except OSError:
+            return "UNKNOWN"
+        if fields.get('Serial'):
+            return fields['Serial']
+        signature = [fields.get(k, '') for k in ('vendor_id', 'cpu family', 'model', 'stepping', 'model name')]
+        return '-'.join(signature) if any(signature) else "UNKNOWN"
+
+    def root_disk(self):
+        """sysfs directory of the disk holding the root filesystem, or None."""
+        try:
+            st = os.stat("/")
+            node = os.path.realpath(f"/sys/dev/block/{os.major(st.st_dev)}:{os.minor(st.st_dev)}")
+        except OSError:
+            return None
+        if not os.path.isdir(node):
+            # Root on btrfs/overlay has an anonymous st_dev: use the mount source instead
+            node = None
+            try:
+                with open("/proc/mounts", 'r') as f:
+                    for line in f:
+                        source, target = line.split()[:2]
+                        if target == "/" and source.startswith("/dev/"):
+                            node = os.path.realpath(os.path.join("/sys/class/block",
+                                                                 os.path.basename(os.path.realpath(source))))
+            except OSError:
+                return None
+            if node is None or not os.path.isdir(node):
+                return None
+        # Device-mapper (LVM, LUKS): follow the first backing device down
+        for _ in range(8):
+            slaves = os.path.join(node, "slaves")
+            if not os.path.isdir(slaves) or not os.listdir(slaves):
+                break
+            node = os.path.realpath(os.path.join(slaves, sorted(os.listdir(slaves))[0]))
+        if os.path.exists(os.path.join(node, "partition")):
+            node = os.path.dirname(node)  # Partition -> whole disk
+        return node
+
+    def disk_serial(self):
+        node = self.root_disk()
+        if node is None:
+            return "UNKNOWN"
+        for leaf in ("device/serial", "serial", "device/wwid", "wwid"):
+            path = os.path.join(node, leaf)
+            if os.path.exists(path):
+                return self.read_public_file(path)
+        return "UNKNOWN"
+
+    def probes(self):
+        probes = super().probes()
+        probes.update({
+            'CPU_ID': self.cpu_id,
+            'MOBO_SERIAL': lambda: self.read_public_file(os.path.join(self.DMI_ROOT, "board_serial")),
+            'BIOS_SERIAL': lambda: self.read_public_file(os.path.join(self.DMI_ROOT, "product_serial")),
+            'DISK_SERIAL': self.disk_serial,
+            'MACHINE_ID': lambda: self.read_file("/etc/machine-id"),
+        })
+        return probes
+
+class WindowsProbeBackend(ProbeBackend):
+    """Queries hardware IDs through wmic. Only usable on Windows."""
+    name = "windows"
+
+    def __init__(self, timeout=PROBE_TIMEOUT - PROBE_KILL_MARGIN):
+        self.timeout = timeout  # Per wmic call; keep it below the scan's wait
+        self.running = set()  # wmic processes not yet reaped
+        self.lock = threading.Lock()
+
+    def get_windows_hwid(self, command):
+        """
+        Executes a wmic command to retrieve hardware IDs on Windows. Raises on
+        a timeout or failure: an error string would be hashed into the key.
+        """
+        # No shell: a timeout then kills wmic itself, not just a cmd.exe wrapper.
+        # Hide the window for cleaner CLI output.
+        startupinfo = subprocess.STARTUPINFO()
+        startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+        proc = subprocess.Popen(command.split(), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                startupinfo=startupinfo)
+        with self.lock:
+            self.running.add(proc)
+        try:
+            output, _ = proc.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.communicate()
+            raise TimeoutError(f"'{command}' timed out after {self.timeout:.1f}s")
+        finally:
+            with self.lock:
+                self.running.discard(proc)
+        if proc.returncode != 0:
+            raise OSError(f"'{command}' exited with status {proc.returncode}")
+
+        # wmic output usually has headers (Line 1) and value (Line 2)
+        # We split by newlines and filter out empty lines
+        lines = [line.strip() for line in output.decode(errors='replace').split('\n') if line.strip()]
+
+        if len(lines) > 1:
+            return lines[1] # Return the value, skipping header
+        return "UNKNOWN"
+
+    def cancel(self):
+        with self.lock:
+            hung = list(self.running)
+        for proc in hung:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def probes(self):
+        probes = super().probes()
+        probes.update({
+            # Unique ID of the processor
+            'CPU_ID': lambda: self.get_windows_hwid("wmic cpu get processorid"),
+            # Serial number of the baseboard
+            'MOBO_SERIAL': lambda: self.get_windows_hwid("wmic baseboard get serialnumber"),
+            # Serial number of the BIOS
+            'BIOS_SERIAL': lambda: self.get_windows_hwid("wmic bios get serialnumber"),
+            # Serial number of the physical media
+            'DISK_SERIAL': lambda: self.get_windows_hwid("wmic diskdrive get serialnumber"),
+        })
+        return probes
+
+def default_backend(probe_timeout=PROBE_TIMEOUT):
+    """Picks the probe backend for the running platform."""
+    if sys.platform.startswith('win'):
+        return WindowsProbeBackend(timeout=max(probe_timeout - PROBE_KILL_MARGIN, probe_timeout / 2))
+    if sys.platform.startswith('linux'):
+        return LinuxProbeBackend()
+    return ProbeBackend()
 
 class SpectreID:
-    def __init__(self):
+    def __init__(self, backend=None, cache_file=None, probe_timeout=PROBE_TIMEOUT):
         self.identity_file = "spectre_genesis.json"
         self.hardware_map = {}
+        self.backend = backend or default_backend(probe_timeout)
+        # Optional on-disk manifest cache (e.g. "spectre_manifest.json"). Off by default.
+        self.cache_file = cache_file
+        self.probe_timeout = probe_timeout
 
-    def get_windows_hwid(self, command):
-        """Executes a wmic command to retrieve hardware IDs on Windows."""
+    def run_probes(self, attempts=PROBE_ATTEMPTS):
+        """
+        Runs every probe of the backend in parallel, each bounded by
+        probe_timeout. Probes that time out or raise are retried; if one still
+        hasn't answered after `attempts` rounds the scan fails rather than
+        producing a manifest (and key) that differs from the next run's.
+        """
+        probes = self.backend.probes()
+        manifest = {}
+        errors = {}
+        for _ in range(attempts):
+            pending = {name: fn for name, fn in probes.items() if name not in manifest}
+            pool = ThreadPoolExecutor(max_workers=len(pending), thread_name_prefix="spectre-probe")
+            futures = {name: pool.submit(fn) for name, fn in pending.items()}
+            wait(futures.values(), timeout=self.probe_timeout)
+            # Never block on a hung probe: kill what it started, leave its thread to unwind
+            self.backend.cancel()
+            pool.shutdown(wait=False, cancel_futures=True)
+            for name, future in futures.items():
+                if not future.done():
+                    errors[name] = "no answer"
+                elif future.exception() is not None:
+                    errors[name] = future.exception()
+                else:
+                    manifest[name] = future.result()
+                    errors.pop(name, None)
+            if len(manifest) == len(probes):
+                return manifest
+        failed = ', '.join(f"{name} ({errors.get(name)})" for name in sorted(set(probes) - set(manifest)))
+        raise TimeoutError(f"Hardware probes failed after {attempts} attempts: {failed}")
+
+    def load_cached_manifest(self):
+        """Reads the on-disk manifest, rejecting it if it was captured on another NIC/backend."""
+        if not self.cache_file or not os.path.exists(self.cache_file):
+            return None
         try:
-            # Execute wmic command, ensuring we hide the window for cleaner CLI output
-            startupinfo = subprocess.STARTUPINFO()
-            startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-            
-            output = subprocess.check_output(command, startupinfo=startupinfo, shell=True).decode().strip()
-            
-            # wmic output usually has headers (Line 1) and value (Line 2)
-            # We split by newlines and filter out empty lines
-            lines = [line.strip() for line in output.split('\n') if line.strip()]
-            
-            if len(lines) > 1:
-                return lines[1] # Return the value, skipping header
-            return "UNKNOWN"
-        except Exception as e:
-            # Silently handle errors for prototype
-            return "ERROR"
+            with open(self.cache_file, 'r') as f:
+                cached = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        manifest = cached.get('hardware_manifest')
+        if cached.get('backend') != self.backend.name or not isinstance(manifest, dict):
+            return None
+        if manifest.get('MAC_NODE') != hex(uuid.getnode()) or {"TIMEOUT", "ERROR"} & set(manifest.values()):
+            return None  # Other NIC, or written by a version that cached failed probes
+        return manifest
 
-    def scan_hardware(self):
-        print("[-] Scanning local hardware layer...")
-        
-        # 1. CPU Processor ID
-        # Unique ID of the processor
-        cpu_id = self.get_windows_hwid("wmic cpu get processorid")
-        self.hardware_map['CPU_ID'] = cpu_id
-        
-        # 2. Motherboard Serial
-        # Serial number of the baseboard
-        mobo_id = self.get_windows_hwid("wmic baseboard get serialnumber")
-        self.hardware_map['MOBO_SERIAL'] = mobo_id
-        
-        # 3. BIOS Serial
-        # Serial number of the BIOS
-        bios_id = self.get_windows_hwid("wmic bios get serialnumber")
-        self.hardware_map['BIOS_SERIAL'] = bios_id
-        
-        # 4. MAC Address (Node)
-        # Unique identifier of the network interface
-        mac_addr = hex(uuid.getnode())
-        self.hardware_map['MAC_NODE'] = mac_addr
-
-        # 5. Disk Serial (System Drive)
-        # Serial number of the physical media
-        disk_id = self.get_windows_hwid("wmic diskdrive get serialnumber")
-        self.hardware_map['DISK_SERIAL'] = disk_id
-        
-        print(f"[-] Hardware Map Built: {len(self.hardware_map)} Entropy Sources Captured.")
+    def save_cached_manifest(self, manifest):
+        if not self.cache_file:
+            return
+        tmp_file = self.cache_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump({"backend": self.backend.name, "hardware_manifest": manifest}, f, indent=4)
+        os.replace(tmp_file, self.cache_file)
+
+    def scan_hardware(self, refresh=False):
+        """Builds the hardware map, reusing the process-wide (and optional disk) cache."""
+        with _MANIFEST_LOCK:
+            manifest = None if refresh else _MANIFEST_CACHE.get(self.backend.name)
+            if manifest is None and not refresh:
+                manifest = self.load_cached_manifest()
+            if manifest is None:
+                print("[-] Scanning local hardware layer...")
+                manifest = self.run_probes()
+                self.save_cached_manifest(manifest)
+                print(f"[-] Hardware Map Built: {len(manifest)} Entropy Sources Captured.")
+            _MANIFEST_CACHE[self.backend.name] = manifest
+
+        self.hardware_map = dict(manifest)
         return self.hardware_map
 
-    def generate_ghost_key(self):
-        """Generates a deterministic SHA-256 hash from the hardware map."""
+    def generate_ghost_key(self, scan=False):
+        """
+        Generates a deterministic SHA-256 hash from the hardware map.
+
+        By default it hashes whatever map is set and never scans, so a fresh
+        SpectreID (as SecureVault, GhostMech, Yukora and Nemo build one)
+        hashes an EMPTY map: sha256(""), the same on every machine. Vaults
+        already exist under that legacy key, so it stays as it is.
+
+        scan=True is the hardware-bound key: the (cached) probe manifest,
+        hashed under the GHOST_KEY_V2 prefix so it never equals a legacy
+        key. SecureVault(hardware_bound=True) is built on it.
+        """
+        if scan:
+            self.scan_hardware()
         # Sort keys to ensure deterministic ordering (JSON key order isn't guaranteed)
-        raw_string = ""
+        raw_string = GHOST_KEY_V2 if scan else ""
         for key in sorted(self.hardware_map.keys()):
             raw_string += f"{key}:{self.hardware_map[key]}|"
         
@@ -0,0 +1,145 @@
+import sys
+import time
+import ctypes
+import ctypes.util
+import hashlib
+import threading
+from contextlib import contextmanager
+
+KEY_TTL = 900  # Seconds a derived key stays cached (15 minutes)
+
+def _load_locker():
+    """Returns (lock, unlock) callables for pinning memory pages, or (None, None)."""
+    try:
+        if sys.platform.startswith('win'):
+            kernel32 = ctypes.windll.kernel32
+            lock, unlock = kernel32.VirtualLock, kernel32.VirtualUnlock
+        else:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            lock, unlock = libc.mlock, libc.munlock
+    except (AttributeError, OSError):
+        return None, None
+    # Explicit argtypes, otherwise ctypes truncates 64-bit addresses to C int
+    for fn in (lock, unlock):
+        fn.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+    return lock, unlock
+
+_LOCK_FN, _UNLOCK_FN = _load_locker()
+
+class LockedBuffer:
+    """A fixed-size bytearray pinned in RAM (never swapped) and wiped on release."""
+
+    def __init__(self, data):
+        self.buf = bytearray(data)
+        self.size = len(self.buf)
+        self._view = (ctypes.c_char * self.size).from_buffer(self.buf)
+        self.locked = False
+        if _LOCK_FN is not None:
+            # Best effort: RLIMIT_MEMLOCK may refuse, the key is still usable.
+            # mlock returns 0 on success, VirtualLock returns non-zero.
+            result = _LOCK_FN(ctypes.addressof(self._view), self.size)
+            self.locked = (result != 0) if sys.platform.startswith('win') else (result == 0)
+
+    def view(self):
+        """Read-only view of the pinned bytes; no copy leaves the locked page."""
+        return memoryview(self.buf).toreadonly()
+
+    def zeroize(self):
+        ctypes.memset(ctypes.addressof(self._view), 0, self.size)
+        if self.locked and _UNLOCK_FN is not None:
+            _UNLOCK_FN(ctypes.addressof(self._view), self.size)
+            self.locked = False
+
+class KeyCache:
+    """
+    Session cache for PBKDF2-derived vault keys.
+
+    Entries are keyed on a digest of (ghost key, salt), so neither secret is
+    retained, and the derived key itself lives in a LockedBuffer until it
+    expires or zeroize() is called. Keys are only handed out as views of
+    that buffer, inside borrow(); an entry that expires while borrowed is
+    wiped when the last borrower is done with it.
+    """
+
+    def __init__(self, ttl=KEY_TTL):
+        self.ttl = ttl
+        self._entries = {}  # {digest: [LockedBuffer, expires_at, borrowers]}
+        self._lock = threading.Lock()
+        self._timer = None
+
+    def _slot(self, ghost_key, salt):
+        return hashlib.sha256(ghost_key.encode() + b"|" + salt).digest()
+
+    def _sweep(self, now):
+        """Wipes every expired entry nobody is borrowing. Caller holds _lock."""
+        for slot, entry in list(self._entries.items()):
+            if now >= entry[1] and not entry[2]:
+                entry[0].zeroize()
+                del self._entries[slot]
+
+    def _arm(self):
+        """Schedules a sweep at the earliest expiry, so idle keys don't outlive their TTL."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._entries:
+            delay = max(0.0, min(e[1] for e in self._entries.values()) - time.monotonic())
+            self._timer = threading.Timer(delay + 0.01, self.sweep)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def sweep(self):
+        with self._lock:
+            self._sweep(time.monotonic())
+            self._arm()
+
+    @contextmanager
+    def borrow(self, ghost_key, salt):
+        """Yields a read-only view of the cached key (None on a miss), valid inside the block."""
+        slot = self._slot(ghost_key, salt)
+        with self._lock:
+            now = time.monotonic()
+            self._sweep(now)
+            entry = self._entries.get(slot)
+            if entry is None or now >= entry[1]:
+                entry = None
+            else:
+                entry[2] += 1
+        if entry is None:
+            yield None
+            return
+        view = entry[0].view()
+        try:
+            yield view
+        finally:
+            view.release()
+            with self._lock:
+                entry[2] -= 1
+                self._sweep(time.monotonic())
+
+    def __contains__(self, item):
+        ghost_key, salt = item
+        with self._lock:
+            entry = self._entries.get(self._slot(ghost_key, salt))
+            return entry is not None and time.monotonic() < entry[1]
+
+    def put(self, ghost_key, salt, key):
+        slot = self._slot(ghost_key, salt)
+        with self._lock:
+            self._sweep(time.monotonic())
+            old = self._entries.pop(slot, None)
+            if old is not None and not old[2]:
+                old[0].zeroize()  # A borrowed one is wiped by its last borrower's sweep
+            self._entries[slot] = [LockedBuffer(key), time.monotonic() + self.ttl, 0]
+            self._arm()
+
+    def zeroize(self):
+        """Wipes and drops every cached key."""
+        with self._lock:
+            for buf, _, _ in self._entries.values():
+                buf.zeroize()
+            self._entries.clear()
+            self._arm()
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,10 +1,18 @@
 import os
 import base64
 import sys
-from cryptography.fernet import Fernet
+from contextlib import contextmanager
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.exceptions import InvalidTag
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 
+from key_cache import KeyCache, KEY_TTL
+from vault_log import VaultLog
+import vault_stream
+from vault_bulk import BulkEngine
+from vault_dedup import DedupStore
+
 # Import SpectreID logic (simulated for self-containment)
 sys.path.append(os.path.join(os.getcwd(), 'spectre', 'prototype'))
 try:
@@ -13,7 +21,7 @@ except ImportError:
     # Fallback if pathing fails
     print("[!] Warning: Could not find spectre_id module. Re-implementing logic.")
     class SpectreID:
-        def generate_ghost_key(self):
+        def generate_ghost_key(self, scan=False):
             # This would be the hardware-bound logic we built
             import subprocess, uuid, hashlib
             def get_hwid(cmd):
@@ -23,15 +31,27 @@ except ImportError:
             return hashlib.sha256(raw.encode()).hexdigest()
 
 class SecureVault:
-    def __init__(self):
+    def __init__(self, key_ttl=KEY_TTL, hardware_bound=False):
         self.spectre = SpectreID()
-        self.vault_file = "vault.bin"
-        self.salt_file = "vault.salt"
+        # The default key is SpectreID's legacy one, which hashes no hardware at all (see
+        # generate_ghost_key). hardware_bound=True keys a separate vault.hw.* set of files
+        # on a real hardware scan instead; an unreadable machine is then a hard error.
+        self.hardware_bound = hardware_bound
+        prefix = "vault.hw" if hardware_bound else "vault"
+        self.vault_file = prefix + ".bin"
+        self.salt_file = prefix + ".salt"
+        self.log_dir = prefix + ".d"
+        self.log = None
+        self.store_dir = prefix + ".store"
+        self.store = None
+        self.salt = None
+        self.key_cache = KeyCache(ttl=key_ttl)
+
+    def get_salt(self):
+        """Reads (or creates) the vault salt once per session."""
+        if self.salt is not None:
+            return self.salt
 
-    def get_encryption_key(self):
-        """Derives a strong encryption key from the hardware-bound Ghost Key."""
-        ghost_key = self.spectre.generate_ghost_key()
-        
         # We use a salt to ensure the key is even more robust
         if os.path.exists(self.salt_file):
             with open(self.salt_file, 'rb') as f:
@@ -40,6 +60,15 @@ class SecureVault:
             salt = os.urandom(16)
             with open(self.salt_file, 'wb') as f:
                 f.write(salt)
+        self.salt = salt
+        return salt
+
+    def derive_key_material(self):
+        """Makes sure the session key is cached, running PBKDF2 only on a miss. Returns (ghost_key, salt)."""
+        ghost_key = self.spectre.generate_ghost_key(scan=self.hardware_bound)
+        salt = self.get_salt()
+        if (ghost_key, salt) in self.key_cache:
+            return ghost_key, salt
 
         kdf = PBKDF2HMAC(
             algorithm=hashes.SHA256(),
@@ -47,8 +76,131 @@ class SecureVault:
             salt=salt,
             iterations=100000,
         )
-        key = base64.urlsafe_b64encode(kdf.derive(ghost_key.encode()))
-        return key
+        self.key_cache.put(ghost_key, salt, kdf.derive(ghost_key.encode()))
+        return ghost_key, salt
+
+    @contextmanager
+    def key_material(self):
+        """Lends the raw 32-byte key as a read-only view of its locked buffer, for the block only."""
+        while True:
+            with self.key_cache.borrow(*self.derive_key_material()) as key:
+                if key is not None:  # Expired between derive and borrow: derive again
+                    yield key
+                    return
+
+    def get_encryption_key(self):
+        """Derives a strong encryption key from the hardware-bound Ghost Key."""
+        with self.key_material() as key:
+            return base64.urlsafe_b64encode(key)
+
+    def preload_key(self):
+        """Pays the KDF cost once up front (e.g. at agent startup)."""
+        self.derive_key_material()
+        print("[+] Vault key derived and cached for this session.")
+
+    def zeroize(self):
+        """Wipes every cached key; the next vault operation re-derives it."""
+        self.key_cache.zeroize()
+
+    def get_cipher(self):
+        return Fernet(self.get_encryption_key())
+
+    def open_log(self):
+        """Opens the append-only record log (vault.d/), rebuilding its offset index."""
+        if self.log is None:
+            self.log = VaultLog(self.log_dir, self.get_cipher)
+        return self.log
+
+    def append_records(self, records):
+        """Encrypts and appends text records; cost is independent of vault size."""
+        self.open_log().append_many([r.encode() for r in records])
+
+    def append_record(self, record):
+        self.append_records([record])
+
+    def read_records(self, last=None):
+        """Returns the newest `last` records (or all of them), oldest first."""
+        log = self.open_log()
+        try:
+            data = log.read_all() if last is None else log.read_last(last)
+        except InvalidToken:
+            print("[CRITICAL] ACCESS DENIED: Hardware signature does not match or vault log is corrupt.")
+            return None
+        return [r.decode() for r in data]
+
+    def lock_file(self, src, dst=None, chunk_size=vault_stream.CHUNK_SIZE):
+        """Encrypts a file of any size in constant memory (chunked AES-GCM). Returns the vault path."""
+        dst = dst or src + ".vz"
+        try:
+            with self.key_material() as key, open(src, 'rb') as fin, \
+                    open(dst + ".tmp", 'wb', buffering=chunk_size) as fout:
+                total = vault_stream.encrypt_stream(key, fin, fout, chunk_size)
+            os.replace(dst + ".tmp", dst)
+        finally:
+            if os.path.exists(dst + ".tmp"):
+                os.remove(dst + ".tmp")  # Failed part-way: never leave a half-written vault file
+        print(f"[SUCCESS] {total} bytes encrypted and locked in {dst}")
+        return dst
+
+    def unlock_stream(self, src, dst):
+        """Decrypts a chunked vault file into dst (a path or writable binary stream)."""
+        with self.key_material() as key, open(src, 'rb') as fin:
+            if hasattr(dst, 'write'):
+                return vault_stream.decrypt_stream(key, fin, dst)
+            # Decrypt beside the target so a failed chunk never leaves partial plaintext behind
+            try:
+                with open(dst + ".tmp", 'wb') as fout:
+                    total = vault_stream.decrypt_stream(key, fin, fout)
+                os.replace(dst + ".tmp", dst)
+            finally:
+                if os.path.exists(dst + ".tmp"):
+                    os.remove(dst + ".tmp")
+            return total
+
+    def read_chunk(self, src, index):
+        """Decrypts a single chunk of a chunked vault file."""
+        with self.key_material() as key, open(src, 'rb') as fin:
+            return vault_stream.read_chunk(key, fin, index)
+
+    def read_range(self, src, offset, size):
+        """Decrypts only the chunks covering a plaintext byte range."""
+        with self.key_material() as key, open(src, 'rb') as fin:
+            return vault_stream.read_range(key, fin, offset, size)
+
+    def open_store(self):
+        """Opens the deduplicating object store (vault.store/)."""
+        if self.store is None:
+            with self.key_material() as key:
+                self.store = DedupStore(self.store_dir, key)  # Keeps only subkeys derived here
+        return self.store
+
+    def lock_snapshot(self, name, sensitive_text):
+        """Stores a named snapshot; chunks shared with earlier snapshots are not rewritten."""
+        stats = self.open_store().put(name, sensitive_text.encode())
+        print(f"[SUCCESS] Snapshot '{name}' locked: {stats['new_chunks']}/{stats['chunks']} new chunks, "
+              f"{stats['new_bytes']} of {stats['size']} bytes written.")
+        return stats
+
+    def unlock_snapshot(self, name):
+        """Returns the snapshot text, or None if it is missing or fails verification."""
+        try:
+            data = self.open_store().get(name)
+        except (OSError, InvalidTag, ValueError):
+            print("[CRITICAL] ACCESS DENIED: Hardware signature does not match or snapshot is corrupt.")
+            return None
+        return data.decode() if data is not None else None
+
+    def lock_tree(self, src_dir, dst_dir, workers=None, executor="process"):
+        """Vaults a whole directory tree across a worker pool. Returns throughput stats."""
+        with self.key_material() as key:
+            engine = BulkEngine(key, workers=workers, executor=executor)
+            return engine.lock_tree(src_dir, dst_dir)
+
+    def unlock_tree(self, src_dir, dst_dir, workers=None, executor="process"):
+        """Restores a tree produced by lock_tree. Returns throughput stats."""
+        with self.key_material() as key:
+            engine = BulkEngine(key, workers=workers, executor=executor)
+            return engine.unlock_tree(src_dir, dst_dir)
 
     def lock_data(self, sensitive_text):
         """Encrypts data using the Spectre key."""
@@ -0,0 +1,85 @@
+"""
+VAULTZERO - Dedup store tests: round trip, shared chunks stored once, manifests
+bound to their entry, and gc of unreferenced objects.
+"""
+import os
+import sys
+import json
+import random
+
+import pytest
+from cryptography.exceptions import InvalidTag
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import vault_dedup
+from vault_dedup import DedupStore, chunk_boundaries
+
+KEY = bytes(range(32))
+
+def sample(size, seed=7):
+    return random.Random(seed).randbytes(size)
+
+def test_round_trip(tmp_path):
+    store = DedupStore(str(tmp_path), KEY)
+    data = sample(300_000)
+    stats = store.put("notes", data)
+    assert stats["size"] == len(data)
+    assert stats["new_chunks"] == stats["chunks"] > 1
+    assert store.get("notes") == data
+    assert DedupStore(str(tmp_path), KEY).get("notes") == data  # Reopened
+    assert store.get("missing") is None
+    store.put("empty", b"")
+    assert store.get("empty") == b""
+
+def test_shared_chunks_are_stored_once(tmp_path):
+    store = DedupStore(str(tmp_path), KEY)
+    data = sample(300_000)
+    store.put("v1", data)
+    assert store.put("copy", data)["new_chunks"] == 0
+    edited = data[:1000] + b"inserted near the start" + data[1000:]
+    stats = store.put("v2", edited)
+    assert 0 < stats["new_chunks"] <= 2  # Only the chunks around the insert
+    assert store.get("v2") == edited
+
+def test_manifest_cannot_stand_in_for_another_entry(tmp_path):
+    store = DedupStore(str(tmp_path), KEY)
+    store.put("public", b"nothing to see" * 500)
+    store.put("secret", sample(20_000))
+    os.replace(store._manifest_path("public"), store._manifest_path("secret"))
+    with pytest.raises(InvalidTag):
+        store.get("secret")
+
+def test_legacy_manifest_is_rebound(tmp_path):
+    store = DedupStore(str(tmp_path), KEY)
+    data = sample(50_000)
+    store.put("old", data)
+    path = store._manifest_path("old")
+    legacy = store._seal(json.dumps(store._manifest(path)).encode(), b"manifest")
+    store._write(path, legacy)
+    assert store.get("old") == data
+    with open(path, 'rb') as f:
+        assert store._open(f.read(), store._manifest_aad(path))  # Re-sealed under the bound AAD
+
+    # A legacy manifest moved to another entry's file is still refused
+    store.put("other", b"x" * 5000)
+    store._write(store._manifest_path("other"), legacy)
+    with pytest.raises(ValueError):
+        store.get("other")
+
+def test_gc_drops_only_unreferenced_objects(tmp_path):
+    store = DedupStore(str(tmp_path), KEY)
+    keep, drop = sample(100_000, seed=1), sample(100_000, seed=2)
+    store.put("keep", keep)
+    store.put("drop", drop)
+    store.delete("drop")
+    assert store.gc() > 0
+    assert store.gc() == 0
+    assert store.get("keep") == keep
+
+@pytest.mark.skipif(vault_dedup.np is None, reason="NumPy not installed")
+def test_numpy_and_python_chunking_agree(monkeypatch):
+    data = sample(1_000_000) + bytes(100_000) + b"ab" * 50_000
+    fast = list(chunk_boundaries(data))
+    monkeypatch.setattr(vault_dedup, "np", None)
+    assert list(chunk_boundaries(data)) == fast
@@ -0,0 +1,104 @@
+"""
+VAULTZERO - Record log tests: a torn tail is cut on open without losing later
+appends, and compaction merges segments without losing or reordering records.
+"""
+import os
+import sys
+
+from cryptography.fernet import Fernet
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from vault_log import VaultLog, RECORD_HEADER
+
+KEY = Fernet.generate_key()
+
+def cipher():
+    return Fernet(KEY)
+
+def records(n, start=0):
+    return [f"record {i}".encode() for i in range(start, start + n)]
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("seg-"))
+
+def test_torn_tail_is_cut_and_appends_continue(tmp_path):
+    log = VaultLog(str(tmp_path), cipher)
+    log.append_many(records(5))
+    log.close()
+    path = os.path.join(str(tmp_path), segment_files(str(tmp_path))[-1])
+    intact = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(RECORD_HEADER.pack(500) + b"half a tok")  # Crash mid-append
+
+    log = VaultLog(str(tmp_path), cipher)
+    assert os.path.getsize(path) == intact
+    assert log.read_all() == records(5)
+    log.append(b"after the crash")
+    log.close()
+    assert VaultLog(str(tmp_path), cipher).read_all() == records(5) + [b"after the crash"]
+
+def test_torn_header_is_cut(tmp_path):
+    log = VaultLog(str(tmp_path), cipher)
+    log.append_many(records(3))
+    log.close()
+    path = os.path.join(str(tmp_path), segment_files(str(tmp_path))[-1])
+    with open(path, 'ab') as f:
+        f.write(b"\x00\x00")
+    assert VaultLog(str(tmp_path), cipher).read_all() == records(3)
+
+def fill(log, batches, per_batch=20):
+    for b in range(batches):
+        log.append_many(records(per_batch, b * per_batch))
+
+def test_compaction_merges_sealed_segments(tmp_path):
+    log = VaultLog(str(tmp_path), cipher, segment_size=1024)
+    fill(log, 10)
+    before = segment_files(str(tmp_path))
+    assert len(before) > 4
+    target = 8 * 1024  # Three 2 KB segments per merge
+    assert log.compact(target_size=target) == len(before) - 1  # Everything but the active segment
+    after = segment_files(str(tmp_path))
+    assert 2 < len(after) < len(before)
+    assert all(os.path.getsize(os.path.join(str(tmp_path), name)) <= target for name in after)
+    assert log.compact(target_size=target) == 0  # Nothing left that fits together
+    assert log.read_all() == records(200)
+
+    assert log.compact(target_size=1 << 20) == len(after) - 1
+    assert len(segment_files(str(tmp_path))) == 2
+    assert log.read_all() == records(200)
+    assert log.read_last(3) == records(3, 197)
+    log.append(b"after compaction")
+    log.close()
+    assert VaultLog(str(tmp_path), cipher).read_all() == records(200) + [b"after compaction"]
+
+def test_compaction_keep_last_drops_old_records(tmp_path):
+    log = VaultLog(str(tmp_path), cipher, segment_size=1024)
+    fill(log, 10)
+    log.compact(keep_last=50)
+    kept = log.read_all()
+    # Only sealed segments are trimmed: the active one keeps all of its records
+    assert kept[-50:] == records(50, 150)
+    assert len(kept) >= 50 and kept == records(len(kept), 200 - len(kept))
+    log.close()
+    assert VaultLog(str(tmp_path), cipher).read_all() == kept
+
+def test_interrupted_compaction_is_resolved_on_open(tmp_path):
+    log = VaultLog(str(tmp_path), cipher, segment_size=1024)
+    fill(log, 10)
+    log.close()
+    originals = {name: open(os.path.join(str(tmp_path), name), 'rb').read() for name in segment_files(str(tmp_path))}
+    log = VaultLog(str(tmp_path), cipher, segment_size=1024)
+    log.compact()
+    log.close()
+    # Crash after the merged segment was renamed in, before the inputs were removed
+    for name, data in originals.items():
+        with open(os.path.join(str(tmp_path), name), 'wb') as f:
+            f.write(data)
+    with open(os.path.join(str(tmp_path), "seg-000099-000099.log.tmp"), 'wb') as f:
+        f.write(b"partial merge")
+
+    log = VaultLog(str(tmp_path), cipher, segment_size=1024)
+    assert log.read_all() == records(200)
+    assert not any(name.endswith(".tmp") for name in os.listdir(str(tmp_path)))
+    log.close()
@@ -0,0 +1,80 @@
+"""
+VAULTZERO - Chunked stream tests: round trips at chunk boundaries, and every
+tampered, reordered or truncated stream is refused.
+"""
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from vault_stream import (StreamError, HEADER, TAG_SIZE, MIN_CHUNK_SIZE, encrypt_stream, decrypt_stream,
+                          read_chunk, read_range)
+
+KEY = bytes(range(32))
+CHUNK = MIN_CHUNK_SIZE
+
+def seal(data, chunk_size=CHUNK):
+    out = io.BytesIO()
+    assert encrypt_stream(KEY, io.BytesIO(data), out, chunk_size=chunk_size) == len(data)
+    return out.getvalue()
+
+def unseal(sealed):
+    out = io.BytesIO()
+    decrypt_stream(KEY, io.BytesIO(sealed), out)
+    return out.getvalue()
+
+def chunks(sealed):
+    body, size = sealed[HEADER.size:], CHUNK + TAG_SIZE
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+@pytest.mark.parametrize("size", [0, 1, CHUNK - 1, CHUNK, CHUNK + 1, 3 * CHUNK, 3 * CHUNK + 7])
+def test_round_trip(size):
+    data = os.urandom(size)
+    assert unseal(seal(data)) == data
+
+def test_flipped_bit_is_refused():
+    sealed = bytearray(seal(os.urandom(3 * CHUNK)))
+    sealed[HEADER.size + CHUNK + TAG_SIZE + 5] ^= 0x01  # Inside chunk 1
+    with pytest.raises(StreamError, match="Chunk 1"):
+        unseal(bytes(sealed))
+
+def test_tampered_header_is_refused():
+    sealed = bytearray(seal(os.urandom(2 * CHUNK)))
+    sealed[10] ^= 0x01  # The salt, so a different file key
+    with pytest.raises(StreamError):
+        unseal(bytes(sealed))
+    with pytest.raises(StreamError, match="Not a VaultZero stream"):
+        unseal(b"XXXX" + bytes(sealed[4:]))
+
+def test_truncation_at_a_chunk_boundary_is_refused():
+    sealed = seal(os.urandom(3 * CHUNK + 100))
+    header, parts = sealed[:HEADER.size], chunks(sealed)
+    with pytest.raises(StreamError):
+        unseal(header + b"".join(parts[:-1]))  # Last chunk dropped: chunk 2 was not sealed as final
+    with pytest.raises(StreamError):
+        unseal(sealed[:-1])
+    with pytest.raises(StreamError, match="Truncated stream header"):
+        unseal(sealed[:HEADER.size - 1])
+
+def test_reordered_or_spliced_chunks_are_refused():
+    data = os.urandom(3 * CHUNK)
+    sealed = seal(data)
+    header, parts = sealed[:HEADER.size], chunks(sealed)
+    with pytest.raises(StreamError):
+        unseal(header + parts[1] + parts[0] + parts[2])
+    other = chunks(seal(os.urandom(3 * CHUNK)))  # Same key, different file salt
+    with pytest.raises(StreamError):
+        unseal(header + parts[0] + other[1] + parts[2])
+
+def test_random_access_matches_the_plaintext():
+    data = os.urandom(5 * CHUNK + 123)
+    src = io.BytesIO(seal(data))
+    assert read_chunk(KEY, src, 2) == data[2 * CHUNK:3 * CHUNK]
+    assert read_chunk(KEY, src, 5) == data[5 * CHUNK:]
+    assert read_range(KEY, src, CHUNK - 10, 2 * CHUNK) == data[CHUNK - 10:3 * CHUNK - 10]
+    assert read_range(KEY, src, len(data) - 5, 100) == data[-5:]
+    with pytest.raises(IndexError):
+        read_chunk(KEY, src, 6)
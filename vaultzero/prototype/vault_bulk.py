@@ -0,0 +1,189 @@
+import os
+import time
+import multiprocessing.util
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from vault_stream import ChunkCipher, HEADER, CHUNK_SIZE, _read_full
+
+VAULT_SUFFIX = ".vz"
+INFLIGHT_PER_WORKER = 4  # Chunks queued per worker before the reader blocks
+
+# Per-process state of pool workers, set by the initializer; the parent never holds it
+_WORKER_KEY = None
+_WORKER_CIPHERS = {}
+
+def _init_worker(master_key):
+    global _WORKER_KEY
+    _WORKER_KEY = bytearray(master_key)
+    _WORKER_CIPHERS.clear()
+    multiprocessing.util.Finalize(None, _clear_worker, exitpriority=0)  # Runs as the worker exits
+
+def _clear_worker():
+    global _WORKER_KEY
+    if _WORKER_KEY is not None:
+        _WORKER_KEY[:] = bytes(len(_WORKER_KEY))
+        _WORKER_KEY = None
+    _WORKER_CIPHERS.clear()
+
+def _worker_cipher(salt, chunk_size):
+    cipher = _WORKER_CIPHERS.get(salt)
+    if cipher is None:
+        if len(_WORKER_CIPHERS) > 64:
+            _WORKER_CIPHERS.clear()
+        cipher = _WORKER_CIPHERS[salt] = ChunkCipher(_WORKER_KEY, salt=salt, chunk_size=chunk_size)
+    return cipher
+
+def _seal_chunk(salt, chunk_size, index, data, final):
+    return _worker_cipher(salt, chunk_size).seal(index, data, final)
+
+def _open_chunk(salt, chunk_size, index, data, final):
+    return _worker_cipher(salt, chunk_size).open(index, data, final)
+
+def _chunks(f, size):
+    """Yields (index, data, final) with one chunk of read-ahead to detect the last chunk."""
+    current = bytearray(size)
+    n = _read_full(f, memoryview(current))
+    index = 0
+    while True:
+        ahead = bytearray(size)
+        m = _read_full(f, memoryview(ahead)) if n == size else 0
+        yield index, bytes(memoryview(current)[:n]), m == 0
+        if m == 0:
+            return
+        current, n = ahead, m
+        index += 1
+
+class BulkEngine:
+    """
+    VAULTZERO - Parallel Bulk Engine
+
+    A single reader walks the tree in sorted order and hands chunks to a worker
+    pool. Results are written strictly in submission order, so every file's
+    chunks land in sequence whatever order the workers finish in, and at most
+    `max_inflight` chunks are pending at any time (back-pressure keeps memory
+    bounded). Each file gets a fresh random salt, so ciphertext differs from
+    run to run; only the decrypted output is reproducible.
+
+    Thread workers call the engine's own ChunkCipher objects directly;
+    process workers get the key once through the pool initializer.
+    """
+
+    def __init__(self, master_key, workers=None, executor="process", chunk_size=CHUNK_SIZE, max_inflight=None):
+        self.master_key = master_key
+        self.workers = workers or os.cpu_count() or 1
+        self.executor = executor
+        self.chunk_size = chunk_size
+        self.max_inflight = max_inflight or self.workers * INFLIGHT_PER_WORKER
+
+    def _pool(self):
+        if self.executor == "thread":
+            return ThreadPoolExecutor(max_workers=self.workers)
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=(bytes(self.master_key),))  # memoryviews do not pickle
+
+    def _task(self, cipher, worker_fn, method, index, data, final):
+        """(fn, args, final) for one chunk: the cipher itself for threads, its salt for processes."""
+        if self.executor == "thread":
+            return method, (index, data, final), final
+        return worker_fn, (cipher.salt, cipher.chunk_size, index, data, final), final
+
+    def _run(self, jobs):
+        """
+        jobs yields (dst_path, header, tasks) where tasks yields (fn, args).
+        Returns (files, bytes) written.
+        """
+        pending = deque()  # (future, out_file, is_last_of_file)
+        files = 0
+        written = 0
+
+        def drain(limit):
+            nonlocal written
+            while len(pending) > limit:
+                future, out, last = pending.popleft()
+                data = future.result()
+                out.write(data)
+                written += len(data)
+                if last:
+                    out.close()
+                    os.replace(out.name, out.name[:-len(".tmp")])
+
+        with self._pool() as pool:
+            try:
+                for dst_path, header, tasks in jobs:
+                    os.makedirs(os.path.dirname(dst_path) or ".", exist_ok=True)
+                    out = open(dst_path + ".tmp", 'wb', buffering=self.chunk_size)
+                    if header:
+                        out.write(header)
+                    files += 1
+                    for fn, args, last in tasks:
+                        drain(self.max_inflight - 1)
+                        pending.append((pool.submit(fn, *args), out, last))
+                drain(0)
+            except BaseException:
+                for future, out, _ in pending:
+                    future.cancel()
+                    if not out.closed:
+                        out.close()
+                        os.remove(out.name)
+                raise
+        return files, written
+
+    def _report(self, verb, files, nbytes, started):
+        seconds = max(time.perf_counter() - started, 1e-9)
+        stats = {
+            "files": files,
+            "bytes": nbytes,
+            "seconds": seconds,
+            "mb_per_s": nbytes / seconds / (1024 * 1024),
+            "workers": self.workers,
+        }
+        print(f"[+] {verb} {files} files ({nbytes / (1024 * 1024):.1f} MB) in {seconds:.2f}s "
+              f"-> {stats['mb_per_s']:.1f} MB/s on {self.workers} {self.executor} workers")
+        return stats
+
+    def lock_tree(self, src_dir, dst_dir):
+        """Mirrors src_dir into dst_dir as chunked vault files (<name>.vz)."""
+        started = time.perf_counter()
+        plain_bytes = 0
+
+        def jobs():
+            nonlocal plain_bytes
+            for root, dirs, names in os.walk(src_dir):
+                dirs.sort()
+                for name in sorted(names):
+                    src = os.path.join(root, name)
+                    dst = os.path.join(dst_dir, os.path.relpath(src, src_dir)) + VAULT_SUFFIX
+                    cipher = ChunkCipher(self.master_key, chunk_size=self.chunk_size)
+                    with open(src, 'rb') as f:
+                        def tasks():
+                            nonlocal plain_bytes
+                            for index, data, final in _chunks(f, self.chunk_size):
+                                plain_bytes += len(data)
+                                yield self._task(cipher, _seal_chunk, cipher.seal, index, data, final)
+                        yield dst, cipher.header, tasks()
+
+        files, _ = self._run(jobs())
+        return self._report("Locked", files, plain_bytes, started)
+
+    def unlock_tree(self, src_dir, dst_dir):
+        """Restores every <name>.vz under src_dir into dst_dir."""
+        started = time.perf_counter()
+
+        def jobs():
+            for root, dirs, names in os.walk(src_dir):
+                dirs.sort()
+                for name in sorted(names):
+                    if not name.endswith(VAULT_SUFFIX):
+                        continue
+                    src = os.path.join(root, name)
+                    dst = os.path.join(dst_dir, os.path.relpath(src, src_dir))[:-len(VAULT_SUFFIX)]
+                    with open(src, 'rb') as f:
+                        cipher = ChunkCipher.from_header(self.master_key, f.read(HEADER.size))
+                        def tasks():
+                            for index, data, final in _chunks(f, cipher.sealed_chunk_size):
+                                yield self._task(cipher, _open_chunk, cipher.open, index, data, final)
+                        yield dst, b"", tasks()
+
+        files, nbytes = self._run(jobs())
+        return self._report("Unlocked", files, nbytes, started)
@@ -0,0 +1,272 @@
+import os
+import re
+import struct
+import threading
+
+SEGMENT_SIZE = 4 * 1024 * 1024  # Roll over to a new segment after 4 MB
+COMPACT_INTERVAL = 60.0  # Seconds between background compaction checks
+COMPACT_MIN_SEGMENTS = 4  # Sealed segments needed before compaction kicks in
+COMPACT_TARGET_SEGMENTS = 8  # Merged segments grow to this many SEGMENT_SIZEs, then are left alone
+
+RECORD_HEADER = struct.Struct(">I")  # Big-endian length prefix of each record
+SEGMENT_PATTERN = re.compile(r"^seg-(\d{6})-(\d{6})\.log$")
+
+class VaultLog:
+    """
+    VAULTZERO - Append-Only Segmented Log
+
+    Every record is encrypted on its own and stored as [u32 length][Fernet token]
+    at the tail of the active segment. Segments are named seg-<first>-<last>.log;
+    a compacted segment covers the range of the segments it replaced, which lets
+    an interrupted compaction be resolved on the next open.
+
+    The in-memory index maps record number -> (segment path, offset, length), so
+    reading the newest N records only decrypts those N tokens.
+    """
+
+    def __init__(self, directory, cipher, segment_size=SEGMENT_SIZE, fsync=False):
+        self.directory = directory
+        self.cipher = cipher  # Callable returning a Fernet instance
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.index = []  # [(path, offset, length)]
+        self.segments = []  # [(first, last, path)] ordered by first
+        self._active = None  # Open append handle of the newest segment
+        self._lock = threading.RLock()
+        self._compacting = threading.Lock()  # One compaction at a time; appends never wait on it
+        self._compactor = None
+        self._stop = threading.Event()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._load()
+
+    def _segment_path(self, first, last):
+        return os.path.join(self.directory, f"seg-{first:06d}-{last:06d}.log")
+
+    def _load(self):
+        """Resolves leftover compaction state and rebuilds the offset index from headers."""
+        found = []
+        for name in os.listdir(self.directory):
+            match = SEGMENT_PATTERN.match(name)
+            if match:
+                found.append((int(match.group(1)), int(match.group(2)), os.path.join(self.directory, name)))
+            elif name.endswith(".tmp"):
+                os.remove(os.path.join(self.directory, name))
+
+        # A segment covered by a wider (compacted) one is stale
+        for first, last, path in found:
+            if any(f <= first and last <= l and (f, l) != (first, last) for f, l, _ in found):
+                os.remove(path)
+            else:
+                self.segments.append((first, last, path))
+        self.segments.sort()
+
+        for _, _, path in self.segments:
+            self.index.extend(self._scan(path))
+
+    def _scan(self, path):
+        """Walks record headers only; a torn record at the tail is cut off."""
+        entries = []
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            offset = 0
+            while offset + RECORD_HEADER.size <= size:
+                f.seek(offset)
+                (length,) = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                if offset + RECORD_HEADER.size + length > size:
+                    break
+                entries.append((path, offset + RECORD_HEADER.size, length))
+                offset += RECORD_HEADER.size + length
+        if offset < size:
+            print(f"[!] Truncating torn record at {os.path.basename(path)}:{offset}")
+            with open(path, 'r+b') as f:
+                f.truncate(offset)
+        return entries
+
+    def _open_active(self):
+        """Returns the append handle, rolling over to a fresh segment when full."""
+        if self._active is not None and self._active.tell() < self.segment_size:
+            return self._active
+        if self._active is not None:
+            self._active.close()
+            self._active = None
+
+        if self.segments:
+            first, last, path = self.segments[-1]
+            if first == last and os.path.getsize(path) < self.segment_size:
+                self._active = open(path, 'ab')
+                return self._active
+            next_id = last + 1
+        else:
+            next_id = 1
+        path = self._segment_path(next_id, next_id)
+        self.segments.append((next_id, next_id, path))
+        self._active = open(path, 'ab')
+        return self._active
+
+    def append_many(self, payloads):
+        """Encrypts and appends records with a single write; cost is O(payloads)."""
+        cipher = self.cipher()
+        tokens = [cipher.encrypt(p) for p in payloads]
+        with self._lock:
+            f = self._open_active()
+            offset = f.tell()
+            path = f.name
+            chunks = []
+            for token in tokens:
+                chunks.append(RECORD_HEADER.pack(len(token)))
+                chunks.append(token)
+                self.index.append((path, offset + RECORD_HEADER.size, len(token)))
+                offset += RECORD_HEADER.size + len(token)
+            f.write(b"".join(chunks))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def append(self, payload):
+        self.append_many([payload])
+
+    def _read(self, entries):
+        cipher = self.cipher()
+        records = []
+        handles = {}
+        try:
+            for path, offset, length in entries:
+                f = handles.get(path)
+                if f is None:
+                    f = handles[path] = open(path, 'rb')
+                f.seek(offset)
+                records.append(cipher.decrypt(f.read(length)))
+        finally:
+            for f in handles.values():
+                f.close()
+        return records
+
+    def read_last(self, n):
+        """Decrypts only the newest n records (oldest first)."""
+        with self._lock:
+            if self._active is not None:
+                self._active.flush()
+            return self._read(self.index[-n:] if n > 0 else [])
+
+    def read_all(self):
+        with self._lock:
+            if self._active is not None:
+                self._active.flush()
+            return self._read(list(self.index))
+
+    def __len__(self):
+        return len(self.index)
+
+    def compact(self, keep_last=None, target_size=None):
+        """
+        Size-tiered: merges runs of adjacent sealed segments smaller than
+        target_size into one segment of at most target_size, copying
+        ciphertext as-is. Segments already at the target are never rewritten,
+        so a pass costs the small tail, not the whole log.
+        With keep_last, records older than the newest keep_last are dropped:
+        fully expired segments are deleted and a partly expired one rewritten.
+        Returns the number of segments merged or deleted.
+        """
+        target_size = target_size or self.segment_size * COMPACT_TARGET_SEGMENTS
+        with self._compacting:
+            with self._lock:
+                # The newest segment is (or may become) the append target
+                sealed = self.segments[:-1]
+                sealed_paths = {s[2] for s in sealed}
+                drop = max(0, len(self.index) - keep_last) if keep_last is not None else 0
+                counts, live = {}, {}
+                for i, entry in enumerate(self.index):
+                    if entry[0] in sealed_paths:
+                        counts[entry[0]] = counts.get(entry[0], 0) + 1
+                        if i >= drop:
+                            live.setdefault(entry[0], []).append(entry)
+
+                expired = {s[2] for s in sealed if s[2] not in live}
+                for path in expired:
+                    os.remove(path)
+                if expired:
+                    self.segments = [s for s in self.segments if s[2] not in expired]
+                    self.index = [e for e in self.index if e[0] not in expired]
+
+            runs, run, run_size, run_trimmed = [], [], 0, False
+            for segment in sealed:
+                entries = live.get(segment[2])
+                if entries is None:
+                    continue
+                size = sum(RECORD_HEADER.size + e[2] for e in entries)
+                trimmed = len(entries) < counts[segment[2]]
+                if run and (run_size + size > target_size or (size >= target_size and not trimmed)):
+                    if len(run) > 1 or run_trimmed:
+                        runs.append(run)
+                    run, run_size, run_trimmed = [], 0, False
+                if size >= target_size and not trimmed:
+                    continue
+                run.append((segment, entries))
+                run_size += size
+                run_trimmed = run_trimmed or trimmed
+            if len(run) > 1 or run_trimmed:
+                runs.append(run)
+
+            for run in runs:
+                self._merge(run)
+            return len(expired) + sum(len(run) for run in runs)
+
+    def _merge(self, run):
+        """Rewrites one run of adjacent sealed segments [(segment, live entries)] as a single segment."""
+        first, last = run[0][0][0], run[-1][0][1]
+        target = self._segment_path(first, last)
+        tmp = target + ".tmp"
+        new_entries = []
+        # Sealed segments are immutable, so the copy runs outside the lock
+        with open(tmp, 'wb') as out:
+            for (_, _, path), entries in run:
+                with open(path, 'rb') as f:
+                    for _, offset, length in entries:
+                        f.seek(offset - RECORD_HEADER.size)
+                        new_entries.append((target, out.tell() + RECORD_HEADER.size, length))
+                        out.write(f.read(RECORD_HEADER.size + length))
+            out.flush()
+            os.fsync(out.fileno())
+
+        run_paths = {segment[2] for segment, _ in run}
+        with self._lock:
+            os.replace(tmp, target)
+            for path in run_paths:
+                if path != target:
+                    os.remove(path)
+            at = next(i for i, s in enumerate(self.segments) if s[2] in run_paths)
+            self.segments = (self.segments[:at] + [(first, last, target)] +
+                             [s for s in self.segments[at:] if s[2] not in run_paths])
+            at = next(i for i, e in enumerate(self.index) if e[0] in run_paths)
+            self.index = (self.index[:at] + new_entries +
+                          [e for e in self.index[at:] if e[0] not in run_paths])
+
+    def start_compactor(self, interval=COMPACT_INTERVAL, min_segments=COMPACT_MIN_SEGMENTS, keep_last=None,
+                        target_size=None):
+        """Runs compaction in a daemon thread whenever enough segments are sealed."""
+        if self._compactor is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                if len(self.segments) - 1 >= min_segments:
+                    try:
+                        merged = self.compact(keep_last=keep_last, target_size=target_size)
+                        if merged:
+                            print(f"\n[-] VaultZero compacted {merged} log segments.")
+                    except OSError as e:
+                        print(f"\n[!] Vault compaction failed: {e}")
+
+        self._compactor = threading.Thread(target=run, daemon=True)
+        self._compactor.start()
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join(timeout=1.0)
+            self._compactor = None
+        with self._lock:
+            if self._active is not None:
+                self._active.close()
+                self._active = None
@@ -0,0 +1,152 @@
+import os
+import struct
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+CHUNK_SIZE = 1024 * 1024  # Plaintext bytes per chunk (1 MB)
+MIN_CHUNK_SIZE = 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024  # A header may not make a reader allocate more than this per chunk
+TAG_SIZE = 16  # AES-GCM authentication tag appended to every chunk
+MAGIC = b"VZS1"
+
+HEADER = struct.Struct(">4sI16s")  # magic, chunk size, per-file salt
+CHUNK_AAD = struct.Struct(">QB")  # chunk index, final-chunk flag
+
+class StreamError(Exception):
+    """Raised when a stream header or chunk fails authentication."""
+
+class ChunkCipher:
+    """
+    VAULTZERO - Chunked Stream Format
+
+    [header][chunk 0]...[chunk n-1], each chunk = AES-GCM(plaintext <= chunk_size) + tag.
+    The file key is HKDF(vault key, per-file salt), so the chunk index is a safe
+    nonce. Each chunk authenticates the header, its index and whether it is the
+    last one, so reordering, splicing and truncation are all detected.
+    """
+
+    def __init__(self, master_key, salt=None, chunk_size=CHUNK_SIZE):
+        if not MIN_CHUNK_SIZE <= chunk_size <= MAX_CHUNK_SIZE:
+            raise ValueError(f"Chunk size {chunk_size} outside {MIN_CHUNK_SIZE}..{MAX_CHUNK_SIZE} bytes.")
+        self.salt = salt if salt is not None else os.urandom(16)
+        self.chunk_size = chunk_size
+        self.header = HEADER.pack(MAGIC, chunk_size, self.salt)
+        file_key = HKDF(
+            algorithm=hashes.SHA256(),
+            length=32,
+            salt=self.salt,
+            info=b"vaultzero-stream-v1",
+        ).derive(master_key)
+        self.aead = AESGCM(file_key)
+
+    @classmethod
+    def from_header(cls, master_key, header):
+        if len(header) != HEADER.size:
+            raise StreamError("Truncated stream header.")
+        magic, chunk_size, salt = HEADER.unpack(header)
+        if magic != MAGIC:
+            raise StreamError("Not a VaultZero stream.")
+        return cls(master_key, salt=salt, chunk_size=chunk_size)
+
+    @property
+    def sealed_chunk_size(self):
+        return self.chunk_size + TAG_SIZE
+
+    def _nonce_aad(self, index, final):
+        return index.to_bytes(12, 'big'), self.header + CHUNK_AAD.pack(index, 1 if final else 0)
+
+    def seal(self, index, plaintext, final):
+        nonce, aad = self._nonce_aad(index, final)
+        return self.aead.encrypt(nonce, plaintext, aad)
+
+    def open(self, index, sealed, final):
+        nonce, aad = self._nonce_aad(index, final)
+        try:
+            return self.aead.decrypt(nonce, sealed, aad)
+        except Exception:
+            raise StreamError(f"Chunk {index} failed authentication.")
+
+def _read_full(src, view):
+    """readinto() until the view is full or EOF; returns bytes read."""
+    total = 0
+    while total < len(view):
+        n = src.readinto(view[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+def encrypt_stream(master_key, src, dst, chunk_size=CHUNK_SIZE):
+    """Encrypts a binary stream chunk by chunk; memory use is two chunk buffers."""
+    cipher = ChunkCipher(master_key, chunk_size=chunk_size)
+    dst.write(cipher.header)
+
+    # Double buffer: a chunk is only known to be final once the next read hits EOF
+    current, ahead = bytearray(chunk_size), bytearray(chunk_size)
+    n = _read_full(src, memoryview(current))
+    index = 0
+    total = 0
+    while True:
+        m = _read_full(src, memoryview(ahead)) if n == chunk_size else 0
+        final = m == 0
+        dst.write(cipher.seal(index, memoryview(current)[:n], final))
+        total += n
+        if final:
+            return total
+        current, ahead = ahead, current
+        n = m
+        index += 1
+
+def decrypt_stream(master_key, src, dst):
+    """Verifies and decrypts a stream chunk by chunk into dst."""
+    cipher = ChunkCipher.from_header(master_key, src.read(HEADER.size))
+    size = cipher.sealed_chunk_size
+
+    current, ahead = bytearray(size), bytearray(size)
+    n = _read_full(src, memoryview(current))
+    index = 0
+    total = 0
+    while True:
+        m = _read_full(src, memoryview(ahead)) if n == size else 0
+        final = m == 0
+        plaintext = cipher.open(index, memoryview(current)[:n], final)
+        dst.write(plaintext)
+        total += len(plaintext)
+        if final:
+            return total
+        current, ahead = ahead, current
+        n = m
+        index += 1
+
+def open_random_access(master_key, src):
+    """Returns (cipher, chunk count) for a seekable stream, without decrypting."""
+    src.seek(0, os.SEEK_END)
+    body = src.tell() - HEADER.size
+    src.seek(0)
+    cipher = ChunkCipher.from_header(master_key, src.read(HEADER.size))
+    return cipher, max(1, -(-body // cipher.sealed_chunk_size))
+
+def _read_chunk(cipher, count, src, index):
+    if not 0 <= index < count:
+        raise IndexError(f"Chunk {index} out of range (0..{count - 1}).")
+    src.seek(HEADER.size + index * cipher.sealed_chunk_size)
+    return cipher.open(index, src.read(cipher.sealed_chunk_size), index == count - 1)
+
+def read_chunk(master_key, src, index):
+    """Random access: decrypts a single chunk of a seekable stream."""
+    cipher, count = open_random_access(master_key, src)
+    return _read_chunk(cipher, count, src, index)
+
+def read_range(master_key, src, offset, size):
+    """Random access: decrypts only the chunks covering [offset, offset + size)."""
+    cipher, count = open_random_access(master_key, src)
+    out = bytearray()
+    index = offset // cipher.chunk_size
+    skip = offset - index * cipher.chunk_size
+    while len(out) < size and index < count:
+        data = _read_chunk(cipher, count, src, index)
+        out += memoryview(data)[skip:skip + size - len(out)]
+        skip = 0
+        index += 1
+    return bytes(out)